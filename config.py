@@ -1,6 +1,82 @@
-# Configuración de la base de datos
-DB_NAME = 'inventario.db'
+import os
+
+# Configuración de la base de datos (INVENTARIO_DB permite usar otro archivo, por ejemplo una copia para pruebas)
+DB_NAME = os.environ.get('INVENTARIO_DB', 'inventario.db')
+
+# Perfiles de almacenamiento (PRAGMAs de SQLite que se aplican a cada conexión).
+# Todos usan WAL para que los snapshots de reportes no bloqueen a los escritores.
+PERFILES_ALMACENAMIENTO = {
+    # Máxima durabilidad: fsync en cada commit
+    'safe': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'cache_size': -8000,         # ~8 MB
+        'mmap_size': 0,
+        'temp_store': 'DEFAULT'
+    },
+    # Uso diario: un commit puede perderse ante un corte de luz, nunca se corrompe la base
+    'balanced': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -64000,        # ~64 MB
+        'mmap_size': 268435456,      # 256 MB
+        'temp_store': 'MEMORY'
+    },
+    # Cargas masivas: sin fsync, solo usar con respaldo previo
+    'bulk-load': {
+        'journal_mode': 'WAL',
+        'synchronous': 'OFF',
+        'cache_size': -256000,       # ~256 MB
+        'mmap_size': 1073741824,     # 1 GB
+        'temp_store': 'MEMORY'
+    }
+}
+
+# Perfil activo (se puede elegir con la variable de entorno INVENTARIO_PERFIL)
+PERFIL_ALMACENAMIENTO = os.environ.get('INVENTARIO_PERFIL', 'balanced')
 
 # Nombres de las tablas
 TABLE_NAME = 'productos'
 TABLE_CATEGORIAS = 'categorias'
+TABLE_ESTADISTICAS = 'estadisticas_categorias'
+TABLE_HISTORIAL = 'historial_categorias'
+TABLE_HISTORIAL_DIARIO = 'historial_diario'
+TABLE_HISTORIAL_SEMANAL = 'historial_semanal'
+TABLE_HISTORIAL_ESTADO = 'historial_estado'
+TABLE_EVENTOS = 'eventos_cambios'
+TABLE_ARCHIVO = 'productos_archivados'
+TABLE_JERARQUIA = 'jerarquia_categorias'
+
+# Días sin cambios (y sin stock) para archivar un producto
+ARCHIVO_DIAS_INACTIVIDAD = 180
+
+# Parámetros de reposición (en días)
+REPOSICION_LEAD_TIME_DIAS = 7
+REPOSICION_PERIODO_REVISION_DIAS = 7
+
+# Modo de snapshot para los reportes: 'wal' (transacción de lectura WAL),
+# 'memoria' (copia en memoria con la API de backup) o None (sin snapshot)
+REPORTES_SNAPSHOT = 'wal'
+
+# Almacenes: nombre -> archivo de base de datos con los productos de ese almacén.
+# Vacío = un solo almacén (los productos se guardan en DB_NAME junto con las categorías).
+# También se pueden definir con INVENTARIO_ALMACENES="NORTE=norte.db,SUR=sur.db"
+ALMACENES = {
+    nombre.strip().upper(): archivo.strip()
+    for nombre, archivo in (
+        par.split('=', 1) for par in os.environ.get('INVENTARIO_ALMACENES', '').split(',') if '=' in par
+    )
+}
+
+# Hilos para consultar los almacenes en paralelo
+ALMACENES_HILOS = os.cpu_count() or 4
+
+# Cache de resultados de los reportes (0 entradas = desactivado)
+CACHE_REPORTES_MAX_ENTRADAS = 256
+CACHE_REPORTES_MAX_BYTES = 64 * 1024 * 1024  # 64 MB
+
+# Carpeta donde se guardan los reportes generados
+REPORTES_DIR = 'reportes'
+
+# Motor de almacenamiento: 'sqlite' (por defecto) o 'memoria' (sin persistencia, para pruebas y comparaciones)
+MOTOR_ALMACENAMIENTO = os.environ.get('INVENTARIO_MOTOR', 'sqlite')
@@ -1,10 +1,20 @@
 from utils.helpers import (
     imprimir_titulo, imprimir_exito, imprimir_error,
     validar_input_string, validar_input_float, validar_input_int, validar_descripcion,
-    validar_categoria_con_reintento, listar_categorias_disponibles
+    validar_categoria_con_reintento, listar_categorias_disponibles,
+    capturar_salida, quitar_colores
 )
-from utils import db_manager
+from utils.repositorio import obtener_repositorio
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import groupby
+from operator import itemgetter
+from config import REPORTES_DIR, MOTOR_ALMACENAMIENTO, ARCHIVO_DIAS_INACTIVIDAD
+import os
 import sys
+import time
+
+# Motor de almacenamiento activo (SQLite o en memoria, según config)
+repositorio = obtener_repositorio()
 
 # FUNCIONES AUXILIARES
 
@@ -38,11 +48,31 @@ def mostrar_tabla_categorias(categorias):
         print(f"{nombre[:18]:<20} {stock:<10} {demanda:<15} {proteccion:<12} {status:<20}")
     print("-" * 85)
 
+def operacion_disponible(operacion):
+    """Indica si el motor de almacenamiento activo tiene la operación (y avisa si no la tiene)"""
+    if hasattr(repositorio, operacion):
+        return True
+    imprimir_error(f"Esta opción no está disponible con el motor '{MOTOR_ALMACENAMIENTO}'.")
+    return False
+
+def seleccionar_almacen():
+    """Pide el almacén del producto (solo si hay varios almacenes configurados)"""
+    almacenes = repositorio.obtener_almacenes()
+    if not almacenes:
+        return None
+    
+    print(f"\nAlmacenes: {', '.join(almacenes)}")
+    while True:
+        almacen = input(f"Almacén [{almacenes[0]}]: ").strip().upper() or almacenes[0]
+        if almacen in almacenes:
+            return almacen
+        imprimir_error(f"El almacén '{almacen}' no existe.")
+
 def actualizar_stats_categoria(categoria_nombre):
     """Actualiza las estadísticas de una categoría después de modificar productos"""
-    stats = db_manager.calcular_estadisticas_categoria(categoria_nombre)
+    stats = repositorio.calcular_estadisticas_categoria(categoria_nombre)
     if stats:
-        db_manager.actualizar_stock_categoria(categoria_nombre, stats['stock_global'])
+        repositorio.actualizar_stock_categoria(categoria_nombre, stats['stock_global'])
 
 # MENÚ DE PRODUCTOS
 
@@ -70,7 +100,7 @@ def menu_registrar_producto():
             continue
         
         # Verificar si existe la categoría
-        if db_manager.buscar_categoria(categ):
+        if repositorio.buscar_categoria(categ):
             break  # Categoría válida
         else:
             # La categoría no existe, le pregunta al usuario si quiere crearla
@@ -85,7 +115,7 @@ def menu_registrar_producto():
                 stock_proteccion = int(demanda_semanal * 0.2)
                 status_inicial = "BAJO STOCK"  # Stock 0 siempre es bajo
                 
-                if db_manager.registrar_categoria(categ, 0.0, 0.0, 0.0, 0, demanda_semanal, status_inicial):
+                if repositorio.registrar_categoria(categ, 0.0, 0.0, 0.0, 0, demanda_semanal, status_inicial):
                     imprimir_exito(f"Categoría '{categ}' creada correctamente.")
                     print(f"Stock de protección: {stock_proteccion} unidades")
                     break  # Categoría creada
@@ -98,8 +128,9 @@ def menu_registrar_producto():
     # Continúa con el registro del producto
     cantidad = validar_input_int("Cantidad inicial")
     precio = validar_input_float("Precio unitario")
+    almacen = seleccionar_almacen()
     
-    if db_manager.registrar_producto(nombre, desc, cantidad, precio, categ):
+    if repositorio.registrar_producto(nombre, desc, cantidad, precio, categ, almacen):
         imprimir_exito("Producto registrado correctamente.")
         # Actualiza estadísticas de la categoría
         actualizar_stats_categoria(categ)
@@ -109,7 +140,7 @@ def menu_registrar_producto():
 def menu_mostrar_productos():
     """Muestra todos los productos"""
     imprimir_titulo("Listado de Productos")
-    productos = db_manager.obtener_productos()
+    productos = repositorio.obtener_productos()
     mostrar_tabla_productos(productos)
 
 def menu_actualizar_producto():
@@ -118,7 +149,7 @@ def menu_actualizar_producto():
     menu_mostrar_productos()
     id_prod = validar_input_int("Ingrese el ID del producto a modificar")
     
-    producto_actual = db_manager.buscar_producto_id(id_prod)
+    producto_actual = repositorio.buscar_producto_id(id_prod)
     if not producto_actual:
         imprimir_error("Producto no encontrado.")
         return
@@ -135,7 +166,6 @@ def menu_actualizar_producto():
     cambiar_cat = input("¿Desea cambiar la categoría? (s/n): ").lower()
     
     if cambiar_cat == 's':
-        listar_categorias_disponibles()
         nueva_cat = validar_categoria_con_reintento("Nueva categoría")
     else:
         nueva_cat = categoria_actual
@@ -146,7 +176,7 @@ def menu_actualizar_producto():
     precio_str = input(f"Precio [{producto_actual[4]}]: ").strip()
     nuevo_precio = float(precio_str) if precio_str else producto_actual[4]
 
-    if db_manager.actualizar_producto(id_prod, nuevo_nombre, nueva_desc, nuevo_cant, nuevo_precio, nueva_cat):
+    if repositorio.actualizar_producto(id_prod, nuevo_nombre, nueva_desc, nuevo_cant, nuevo_precio, nueva_cat):
         imprimir_exito("Producto actualizado.")
         # Actualiza estadísticas de ambas categorías si cambió
         if categoria_actual != nueva_cat:
@@ -163,7 +193,7 @@ def menu_eliminar_producto():
     id_prod = validar_input_int("ID del producto a eliminar")
     
     # Lee el producto para saber la categoría
-    producto = db_manager.buscar_producto_id(id_prod)
+    producto = repositorio.buscar_producto_id(id_prod)
     if not producto:
         imprimir_error("Producto no encontrado.")
         return
@@ -172,7 +202,7 @@ def menu_eliminar_producto():
     
     confirma = input(f"¿Seguro que desea eliminar '{producto[1]}'? (s/n): ").lower()
     if confirma == 's':
-        if db_manager.eliminar_producto(id_prod):
+        if repositorio.eliminar_producto(id_prod):
             imprimir_exito("Producto eliminado.")
             # Actualiza estadísticas de la categoría
             actualizar_stats_categoria(categoria)
@@ -188,18 +218,128 @@ def menu_buscar_producto():
     
     if opcion == "1":
         id_prod = validar_input_int("ID")
-        res = db_manager.buscar_producto_id(id_prod)
+        incluir_archivados = input("¿Incluir productos archivados? (s/n): ").lower() == 's'
+        res = repositorio.buscar_producto_id(id_prod, incluir_archivados=incluir_archivados)
         if res:
             mostrar_tabla_productos([res])
         else:
             imprimir_error("No encontrado.")
     elif opcion == "2":
         termino = validar_input_string("Término de búsqueda")
-        res = db_manager.buscar_producto_texto(termino)
+        incluir_archivados = input("¿Incluir productos archivados? (s/n): ").lower() == 's'
+        res = repositorio.buscar_producto_texto(termino, incluir_archivados=incluir_archivados)
         mostrar_tabla_productos(res)
     else:
         imprimir_error("Opción inválida.")
 
+def menu_reprecio_masivo():
+    """Cambia el precio de todos los productos de una categoría o de una búsqueda"""
+    imprimir_titulo("Reprecio Masivo")
+    if not operacion_disponible('reprecio_masivo'):
+        return
+    
+    print("1. Por Categoría")
+    print("2. Por Búsqueda (Nombre o Categoría)")
+    opcion = input("Opción: ")
+    if opcion == "1":
+        alcance = {'categoria': validar_categoria_con_reintento("Categoría")}
+    elif opcion == "2":
+        alcance = {'termino': validar_input_string("Término de búsqueda")}
+    else:
+        imprimir_error("Opción inválida.")
+        return
+    
+    tipo = input("Tipo de cambio: (1) Porcentaje (2) Monto fijo: ").strip()
+    if tipo not in ("1", "2"):
+        imprimir_error("Opción inválida.")
+        return
+    try:
+        valor = float(input("Cambio (use negativo para bajar): "))
+    except ValueError:
+        imprimir_error("Debe ingresar un número válido (ej: 10 o -5.5).")
+        return
+    cambio = {'porcentaje': valor} if tipo == "1" else {'monto': valor}
+    
+    reglas = {'1': 'centavos', '2': 'entero', '3': '99'}
+    regla = input("Redondeo: (1) Centavos (2) Entero (3) Terminado en .99 [1]: ").strip() or '1'
+    if regla not in reglas:
+        imprimir_error("Opción inválida.")
+        return
+    
+    # Primero muestra el impacto sin escribir
+    impacto = repositorio.reprecio_masivo(redondeo=reglas[regla], simular=True, **cambio, **alcance)
+    if impacto is None:
+        return
+    if not impacto:
+        print("No hay productos que coincidan.")
+        return
+    
+    print(f"\n{'CATEGORÍA':<20} | {'PRODUCTOS':>9} | {'PROMEDIO':>19} | {'MÍNIMO':>19} | {'MÁXIMO':>19}")
+    print("-" * 97)
+    for cat, datos in sorted(impacto.items(), key=lambda item: item[0] or ''):
+        columnas = [f"{antes or 0:.2f} → {despues or 0:.2f}" for antes, despues in zip(datos['antes'], datos['despues'])]
+        print(f"{cat or '(sin categoría)':<20} | {datos['productos']:>9} | {columnas[0]:>19} | {columnas[1]:>19} | {columnas[2]:>19}")
+    
+    total = sum(datos['productos'] for datos in impacto.values())
+    if input(f"\n¿Aplicar el cambio a {total} productos? (s/n): ").lower() == 's':
+        if repositorio.reprecio_masivo(redondeo=reglas[regla], **cambio, **alcance) is not None:
+            imprimir_exito("Precios actualizados.")
+        else:
+            imprimir_error("No se pudieron actualizar los precios.")
+
+def menu_archivo_productos():
+    """Archiva los productos inactivos, muestra los archivados y los restaura"""
+    imprimir_titulo("Archivo de Productos")
+    if not operacion_disponible('archivar_productos_inactivos'):
+        return
+    
+    print("1. Archivar Productos Inactivos")
+    print("2. Ver Productos Archivados")
+    print("3. Restaurar Productos Archivados")
+    opcion = input("Opción: ")
+    
+    if opcion == "1":
+        dias_str = input(f"Días sin cambios (y sin stock) [{ARCHIVO_DIAS_INACTIVIDAD}]: ").strip()
+        if dias_str and not dias_str.isdigit():
+            imprimir_error("Debe ingresar un número entero.")
+            return
+        dias = int(dias_str) if dias_str else ARCHIVO_DIAS_INACTIVIDAD
+        if input(f"¿Archivar los productos sin stock que no cambian hace {dias} días? (s/n): ").lower() == 's':
+            archivados = repositorio.archivar_productos_inactivos(dias)
+            if archivados is not None:
+                imprimir_exito(f"{archivados} productos archivados.")
+    elif opcion == "2":
+        mostrar_productos_archivados()
+    elif opcion == "3":
+        if not mostrar_productos_archivados():
+            return
+        ids_str = input("IDs a restaurar (separados por coma): ")
+        try:
+            ids = [int(id_str) for id_str in ids_str.split(",") if id_str.strip()]
+        except ValueError:
+            imprimir_error("Los IDs deben ser números enteros.")
+            return
+        restaurados = repositorio.restaurar_productos_archivados(ids)
+        if restaurados is not None:
+            imprimir_exito(f"{restaurados} productos restaurados.")
+    else:
+        imprimir_error("Opción inválida.")
+
+def mostrar_productos_archivados():
+    """Muestra los productos archivados con su fecha de archivo. Devuelve la lista."""
+    archivados = repositorio.obtener_productos_archivados()
+    if not archivados:
+        print("No hay productos archivados.")
+        return archivados
+    
+    print(f"\n{'ID':<5} {'NOMBRE':<20} {'CATEGORIA':<15} {'PRECIO':<10} {'ARCHIVADO':<12}")
+    print("-" * 70)
+    for prod in archivados:
+        fecha = time.strftime('%Y-%m-%d', time.localtime(prod[6]))
+        print(f"{prod[0]:<5} {prod[1][:18]:<20} {(prod[5] or '')[:13]:<15} ${prod[4]:<9.2f} {fecha:<12}")
+    print("-" * 70)
+    return archivados
+
 # MENÚ DE CATEGORÍAS
 
 def menu_registrar_categoria():
@@ -209,7 +349,7 @@ def menu_registrar_categoria():
     nombre = validar_input_string("Nombre de la categoría").upper()
     
     # Verifica si ya existe
-    if db_manager.buscar_categoria(nombre):
+    if repositorio.buscar_categoria(nombre):
         imprimir_error(f"La categoría '{nombre}' ya existe.")
         return
     
@@ -222,7 +362,7 @@ def menu_registrar_categoria():
     stock_global = 0
     status_stock = "BAJO STOCK"
     
-    if db_manager.registrar_categoria(nombre, mean, min_price, max_price, stock_global, demanda_semanal, status_stock):
+    if repositorio.registrar_categoria(nombre, mean, min_price, max_price, stock_global, demanda_semanal, status_stock):
         imprimir_exito(f"Categoría '{nombre}' registrada correctamente.")
         stock_prot = int(demanda_semanal * 0.2)
         print(f"Stock de protección calculado: {stock_prot} unidades (20% de {demanda_semanal})")
@@ -234,9 +374,9 @@ def menu_mostrar_categorias():
     imprimir_titulo("Listado de Categorías")
     
     # Primero actualiza estadísticas automáticamente
-    db_manager.actualizar_estadisticas_todas_categorias()
+    repositorio.actualizar_estadisticas_todas_categorias()
     
-    categorias = db_manager.obtener_categorias()
+    categorias = repositorio.obtener_categorias()
     
     if not categorias:
         print("No hay categorías registradas.")
@@ -244,6 +384,10 @@ def menu_mostrar_categorias():
     
     mostrar_tabla_categorias(categorias)
     
+    # Estadísticas detalladas indexadas por categoría
+    # est: (categoria, cantidad_productos, mediana, p10, p90, desviacion, valor_inventario)
+    detalladas = {est[0]: est for est in repositorio.obtener_estadisticas_detalladas()}
+    
     # Muestra los otros detalles
     print("\nDetalle de precios:")
     for cat in categorias:
@@ -254,6 +398,10 @@ def menu_mostrar_categorias():
         
         if mean > 0:  # Solo muestra si hay datos
             print(f"  {nombre}: Precio promedio ${mean:.2f} | Rango: ${min_price:.2f} - ${max_price:.2f}")
+            est = detalladas.get(nombre)
+            if est:
+                print(f"    Mediana: ${est[2]:.2f} | P10: ${est[3]:.2f} | P90: ${est[4]:.2f} | Desvío: ${est[5]:.2f}")
+                print(f"    Valor de inventario: ${est[6]:.2f} ({est[1]} productos)")
         else:
             print(f"  {nombre}: Sin productos registrados aún")
 
@@ -273,7 +421,7 @@ def menu_actualizar_categoria():
         imprimir_error("Debe ingresar una categoría.")
         return
     
-    cat_actual = db_manager.buscar_categoria(nombre_input)
+    cat_actual = repositorio.buscar_categoria(nombre_input)
     if not cat_actual:
         imprimir_error("Categoría no encontrada.")
         return
@@ -295,7 +443,7 @@ def menu_actualizar_categoria():
         return
     
     # Conserva los otros valores
-    if db_manager.actualizar_categoria(
+    if repositorio.actualizar_categoria(
         nombre_input, 
         cat_actual[1],  # mean
         cat_actual[2],  # min_price
@@ -316,19 +464,18 @@ def menu_eliminar_categoria():
     """Elimina una categoría (solo si no tiene productos)"""
     imprimir_titulo("Eliminar Categoría")
     
-    listar_categorias_disponibles()
     nombre = validar_categoria_con_reintento("Nombre de la categoría a eliminar")
     
-    # Verifica si tiene productos asociadosguardados en ella
-    productos = db_manager.buscar_producto_texto(nombre)
+    # Verifica si tiene productos asociados guardados en ella (también archivados: al restaurarlos quedarían sin categoría)
+    productos = repositorio.obtener_productos_por_categoria(nombre, incluir_archivados=True)
     if productos:
         imprimir_error(f"No se puede eliminar '{nombre}' porque tiene {len(productos)} productos asociados.")
-        print("Elimine primero los productos o cambie su categoría.")
+        print("Elimine primero los productos (también los archivados) o cambie su categoría.")
         return
     
     confirma = input(f"¿Seguro que desea eliminar la categoría '{nombre}'? (s/n): ").lower()
     if confirma == 's':
-        if db_manager.eliminar_categoria(nombre):
+        if repositorio.eliminar_categoria(nombre):
             imprimir_exito("Categoría eliminada.")
         else:
             imprimir_error("No se pudo eliminar.")
@@ -344,18 +491,67 @@ def menu_actualizar_estadisticas():
     
     confirma = input("\n¿Continuar? (s/n): ").lower()
     if confirma == 's':
-        if db_manager.actualizar_estadisticas_todas_categorias():
+        if repositorio.actualizar_estadisticas_todas_categorias():
             imprimir_exito("Estadísticas actualizadas correctamente.")
         else:
             imprimir_error("Hubo un error al actualizar.")
 
+def menu_verificar_consistencia():
+    """Verifica que las categorías coincidan con sus productos y, opcionalmente, las repara"""
+    imprimir_titulo("Verificar Consistencia")
+    if not operacion_disponible('verificar_consistencia'):
+        return
+    
+    reparar = input("¿Reparar las diferencias encontradas? (s/n): ").lower() == 's'
+    resultado = repositorio.verificar_consistencia(reparar=reparar)
+    if resultado is None:
+        return
+    
+    huerfanos = resultado['huerfanos']
+    diferencias = resultado['diferencias']
+    if not huerfanos and not diferencias:
+        imprimir_exito("No se encontraron diferencias.")
+        return
+    
+    if huerfanos:
+        print(f"\nProductos con categoría inexistente: {huerfanos}")
+        for almacen, id_prod, nombre, categoria, archivado in resultado['muestra_huerfanos']:
+            origen = f" [{almacen}]" if almacen else ""
+            estado = " (archivado)" if archivado else ""
+            print(f"  ID {id_prod}{origen}: {nombre}{estado} → {categoria}")
+        if huerfanos > len(resultado['muestra_huerfanos']):
+            print(f"  ... y {huerfanos - len(resultado['muestra_huerfanos'])} más")
+    
+    if diferencias:
+        print(f"\nDiferencias en categorías: {diferencias}")
+        for categoria, columna, guardado, esperado in resultado['muestra_diferencias']:
+            print(f"  {categoria}.{columna}: guardado {guardado}, esperado {esperado}")
+        if diferencias > len(resultado['muestra_diferencias']):
+            print(f"  ... y {diferencias - len(resultado['muestra_diferencias'])} más")
+    
+    if reparar:
+        imprimir_exito(f"{resultado['reparadas']} categorías reparadas.")
+
+def menu_mover_categoria():
+    """Cambia la categoría padre de una categoría (con todas sus subcategorías)"""
+    imprimir_titulo("Mover Categoría en la Jerarquía")
+    if not operacion_disponible('mover_categoria'):
+        return
+    
+    nombre = validar_categoria_con_reintento("Categoría a mover")
+    print(f"Ubicación actual: {' > '.join(repositorio.obtener_ruta_categoria(nombre))}")
+    padre = validar_categoria_con_reintento("Nueva categoría padre (Enter para dejarla como raíz)", permitir_vacio=True)
+    
+    if repositorio.mover_categoria(nombre, padre or None):
+        imprimir_exito(f"Nueva ubicación: {' > '.join(repositorio.obtener_ruta_categoria(nombre))}")
+
 # MENÚ DE REPORTES
 
 def menu_reporte_bajo_stock():
     """Reporta los productos cuya categoría está por debajo del stock de seguridad"""
     imprimir_titulo("Reporte de Productos con Bajo Stock")
     
-    categorias = db_manager.obtener_categorias()
+    categorias = repositorio.obtener_categorias()
     if not categorias:
         print("No hay categorías registradas.")
         return
@@ -371,11 +567,12 @@ def menu_reporte_bajo_stock():
     for cat in categorias_criticas:
         print(f"  • {cat[0]} - Stock actual: {cat[4]} | Protección: {cat[6]}")
     
-    # Lee productos de esas categorías
+    # Una sola lectura de productos, ordenada por categoría y agrupada en una pasada
+    productos = {categoria: list(filas)
+                 for categoria, filas in groupby(repositorio.obtener_productos_por_categoria(), key=itemgetter(5))}
     productos_bajo_stock = []
     for cat in categorias_criticas:
-        prods = db_manager.buscar_producto_texto(cat[0])
-        productos_bajo_stock.extend(prods)
+        productos_bajo_stock.extend(productos.get(cat[0], []))
     
     if productos_bajo_stock:
         print(f"\nTotal de productos en categorías críticas: {len(productos_bajo_stock)}")
@@ -387,7 +584,7 @@ def menu_reporte_categorias_criticas():
     """Reporte de categorías con bajo stock"""
     imprimir_titulo("Reporte de Categorías Críticas")
     
-    categorias = db_manager.obtener_categorias()
+    categorias = repositorio.obtener_categorias()
     if not categorias:
         print("No hay categorías registradas.")
         return
@@ -413,17 +610,23 @@ def menu_reporte_por_categoria():
     """Muestra productos de una categoría específica"""
     imprimir_titulo("Productos por Categoría")
     
-    listar_categorias_disponibles()
     nombre = validar_categoria_con_reintento("Categoría a consultar")
     
-    productos = db_manager.buscar_producto_texto(nombre)
+    # Productos y estadísticas se leen del mismo snapshot
+    with repositorio.snapshot_lectura():
+        mostrar_reporte_categoria(nombre)
+
+def mostrar_reporte_categoria(nombre, productos=None, cat=None):
+    """Muestra los productos y las estadísticas de una categoría (los lee si no se pasan)"""
+    if productos is None:
+        productos = repositorio.obtener_productos_por_categoria(nombre)
     
     if productos:
         print(f"\nProductos en categoría '{nombre}': {len(productos)}")
         mostrar_tabla_productos(productos)
         
         # Muestra la info de la categoría
-        cat = db_manager.buscar_categoria(nombre)
+        cat = cat or repositorio.buscar_categoria(nombre)
         if cat:
             print(f"\nEstadísticas de '{nombre}':")
             print(f"  Stock total: {cat[4]} unidades")
@@ -433,16 +636,25 @@ def menu_reporte_por_categoria():
     else:
         print(f"No hay productos en la categoría '{nombre}'.")
 
+def reporte_todas_las_categorias():
+    """Reporte de productos por categoría para todas las categorías"""
+    imprimir_titulo("Productos por Categoría")
+    # Una sola lectura de productos, ordenada por categoría y agrupada en una pasada
+    productos = {categoria: list(filas)
+                 for categoria, filas in groupby(repositorio.obtener_productos_por_categoria(), key=itemgetter(5))}
+    for cat in repositorio.obtener_categorias():
+        mostrar_reporte_categoria(cat[0], productos.get(cat[0], []), cat)
+
 def menu_panel():
     """panel con resumen general"""
     imprimir_titulo("panel - Resumen General")
     
     # Productos
-    productos = db_manager.obtener_productos()
+    productos = repositorio.obtener_productos()
     total_productos = len(productos)
     
     # Categorías
-    categorias = db_manager.obtener_categorias()
+    categorias = repositorio.obtener_categorias()
     total_categorias = len(categorias)
     
     print(f"\n📦 Total de productos: {total_productos}")
@@ -461,6 +673,206 @@ def menu_panel():
         if bajo_stock > 0:
             print(f"\n⚠️  ¡ATENCIÓN! Hay {bajo_stock} categorías con bajo stock")
 
+def menu_plan_reposicion():
+    """Calcula el plan de compras sugerido y permite exportarlo"""
+    imprimir_titulo("Plan de Compras - Reposición")
+    if not operacion_disponible('calcular_plan_reposicion'):
+        return
+    
+    with repositorio.snapshot_lectura():
+        plan = repositorio.calcular_plan_reposicion()
+    if not plan:
+        imprimir_exito("No hay categorías que necesiten reposición.")
+        return
+    
+    # Resumen por categoría
+    totales = {}
+    for fila in plan:
+        totales[fila['categoria']] = totales.get(fila['categoria'], 0) + fila['cantidad_sugerida']
+    
+    print(f"\n{'CATEGORÍA':<20} {'A COMPRAR':<10}")
+    print("-" * 32)
+    for categoria, total in totales.items():
+        print(f"{categoria[:18]:<20} {total:<10}")
+    print("-" * 32)
+    print(f"Total de unidades a comprar: {sum(totales.values())}")
+    
+    ruta = input("\nArchivo CSV para exportar (Enter para no exportar): ").strip()
+    if ruta:
+        if repositorio.exportar_plan_reposicion(plan, ruta):
+            imprimir_exito(f"Plan de compras exportado a '{ruta}'.")
+
+def menu_historial_status():
+    """Muestra cuántas horas pasó cada categoría en cada status, por día o por semana"""
+    imprimir_titulo("Historial de Status de Categorías")
+    if not operacion_disponible('reporte_tendencia_status'):
+        return
+    
+    categoria = input("Categoría (Enter para todas): ").strip().upper() or None
+    por_semana = input("¿Agrupar por semana? (s/n): ").lower() == 's'
+    periodos = validar_input_int("Cantidad de semanas" if por_semana else "Cantidad de días") or 1
+    
+    tendencia = repositorio.reporte_tendencia_status(categoria, periodos, 'semana' if por_semana else 'dia')
+    if not tendencia:
+        print("No hay historial registrado para ese período.")
+        return
+    
+    print(f"\n{'CATEGORÍA':<20} {'PERÍODO':<12} {'BAJO STOCK':<12} {'NORMAL':<12} {'EXCESO':<12}")
+    print("-" * 70)
+    for (cat, periodo), por_status in tendencia.items():
+        bajo = por_status.get("BAJO STOCK", 0) / 3600
+        normal = por_status.get("STOCK NORMAL", 0) / 3600
+        exceso = por_status.get("EXCESO DE STOCK", 0) / 3600
+        print(f"{cat[:18]:<20} {periodo:<12} {bajo:<12.1f} {normal:<12.1f} {exceso:<12.1f}")
+    print("-" * 70)
+    print("Valores en horas.")
+
+def menu_reporte_jerarquia():
+    """Stock, valor y status de cada subárbol de categorías, bajando un nivel por vez"""
+    imprimir_titulo("Stock por Jerarquía de Categorías")
+    if not operacion_disponible('reporte_jerarquia'):
+        return
+    
+    ruta = []
+    while True:
+        nivel = ruta[-1] if ruta else None
+        filas = repositorio.reporte_jerarquia(nivel)
+        print(f"\n{' > '.join(ruta) or 'Categorías raíz'}")
+        if not filas:
+            print("No hay subcategorías.")
+        else:
+            print(f"{'CATEGORÍA':<20} {'SUBCAT.':>8} {'STOCK':>10} {'VALOR':>14} {'BAJO STOCK':>11}  {'STATUS':<16}")
+            print("-" * 85)
+            for cat, subcategorias, stock, valor, bajo_stock, status in filas:
+                marca = "+" if subcategorias else " "
+                print(f"{marca}{cat[:18]:<19} {subcategorias:>8} {stock:>10} ${valor:>13,.2f} {bajo_stock:>11}  {status:<16}")
+            print("-" * 85)
+            print("(+) tiene subcategorías. BAJO STOCK = categorías del subárbol con bajo stock.")
+        
+        eleccion = input("\nCategoría para bajar un nivel (Enter para subir, 0 para salir): ").strip().upper()
+        if eleccion == '0' or (not eleccion and not ruta):
+            break
+        if not eleccion:
+            ruta.pop()
+        elif any(fila[0] == eleccion and fila[1] for fila in filas):
+            ruta.append(eleccion)
+        else:
+            imprimir_error(f"'{eleccion}' no es una subcategoría con subcategorías de este nivel.")
+
+def menu_reporte_valorizacion():
+    """Valor del inventario por categoría y total"""
+    imprimir_titulo("Valorización del Inventario")
+    
+    filas, total = repositorio.reporte_valorizacion()
+    if not filas:
+        print("No hay productos registrados.")
+        return
+    
+    print(f"{'CATEGORÍA':<20} | {'UNIDADES':>10} | {'VALOR':>15} | {'% TOTAL':>7}")
+    print("-" * 62)
+    for categoria, unidades, valor in filas:
+        porcentaje = valor / total * 100 if total else 0.0
+        print(f"{categoria or '(sin categoría)':<20} | {unidades:>10} | ${valor:>14,.2f} | {porcentaje:>6.1f}%")
+    print("-" * 62)
+    print(f"{'TOTAL':<20} | {sum(f[1] for f in filas):>10} | ${total:>14,.2f} |")
+
+def menu_ranking_cobertura():
+    """Ranking de categorías o productos por días de cobertura de stock"""
+    imprimir_titulo("Ranking de Cobertura de Stock")
+    if not operacion_disponible('ranking_cobertura'):
+        return
+    
+    nivel = input("Nivel: (1) Categorías (2) Productos [1]: ").strip() or '1'
+    orden = input("Orden: (1) Menor cobertura (2) Mayor cobertura (exceso) [1]: ").strip() or '1'
+    if nivel not in ('1', '2') or orden not in ('1', '2'):
+        imprimir_error("Opción inválida.")
+        return
+    n_str = input("Cantidad de filas [50]: ").strip()
+    n = int(n_str) if n_str.isdigit() and int(n_str) > 0 else 50
+    
+    granularidad = 'categoria' if nivel == '1' else 'producto'
+    # El stock de las categorías es el de la última actualización de estadísticas
+    if granularidad == 'categoria' and input("¿Actualizar antes el stock de las categorías? (s/n) [n]: ").lower() == 's':
+        repositorio.actualizar_estadisticas_todas_categorias()
+    mostrar_ranking_cobertura(repositorio.ranking_cobertura(n, granularidad, exceso=orden == '2'), granularidad)
+
+def mostrar_ranking_cobertura(filas, granularidad):
+    """Muestra el ranking de días de cobertura (categorías o productos)"""
+    if not filas:
+        print("No hay datos con demanda semanal registrada.")
+        return
+    
+    if granularidad == 'categoria':
+        print(f"\n{'#':>4} {'CATEGORÍA':<20} {'STOCK':>10} {'DEMANDA/SEM':>12} {'DÍAS':>10}  {'STATUS':<16}")
+        print("-" * 80)
+        for i, (cat, stock, demanda, dias, status) in enumerate(filas, start=1):
+            print(f"{i:>4} {cat[:18]:<20} {stock:>10} {demanda:>12} {dias:>10.1f}  {status:<16}")
+        print("-" * 80)
+        print("Stock de categorías según la última actualización de estadísticas "
+              "(Gestión de Categorías → Actualizar Estadísticas Automáticas).")
+    else:
+        print(f"\n{'#':>4} {'ID':<5} {'NOMBRE':<20} {'CATEGORÍA':<15} {'CANTIDAD':>9} {'DEMANDA/SEM':>12} {'DÍAS':>10}")
+        print("-" * 82)
+        for i, (id_prod, nombre, cat, cantidad, demanda, dias) in enumerate(filas, start=1):
+            print(f"{i:>4} {id_prod:<5} {nombre[:18]:<20} {cat[:13]:<15} {cantidad:>9} {demanda:>12.2f} {dias:>10.1f}")
+        print("-" * 82)
+        print("Demanda por producto = demanda de la categoría / cantidad de productos de la categoría.")
+
+def reporte_cobertura_critica():
+    """Las 50 categorías y los 50 productos con menos días de cobertura"""
+    imprimir_titulo("Menor Cobertura de Stock")
+    if not operacion_disponible('ranking_cobertura'):
+        return
+    
+    for granularidad in ('categoria', 'producto'):
+        mostrar_ranking_cobertura(repositorio.ranking_cobertura(50, granularidad), granularidad)
+
+def generar_reporte_en_archivo(reporte, ruta):
+    """Ejecuta un reporte en el hilo actual, guarda lo que imprime en el archivo y devuelve los segundos que tardó"""
+    inicio = time.perf_counter()
+    with capturar_salida() as salida:
+        # Cada reporte lee de su propio snapshot, con sus propias conexiones
+        with repositorio.snapshot_lectura():
+            reporte()
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        archivo.write(quitar_colores(salida.getvalue()))
+    return time.perf_counter() - inicio
+
+def menu_generar_todos_los_reportes():
+    """Genera todos los reportes en paralelo, cada uno en su propio archivo"""
+    imprimir_titulo("Generar Todos los Reportes")
+    
+    carpeta = input(f"Carpeta de destino [{REPORTES_DIR}]: ").strip() or REPORTES_DIR
+    try:
+        os.makedirs(carpeta, exist_ok=True)
+    except OSError as e:
+        imprimir_error(f"No se pudo crear la carpeta: {e}")
+        return
+    
+    reportes = {
+        'panel.txt': menu_panel,
+        'categorias_criticas.txt': menu_reporte_categorias_criticas,
+        'bajo_stock.txt': menu_reporte_bajo_stock,
+        'valorizacion.txt': menu_reporte_valorizacion,
+        'cobertura.txt': reporte_cobertura_critica,
+        'productos_por_categoria.txt': reporte_todas_las_categorias
+    }
+    
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(reportes)) as pool:
+        futuros = {
+            pool.submit(generar_reporte_en_archivo, reporte, os.path.join(carpeta, archivo)): archivo
+            for archivo, reporte in reportes.items()
+        }
+        for futuro in as_completed(futuros):
+            archivo = futuros[futuro]
+            try:
+                print(f"  ✓ {archivo} ({futuro.result():.2f} s)")
+            except Exception as e:
+                imprimir_error(f"No se pudo generar '{archivo}': {e}")
+    
+    imprimir_exito(f"Reportes generados en '{carpeta}' en {time.perf_counter() - inicio:.2f} s")
+
 # MENÚS PRINCIPALES
 
 def menu_productos():
@@ -474,7 +886,9 @@ def menu_productos():
         print("3. Actualizar Producto")
         print("4. Eliminar Producto")
         print("5. Buscar Producto")
-        print("6. Volver al Menú Principal")
+        print("6. Reprecio Masivo")
+        print("7. Archivo de Productos")
+        print("8. Volver al Menú Principal")
         
         opcion = input("\nSeleccione una opción: ")
         
@@ -489,6 +903,10 @@ def menu_productos():
         elif opcion == '5':
             menu_buscar_producto()
         elif opcion == '6':
+            menu_reprecio_masivo()
+        elif opcion == '7':
+            menu_archivo_productos()
+        elif opcion == '8':
             break
         else:
             imprimir_error("Opción no válida.")
@@ -504,7 +922,9 @@ def menu_categorias():
         print("3. Actualizar Demanda Semanal")
         print("4. Eliminar Categoría")
         print("5. Actualizar Estadísticas Automáticas")
-        print("6. Volver al Menú Principal")
+        print("6. Verificar Consistencia")
+        print("7. Mover Categoría (Jerarquía)")
+        print("8. Volver al Menú Principal")
         
         opcion = input("\nSeleccione una opción: ")
         
@@ -519,6 +939,10 @@ def menu_categorias():
         elif opcion == '5':
             menu_actualizar_estadisticas()
         elif opcion == '6':
+            menu_verificar_consistencia()
+        elif opcion == '7':
+            menu_mover_categoria()
+        elif opcion == '8':
             break
         else:
             imprimir_error("Opción no válida.")
@@ -533,26 +957,49 @@ def menu_reportes():
         print("2. Productos con Bajo Stock")
         print("3. Categorías Críticas")
         print("4. Productos por Categoría")
-        print("5. Volver al Menú Principal")
+        print("5. Plan de Compras (Reposición)")
+        print("6. Historial de Status de Categorías")
+        print("7. Valorización del Inventario")
+        print("8. Stock por Jerarquía de Categorías")
+        print("9. Ranking de Cobertura de Stock")
+        print("10. Generar Todos los Reportes")
+        print("11. Volver al Menú Principal")
         
         opcion = input("\nSeleccione una opción: ")
         
+        # Los reportes leen de un snapshot consistente (ver REPORTES_SNAPSHOT en config.py)
         if opcion == '1':
-            menu_panel()
+            with repositorio.snapshot_lectura():
+                menu_panel()
         elif opcion == '2':
-            menu_reporte_bajo_stock()
+            with repositorio.snapshot_lectura():
+                menu_reporte_bajo_stock()
         elif opcion == '3':
-            menu_reporte_categorias_criticas()
+            with repositorio.snapshot_lectura():
+                menu_reporte_categorias_criticas()
         elif opcion == '4':
             menu_reporte_por_categoria()
         elif opcion == '5':
+            menu_plan_reposicion()
+        elif opcion == '6':
+            menu_historial_status()
+        elif opcion == '7':
+            with repositorio.snapshot_lectura():
+                menu_reporte_valorizacion()
+        elif opcion == '8':
+            menu_reporte_jerarquia()
+        elif opcion == '9':
+            menu_ranking_cobertura()
+        elif opcion == '10':
+            menu_generar_todos_los_reportes()
+        elif opcion == '11':
             break
         else:
             imprimir_error("Opción no válida.")
 
 def main():
     """Función principal"""
-    db_manager.inicializar_db()
+    repositorio.inicializar_db()
     
     while True:
         print("\n" + "="*40)
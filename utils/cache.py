@@ -0,0 +1,54 @@
+import pickle
+import threading
+from collections import OrderedDict
+
+class CacheLRU:
+    """
+    Cache LRU con límite de entradas y de memoria.
+    El tamaño de cada valor se estima con el largo de su serialización (pickle).
+    """
+    def __init__(self, max_entradas=256, max_bytes=64 * 1024 * 1024):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self._datos = OrderedDict()  # clave -> (valor, tamaño)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+    
+    def __len__(self):
+        return len(self._datos)
+    
+    @property
+    def bytes_usados(self):
+        return self._bytes
+    
+    def obtener(self, clave):
+        """Devuelve (True, valor) si la clave está en el cache, o (False, None)"""
+        with self._lock:
+            if clave in self._datos:
+                self._datos.move_to_end(clave)
+                self.aciertos += 1
+                return True, self._datos[clave][0]
+            self.fallos += 1
+            return False, None
+    
+    def guardar(self, clave, valor):
+        """Guarda el valor, descartando los menos usados si se supera algún límite"""
+        tamano = len(pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL))
+        if tamano > self.max_bytes or self.max_entradas <= 0:
+            return
+        
+        with self._lock:
+            if clave in self._datos:
+                self._bytes -= self._datos.pop(clave)[1]
+            self._datos[clave] = (valor, tamano)
+            self._bytes += tamano
+            while len(self._datos) > self.max_entradas or self._bytes > self.max_bytes:
+                _, (_, tamano_descartado) = self._datos.popitem(last=False)
+                self._bytes -= tamano_descartado
+    
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self._bytes = 0
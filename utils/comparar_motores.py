@@ -0,0 +1,233 @@
+"""
+Verificación de conformidad y comparación de rendimiento de los motores de almacenamiento.
+
+Ejecuta sobre cada motor la misma secuencia de operaciones con resultados conocidos
+(conformidad) y después mide las operaciones más usadas por los menús.
+Trabaja en una carpeta temporal: nunca toca la base real. Termina con estado distinto
+de cero si algún motor no cumple.
+
+Uso:
+    python -m utils.comparar_motores [--productos 20000] [--categorias 200] [--repeticiones 50]
+"""
+import argparse
+import contextlib
+import io
+import random
+import sqlite3
+import sys
+import threading
+import time
+from utils.entorno_pruebas import Fallas, usar_carpeta_temporal
+
+def verificar_conformidad(repositorio):
+    """
+    Ejecuta las operaciones del repositorio (sobre una base vacía) y compara cada resultado
+    con el comportamiento de referencia de utils.db_manager.
+    
+    Returns:
+        list: descripciones de las diferencias (vacía si el motor cumple)
+    """
+    c = Fallas(repositorio.nombre)
+    r = repositorio
+    
+    with contextlib.redirect_stdout(io.StringIO()):
+        r.inicializar_db()
+        
+        # Categorías
+        c.igual("registrar_categoria", r.registrar_categoria('frutas', 0.0, 0.0, 0.0, 0, 10, 'BAJO STOCK'), True)
+        c.igual("buscar_categoria normaliza a mayúsculas", r.buscar_categoria(' Frutas '),
+                ('FRUTAS', 0.0, 0.0, 0.0, 0, 10, 2, 'BAJO STOCK'))
+        c.igual("buscar_categoria inexistente", r.buscar_categoria('NADA'), None)
+        c.igual("sugerir_categorias", r.sugerir_categorias('FRUTA')[:1], ['FRUTAS'])
+        
+        # Productos
+        c.igual("registrar_producto", r.registrar_producto('Manzana', 'roja', 5, 1.10, 'frutas'), True)
+        r.registrar_producto('Pera', '', 0, 2.30, 'FRUTAS')
+        r.registrar_producto('Tornillo', '', 100, 0.05, None)
+        ids = {fila[1]: fila[0] for fila in r.obtener_productos()}
+        c.igual("obtener_productos", sorted(ids), ['Manzana', 'Pera', 'Tornillo'])
+        c.igual("buscar_producto_id", r.buscar_producto_id(ids['Manzana']),
+                (ids['Manzana'], 'Manzana', 'roja', 5, 1.1, 'FRUTAS'))
+        c.igual("buscar_producto_id inexistente", r.buscar_producto_id(-1), None)
+        c.igual("buscar_producto_texto por nombre", [p[1] for p in r.buscar_producto_texto('man')], ['Manzana'])
+        c.igual("buscar_producto_texto por categoría", sorted(p[1] for p in r.buscar_producto_texto('frut')),
+                ['Manzana', 'Pera'])
+        c.igual("reporte_bajo_stock", [p[1] for p in r.reporte_bajo_stock(0)], ['Pera'])
+        c.igual("obtener_productos_por_categoria", [p[1] for p in r.obtener_productos_por_categoria(' frutas')],
+                ['Manzana', 'Pera'])
+        c.igual("obtener_productos_por_categoria exacta", r.obtener_productos_por_categoria('FRUT'), [])
+        c.igual("obtener_productos_por_categoria todas", [p[1] for p in r.obtener_productos_por_categoria()],
+                ['Manzana', 'Pera'])
+        
+        # Estadísticas y status
+        c.igual("calcular_estadisticas_categoria", r.calcular_estadisticas_categoria('frutas'),
+                {'mean': 1.7, 'min_price': 1.1, 'max_price': 2.3, 'stock_global': 5})
+        c.igual("calcular_estadisticas_categoria sin productos", r.calcular_estadisticas_categoria('NADA'), None)
+        c.igual("actualizar_estadisticas_todas_categorias", r.actualizar_estadisticas_todas_categorias(), True)
+        c.igual("categoría después de actualizar estadísticas", r.buscar_categoria('FRUTAS'),
+                ('FRUTAS', 1.7, 1.1, 2.3, 5, 10, 2, 'STOCK NORMAL'))
+        c.igual("obtener_estadisticas_detalladas", sorted(r.obtener_estadisticas_detalladas()),
+                [('FRUTAS', 2, 1.7, 1.22, 2.18, 0.6, 5.5)])
+        
+        c.igual("actualizar_producto", r.actualizar_producto(ids['Pera'], 'Pera', '', 3, 2.30, 'frutas'), True)
+        c.igual("actualizar_producto inexistente", r.actualizar_producto(-1, 'X', '', 1, 1.0, 'FRUTAS'), False)
+        c.igual("reporte_valorizacion", r.reporte_valorizacion(),
+                ([('FRUTAS', 8, 12.4), (None, 100, 5.0)], 17.4))
+        
+        c.igual("actualizar_stock_categoria", r.actualizar_stock_categoria('frutas', 20), True)
+        c.igual("status recalculado", r.buscar_categoria('FRUTAS')[4:], (20, 10, 2, 'EXCESO DE STOCK'))
+        c.igual("actualizar_status_categoria", r.actualizar_status_categoria('frutas', 'BAJO STOCK'), True)
+        c.igual("actualizar_status_categoria inexistente", r.actualizar_status_categoria('NADA', 'BAJO STOCK'), False)
+        c.igual("actualizar_categoria", r.actualizar_categoria('frutas', 1.0, 1.0, 1.0, 8, 50, 'BAJO STOCK'), True)
+        c.igual("stock de protección recalculado", r.buscar_categoria('FRUTAS'),
+                ('FRUTAS', 1.0, 1.0, 1.0, 8, 50, 10, 'BAJO STOCK'))
+        c.igual("actualizar_categoria inexistente", r.actualizar_categoria('NADA', 0, 0, 0, 0, 1, 'BAJO STOCK'), False)
+        
+        with r.snapshot_lectura():
+            c.igual("lectura dentro de snapshot_lectura", len(r.obtener_categorias()), 1)
+            escritor = threading.Thread(target=r.registrar_categoria,
+                                        args=('VERDURAS', 0.0, 0.0, 0.0, 0, 10, 'BAJO STOCK'))
+            escritor.start()
+            escritor.join(5)
+            c.igual("otro hilo escribe sin esperar al snapshot", escritor.is_alive(), False)
+            c.igual("el snapshot no ve la escritura de otro hilo", r.buscar_categoria('VERDURAS'), None)
+            c.igual("escritura dentro de snapshot_lectura", r.registrar_categoria('PERDIDA', 0.0, 0.0, 0.0, 0, 10, 'BAJO STOCK'),
+                    False)
+        escritor.join()
+        c.igual("después del snapshot se ve la escritura", r.buscar_categoria('VERDURAS') is not None, True)
+        c.igual("la escritura dentro del snapshot no se guardó", r.buscar_categoria('PERDIDA'), None)
+        r.eliminar_categoria('VERDURAS')
+        c.igual("obtener_almacenes devuelve una lista", isinstance(r.obtener_almacenes(), list), True)
+        c.igual("no expone funciones fuera de las operaciones", hasattr(r, 'conectar_db'), False)
+        
+        # Bajas
+        c.igual("eliminar_producto", r.eliminar_producto(ids['Tornillo']), True)
+        c.igual("eliminar_producto repetido", r.eliminar_producto(ids['Tornillo']), False)
+        c.igual("eliminar_categoria", r.eliminar_categoria('frutas'), True)
+        c.igual("eliminar_categoria repetido", r.eliminar_categoria('frutas'), False)
+        c.igual("sugerir_categorias después de eliminar", r.sugerir_categorias('FRUTAS'), [])
+    
+    return c.fallas
+
+def _medir(funcion, repeticiones=1, antes=None):
+    """Milisegundos promedio por llamada (sin contar antes(), que se llama antes de cada una)"""
+    total = 0.0
+    for _ in range(repeticiones):
+        if antes is not None:
+            antes()
+        inicio = time.perf_counter()
+        funcion()
+        total += time.perf_counter() - inicio
+    return total * 1000 / repeticiones
+
+def comparar_rendimiento(repositorio, productos=20000, categorias=200, repeticiones=50, semilla=1):
+    """
+    Carga la misma base en el repositorio y mide las operaciones de los menús.
+    Las lecturas que SQLite guarda en el cache de reportes se miden con el cache vacío
+    en cada llamada, como el motor en memoria (que no tiene cache); las filas
+    "(con cache)" repiten la medición sin vaciarlo.
+    
+    Returns:
+        dict: {operacion: milisegundos por llamada}
+    """
+    from utils import db_manager
+    
+    azar = random.Random(semilla)
+    r = repositorio
+    tiempos = {}
+    
+    def medir_lectura(operacion, funcion, repeticiones):
+        tiempos[operacion] = _medir(funcion, repeticiones, antes=db_manager.vaciar_cache_reportes)
+        tiempos[f"{operacion} (con cache)"] = _medir(funcion, repeticiones)
+    
+    with contextlib.redirect_stdout(io.StringIO()):
+        r.inicializar_db()
+        nombres = [f"CAT{i:04d}" for i in range(categorias)]
+        for nombre in nombres:
+            r.registrar_categoria(nombre, 0.0, 0.0, 0.0, 0, azar.randint(1, 500), 'BAJO STOCK')
+        
+        filas = [(f"Producto {i}", '', azar.randint(0, 50), round(azar.uniform(1, 500), 2), azar.choice(nombres))
+                 for i in range(productos)]
+        inicio = time.perf_counter()
+        for fila in filas:
+            r.registrar_producto(*fila)
+        tiempos['registrar_producto'] = (time.perf_counter() - inicio) * 1000 / productos
+        
+        ids = [fila[0] for fila in r.obtener_productos()]
+        medir_lectura('obtener_productos', r.obtener_productos, max(1, repeticiones // 10))
+        tiempos['buscar_producto_id'] = _medir(lambda: r.buscar_producto_id(azar.choice(ids)), repeticiones * 10)
+        medir_lectura('buscar_producto_texto', lambda: r.buscar_producto_texto(f"Producto {azar.randint(0, 999)}"),
+                      repeticiones)
+        tiempos['reporte_bajo_stock'] = _medir(lambda: r.reporte_bajo_stock(azar.randint(0, 5)), repeticiones)
+        tiempos['actualizar_producto'] = _medir(
+            lambda: r.actualizar_producto(azar.choice(ids), 'Editado', '', azar.randint(0, 50),
+                                          round(azar.uniform(1, 500), 2), azar.choice(nombres)), repeticiones)
+        tiempos['calcular_estadisticas_categoria'] = _medir(
+            lambda: r.calcular_estadisticas_categoria(azar.choice(nombres)), repeticiones)
+        tiempos['actualizar_estadisticas_todas'] = _medir(r.actualizar_estadisticas_todas_categorias,
+                                                          max(1, repeticiones // 10))
+        medir_lectura('obtener_categorias', r.obtener_categorias, repeticiones)
+        medir_lectura('reporte_valorizacion', r.reporte_valorizacion, max(1, repeticiones // 10))
+    return tiempos
+
+def _vaciar_base(ruta):
+    """
+    Borra los datos de todas las tablas. No se borra el archivo: db_manager mantiene
+    conexiones abiertas (versión de los datos, WAL) que seguirían viendo el anterior.
+    """
+    conn = sqlite3.connect(ruta)
+    try:
+        tablas = [fila[0] for fila in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        for tabla in tablas:
+            conn.execute(f"DELETE FROM {tabla}")
+        conn.commit()
+    finally:
+        conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Conformidad y rendimiento de los motores de almacenamiento")
+    parser.add_argument('--productos', type=int, default=20000)
+    parser.add_argument('--categorias', type=int, default=200)
+    parser.add_argument('--repeticiones', type=int, default=50)
+    args = parser.parse_args()
+    
+    # Todo se hace en una carpeta temporal (la configuración se lee recién al importar)
+    usar_carpeta_temporal('inventario_motores_')
+    
+    from utils.helpers import imprimir_titulo, imprimir_exito, imprimir_error
+    from utils.repositorio import MOTORES, OPERACIONES
+    
+    imprimir_titulo("Conformidad")
+    fallas_totales = []
+    for nombre, motor in MOTORES.items():
+        repositorio = motor()
+        faltantes = [op for op in OPERACIONES if not hasattr(repositorio, op)]
+        fallas = [f"[{nombre}] falta la operación {op}" for op in faltantes] or verificar_conformidad(repositorio)
+        if fallas:
+            for falla in fallas:
+                imprimir_error(falla)
+        else:
+            imprimir_exito(f"{nombre}: cumple las {len(OPERACIONES)} operaciones")
+        fallas_totales.extend(fallas)
+    
+    # Un motor que no cumple no se mide, y el estado de salida lo indica
+    if fallas_totales:
+        sys.exit(1)
+    
+    # Cada motor mide sobre una base vacía
+    _vaciar_base('inventario.db')
+    resultados = {nombre: comparar_rendimiento(motor(), args.productos, args.categorias, args.repeticiones)
+                  for nombre, motor in MOTORES.items()}
+    
+    imprimir_titulo(f"Rendimiento (ms por operación, {args.productos} productos)")
+    nombres = list(resultados)
+    ancho = max([32] + [len(operacion) + 2 for operacion in resultados[nombres[0]]])
+    print(f"{'OPERACIÓN':<{ancho}}" + "".join(f"{nombre:>12}" for nombre in nombres) + f"{'RELACIÓN':>10}")
+    print("-" * (ancho + 10 + 12 * len(nombres)))
+    for operacion in resultados[nombres[0]]:
+        valores = [resultados[nombre][operacion] for nombre in nombres]
+        relacion = valores[0] / valores[-1] if valores[-1] else float('inf')
+        print(f"{operacion:<{ancho}}" + "".join(f"{valor:>12.3f}" for valor in valores) + f"{relacion:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
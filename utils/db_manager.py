@@ -1,9 +1,634 @@
+import atexit
+import csv
+import heapq
+import json
+import math
 import sqlite3
-from config import DB_NAME, TABLE_NAME, TABLE_CATEGORIAS
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from copy import deepcopy
+from datetime import date, datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from functools import wraps
+from itertools import groupby
+from operator import itemgetter
+from config import (
+    DB_NAME, TABLE_NAME, TABLE_CATEGORIAS, TABLE_ESTADISTICAS,
+    TABLE_HISTORIAL, TABLE_HISTORIAL_DIARIO, TABLE_HISTORIAL_SEMANAL, TABLE_HISTORIAL_ESTADO, TABLE_EVENTOS,
+    TABLE_ARCHIVO, ARCHIVO_DIAS_INACTIVIDAD, TABLE_JERARQUIA,
+    REPOSICION_LEAD_TIME_DIAS, REPOSICION_PERIODO_REVISION_DIAS, REPORTES_SNAPSHOT,
+    PERFILES_ALMACENAMIENTO, PERFIL_ALMACENAMIENTO, ALMACENES, ALMACENES_HILOS,
+    CACHE_REPORTES_MAX_ENTRADAS, CACHE_REPORTES_MAX_BYTES
+)
+from utils.cache import CacheLRU
 from utils.helpers import imprimir_error
+from utils.trigramas import IndiceTrigramas
+
+if PERFIL_ALMACENAMIENTO not in PERFILES_ALMACENAMIENTO:
+    raise ValueError(f"Perfil de almacenamiento desconocido: {PERFIL_ALMACENAMIENTO}")
+
+# Estado por hilo (conexión del snapshot de lectura activo)
+_estado_hilo = threading.local()
+
+class _ConexionSnapshot(sqlite3.Connection):
+    """
+    Conexión de snapshot: su context manager no confirma ni cierra la transacción de lectura.
+    Es de solo lectura (PRAGMA query_only), así una escritura dentro del bloque falla en lugar de perderse.
+    """
+    def __exit__(self, tipo, valor, traza):
+        return False
+
+def aplicar_perfil(conn, perfil=PERFIL_ALMACENAMIENTO):
+    """Aplica a la conexión los PRAGMAs del perfil de almacenamiento"""
+    for pragma, valor in PERFILES_ALMACENAMIENTO[perfil].items():
+        conn.execute(f"PRAGMA {pragma}={valor}")
+    return conn
 
 def conectar_db():
-    return sqlite3.connect(DB_NAME)
+    # Dentro de un snapshot de lectura todas las consultas del hilo usan la misma conexión
+    snapshot = _snapshot_activo()
+    if snapshot is not None:
+        return snapshot
+    # Confirma las escrituras en cola para que toda operación posterior las vea
+    flush()
+    return aplicar_perfil(sqlite3.connect(DB_NAME))
+
+def conectar_almacen(almacen=None):
+    """Conexión al archivo con los productos del almacén (DB_NAME si hay un solo almacén)"""
+    flush()
+    return aplicar_perfil(sqlite3.connect(_ruta_almacen(almacen)))
+
+# BUFFER DE ESCRITURA DIFERIDA
+
+class BufferEscritura:
+    """
+    Cola de escrituras de productos que se confirman juntas en una sola transacción
+    cuando se alcanza max_operaciones o pasan max_segundos desde la primera en cola.
+    Una escritura que falla por sí misma (restricción, datos inválidos) se descarta y
+    el resto del lote se confirma igual. Si el archivo está bloqueado, el lote queda en
+    cola y se descarta después de max_reintentos flush fallidos seguidos.
+    Las escrituras descartadas quedan en 'descartadas' como (ruta, sql, parametros, error).
+    """
+    def __init__(self, max_operaciones=500, max_segundos=1.0, max_reintentos=3):
+        self.max_operaciones = max_operaciones
+        self.max_segundos = max_segundos
+        self.max_reintentos = max_reintentos
+        self.descartadas = []
+        self._pendientes = []
+        self._reintentos = {}
+        self._lock = threading.RLock()
+        self._temporizador = None
+    
+    def __len__(self):
+        return len(self._pendientes)
+    
+    def agregar(self, ruta, sql, parametros):
+        with self._lock:
+            self._pendientes.append((ruta, sql, parametros))
+            if len(self._pendientes) >= self.max_operaciones:
+                self.flush()
+            elif self._temporizador is None:
+                self._temporizador = threading.Timer(self.max_segundos, self.flush)
+                self._temporizador.daemon = True
+                self._temporizador.start()
+    
+    def flush(self):
+        """Confirma todas las escrituras en cola, en una sola transacción por archivo de almacén"""
+        with self._lock:
+            if self._temporizador is not None:
+                self._temporizador.cancel()
+                self._temporizador = None
+            if not self._pendientes:
+                return True
+            
+            por_archivo = {}
+            for ruta, sql, parametros in self._pendientes:
+                por_archivo.setdefault(ruta, []).append((sql, parametros))
+            
+            pendientes = []
+            sin_errores = True
+            for ruta, escrituras in por_archivo.items():
+                try:
+                    sin_errores &= self._confirmar_archivo(ruta, escrituras)
+                    self._reintentos.pop(ruta, None)
+                except sqlite3.Error as e:
+                    # Archivo bloqueado o inaccesible: se reintenta con el próximo flush, hasta el límite
+                    sin_errores = False
+                    self._reintentos[ruta] = self._reintentos.get(ruta, 0) + 1
+                    if self._reintentos[ruta] < self.max_reintentos:
+                        pendientes.extend((ruta, sql, parametros) for sql, parametros in escrituras)
+                        imprimir_error(f"Error al confirmar escrituras en cola de '{ruta}' (se reintentará): {e}")
+                    else:
+                        del self._reintentos[ruta]
+                        self.descartadas.extend((ruta, sql, parametros, str(e)) for sql, parametros in escrituras)
+                        imprimir_error(f"Se descartan {len(escrituras)} escrituras en cola de '{ruta}': {e}")
+            self._pendientes = pendientes
+            return sin_errores
+    
+    def _confirmar_archivo(self, ruta, escrituras):
+        """
+        Confirma las escrituras de un archivo en una transacción. Si una escritura falla,
+        se descarta y se vuelve a intentar el resto. Los errores de bloqueo o de acceso
+        al archivo se propagan sin descartar nada.
+        """
+        conn = aplicar_perfil(sqlite3.connect(ruta))
+        sin_errores = True
+        try:
+            while escrituras:
+                try:
+                    with conn:
+                        for i, (sql, parametros) in enumerate(escrituras):
+                            conn.execute(sql, parametros)
+                    return sin_errores
+                except sqlite3.OperationalError as e:
+                    if _es_bloqueo(e):
+                        raise
+                    error = e
+                except (sqlite3.IntegrityError, sqlite3.InterfaceError, sqlite3.ProgrammingError) as e:
+                    error = e
+                # Se descarta la escritura que falló; la transacción ya se deshizo
+                sql, parametros = escrituras[i]
+                self.descartadas.append((ruta, sql, parametros, str(error)))
+                imprimir_error(f"Se descarta una escritura en cola ({error}): {parametros}")
+                escrituras = escrituras[:i] + escrituras[i + 1:]
+                sin_errores = False
+            return sin_errores
+        finally:
+            conn.close()
+
+def _es_bloqueo(error):
+    """Indica si el error de SQLite es por un bloqueo o por no poder abrir el archivo (transitorio)"""
+    mensaje = str(error).lower()
+    return 'locked' in mensaje or 'busy' in mensaje or 'unable to open' in mensaje
+
+_buffer = None
+
+def activar_buffer_escritura(max_operaciones=500, max_segundos=1.0):
+    """Activa el buffer de escritura diferida para registrar_producto y actualizar_producto"""
+    global _buffer
+    if _buffer is not None:
+        _buffer.flush()
+    _buffer = BufferEscritura(max_operaciones, max_segundos)
+
+def desactivar_buffer_escritura():
+    """Confirma las escrituras pendientes y vuelve a confirmar cada escritura por separado"""
+    global _buffer
+    if _buffer is not None:
+        buffer, _buffer = _buffer, None
+        return buffer.flush()
+    return True
+
+def flush():
+    """Confirma las escrituras en cola del buffer (si está activo)"""
+    if _buffer is not None and len(_buffer):
+        return _buffer.flush()
+    return True
+
+# Confirma lo que quede en cola al salir del programa
+atexit.register(flush)
+
+@contextmanager
+def snapshot_lectura(modo=REPORTES_SNAPSHOT):
+    """
+    Ejecuta las lecturas del bloque contra una vista consistente de la base de datos.
+    - 'wal': mantiene una transacción de lectura en modo WAL durante todo el bloque.
+      Los escritores siguen confirmando cambios, pero el bloque no los ve.
+    - 'memoria': copia la base a memoria con la API de backup y lee de la copia.
+      La versión se fija al abrir el bloque, pero la copia se hace recién en la primera
+      consulta que no sale del cache de reportes (si todo sale del cache, no se copia).
+    - None: no usa snapshot (cada consulta ve el último estado confirmado).
+    Los archivos de los almacenes se adjuntan a la conexión del snapshot.
+    Solo para lecturas: las escrituras con conectar_db() dentro del bloque fallan
+    (sqlite3.OperationalError), porque la conexión del snapshot es de solo lectura.
+    """
+    # Sin snapshot o con uno ya activo en este hilo, no hace nada
+    if not modo or getattr(_estado_hilo, 'snapshot', None) is not None:
+        yield
+        return
+    if modo not in ('wal', 'memoria'):
+        raise ValueError(f"Modo de snapshot desconocido: {modo}")
+    
+    # El snapshot incluye las escrituras que estaban en cola
+    flush()
+    
+    # Versión de los datos antes de fijar el snapshot (para poder usar el cache de reportes)
+    version_inicial = version_datos()
+    
+    conn = sqlite3.connect(DB_NAME, factory=_ConexionSnapshot, isolation_level=None)
+    aplicar_perfil(adjuntar_almacenes(conn))
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA query_only=1")
+    conn.execute("BEGIN")
+    # La primera lectura de cada base fija su snapshot
+    conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+    for alias, _ in _ALMACENES.values():
+        conn.execute(f"SELECT COUNT(*) FROM {alias}.sqlite_master").fetchone()
+    
+    # Si nadie escribió mientras se fijaba el snapshot, sus lecturas corresponden a esa versión
+    version = version_datos()
+    _estado_hilo.version_snapshot = version if version == version_inicial else None
+    if _estado_hilo.version_snapshot is not None:
+        _sincronizar_cache(version)
+    
+    _estado_hilo.snapshot = conn
+    _estado_hilo.copiar_snapshot = modo == 'memoria'
+    _estado_hilo.copias_snapshot = []
+    try:
+        yield
+    finally:
+        conn = _estado_hilo.snapshot
+        copias = _estado_hilo.copias_snapshot
+        _estado_hilo.snapshot = None
+        _estado_hilo.version_snapshot = None
+        _estado_hilo.copiar_snapshot = False
+        _estado_hilo.copias_snapshot = []
+        if conn.in_transaction:
+            conn.rollback()
+        conn.close()
+        for copia in copias:
+            copia.close()
+
+def _snapshot_activo():
+    """
+    Conexión del snapshot de lectura del hilo (None fuera de un snapshot).
+    En modo 'memoria', la primera llamada copia a memoria la versión fijada.
+    """
+    snapshot = getattr(_estado_hilo, 'snapshot', None)
+    if snapshot is not None and _estado_hilo.copiar_snapshot:
+        _estado_hilo.copiar_snapshot = False
+        _estado_hilo.snapshot = snapshot = _copiar_snapshot(snapshot)
+    return snapshot
+
+def _copiar_snapshot(fijada):
+    """
+    Copia a memoria la base y los almacenes tal como los ve la transacción de lectura
+    de la conexión fijada (el backup usa esa transacción), y cierra la fijada.
+    """
+    conn = sqlite3.connect(':memory:', factory=_ConexionSnapshot, uri=True)
+    try:
+        fijada.backup(conn)
+        for alias, _ in _ALMACENES.values():
+            # Cada almacén se copia a una base en memoria compartida que luego se adjunta
+            uri = f"file:snapshot_{id(conn)}_{alias}?mode=memory&cache=shared"
+            copia = sqlite3.connect(uri, uri=True)
+            _estado_hilo.copias_snapshot.append(copia)
+            fijada.backup(copia, name=alias)
+            conn.execute(f"ATTACH DATABASE ? AS {alias}", (uri,))
+        conn.execute("PRAGMA query_only=1")
+    except sqlite3.Error:
+        conn.close()
+        raise
+    fijada.rollback()
+    fijada.close()
+    return conn
+
+# ALMACENES
+
+# Nombre del almacén -> (alias para ATTACH, archivo de base de datos)
+_ALMACENES = {
+    nombre: (f"alm_{i}", archivo)
+    for i, (nombre, archivo) in enumerate(ALMACENES.items(), start=1)
+}
+
+# Cada almacén numera sus productos en su propio rango, así los IDs no se repiten entre almacenes
+_RANGO_IDS_ALMACEN = 10 ** 12
+
+_pool_almacenes = None
+
+def _pool():
+    """Pool de hilos compartido para las consultas en paralelo sobre los almacenes"""
+    global _pool_almacenes
+    if _pool_almacenes is None:
+        _pool_almacenes = ThreadPoolExecutor(max_workers=ALMACENES_HILOS)
+    return _pool_almacenes
+
+def obtener_almacenes():
+    """Devuelve los nombres de los almacenes configurados (lista vacía si hay un solo almacén)"""
+    return list(_ALMACENES)
+
+def _ruta_almacen(almacen=None):
+    """Archivo con los productos del almacén. Sin almacén se usa el primero configurado."""
+    if not _ALMACENES:
+        return DB_NAME
+    if almacen is None:
+        return next(iter(_ALMACENES.values()))[1]
+    clave = almacen.strip().upper()
+    if clave not in _ALMACENES:
+        raise ValueError(f"Almacén desconocido: {almacen}")
+    return _ALMACENES[clave][1]
+
+def adjuntar_almacenes(conn):
+    """Adjunta (ATTACH) a la conexión los archivos de todos los almacenes"""
+    for alias, archivo in _ALMACENES.values():
+        conn.execute(f"ATTACH DATABASE ? AS {alias}", (archivo,))
+    return conn
+
+def conectar_db_almacenes():
+    """Conexión a la base principal con los archivos de todos los almacenes adjuntos"""
+    conn = conectar_db()
+    if conn is getattr(_estado_hilo, 'snapshot', None):
+        return conn  # El snapshot ya tiene los almacenes adjuntos
+    return adjuntar_almacenes(conn)
+
+def _ruta_de_producto(id_prod):
+    """Archivo del almacén que contiene el producto, o None si no existe"""
+    archivos = [archivo for _, archivo in _ALMACENES.values()] or [DB_NAME]
+    for archivo in archivos:
+        if _existe_producto(archivo, id_prod):
+            return archivo
+    return None
+
+def _existe_producto(ruta, id_prod):
+    """
+    Indica si el producto está en el archivo. No confirma el buffer de escritura:
+    los productos en cola todavía no tienen ID, así que no cambian el resultado.
+    """
+    conn = aplicar_perfil(sqlite3.connect(ruta))
+    try:
+        return conn.execute(f"SELECT 1 FROM {TABLE_NAME} WHERE id = ?", (id_prod,)).fetchone() is not None
+    finally:
+        conn.close()
+
+def _tablas_productos(tabla=TABLE_NAME):
+    """
+    Tabla de productos (o la indicada, como el archivo) de cada almacén, tal como se ve
+    desde conectar_db_almacenes(). Sin almacenes devuelve {None: tabla de la base principal}.
+    """
+    if not _ALMACENES:
+        return {None: tabla}
+    return {nombre: f"{alias}.{tabla}" for nombre, (alias, _) in _ALMACENES.items()}
+
+def _tablas_consulta(prefijo='', archivados=False):
+    """
+    Reemplazos de {productos} y {archivo} en las consultas de _consultar_almacenes.
+    Con archivados=True, {productos} incluye también los productos archivados.
+    """
+    productos = f"{prefijo}{TABLE_NAME}"
+    archivo = f"{prefijo}{TABLE_ARCHIVO}"
+    if archivados:
+        productos = f"(SELECT {_COLUMNAS_TABLA} FROM {productos} UNION ALL SELECT {_COLUMNAS_TABLA} FROM {archivo})"
+    return {'productos': productos, 'archivo': archivo}
+
+def _consultar_almacenes(sql, parametros=(), archivados=False):
+    """
+    Ejecuta la consulta sobre los productos de todos los almacenes y junta los resultados.
+    En la consulta, {productos} se reemplaza por la tabla de productos de cada almacén
+    (con archivados=True, junto con los archivados) y {archivo} por la de archivados.
+    Fuera de un snapshot, cada almacén se consulta en paralelo con su propia conexión.
+    """
+    if not _ALMACENES:
+        with conectar_db() as conn:
+            return conn.execute(sql.format(**_tablas_consulta('', archivados)), parametros).fetchall()
+    
+    snapshot = _snapshot_activo()
+    if snapshot is not None:
+        # Dentro del snapshot se leen los almacenes adjuntos a su conexión
+        return [fila for alias, _ in _ALMACENES.values()
+                for fila in snapshot.execute(sql.format(**_tablas_consulta(f"{alias}.", archivados)), parametros)]
+    
+    flush()
+    def consultar(archivo):
+        conn = aplicar_perfil(sqlite3.connect(archivo))
+        try:
+            return conn.execute(sql.format(**_tablas_consulta('', archivados)), parametros).fetchall()
+        finally:
+            conn.close()
+    
+    resultados = _pool().map(consultar, [archivo for _, archivo in _ALMACENES.values()])
+    return [fila for filas in resultados for fila in filas]
+
+def _leer_ordenado(sql, parametros, clave):
+    """
+    Recorre los productos de todos los almacenes en el orden del ORDER BY de la consulta,
+    mezclando los cursores de cada almacén sin cargarlos completos en memoria.
+    La clave debe devolver, para cada fila, las columnas del ORDER BY.
+    """
+    if not _ALMACENES:
+        yield from conectar_db().execute(sql.format(productos=TABLE_NAME), parametros)
+        return
+    
+    snapshot = _snapshot_activo()
+    if snapshot is not None:
+        cursores = [snapshot.execute(sql.format(productos=f"{alias}.{TABLE_NAME}"), parametros)
+                    for alias, _ in _ALMACENES.values()]
+        yield from heapq.merge(*cursores, key=clave)
+        return
+    
+    flush()
+    conexiones = [aplicar_perfil(sqlite3.connect(archivo)) for _, archivo in _ALMACENES.values()]
+    try:
+        cursores = [conn.execute(sql.format(productos=TABLE_NAME), parametros) for conn in conexiones]
+        yield from heapq.merge(*cursores, key=clave)
+    finally:
+        for conn in conexiones:
+            conn.close()
+
+def _agregar_por_categoria(categoria=None):
+    """
+    Precio promedio, mínimo, máximo y stock por categoría, combinando los parciales de
+    cada almacén. Si se indica una categoría, solo calcula esa.
+    """
+    filtro = "categoria = ?" if categoria else "categoria IS NOT NULL"
+    parametros = (categoria,) if categoria else ()
+    sql = f"""SELECT categoria, SUM(precio_centavos), COUNT(*), MIN(precio_centavos), MAX(precio_centavos), SUM(cantidad)
+              FROM {{productos}} WHERE {filtro} GROUP BY categoria"""
+    return _combinar_agregados(_consultar_almacenes(sql, parametros))
+
+def _combinar_agregados(filas):
+    """
+    Combina los parciales (categoria, suma, cuenta, mínimo, máximo, stock) de cada
+    almacén en las estadísticas de cada categoría. Los precios llegan en centavos
+    (sumas exactas) y se devuelven en pesos.
+    """
+    parciales = {}
+    for cat, suma, cuenta, minimo, maximo, stock in filas:
+        if cat in parciales:
+            previo = parciales[cat]
+            parciales[cat] = (previo[0] + suma, previo[1] + cuenta, min(previo[2], minimo),
+                              max(previo[3], maximo), previo[4] + stock)
+        else:
+            parciales[cat] = (suma, cuenta, minimo, maximo, stock)
+    
+    return {
+        cat: {
+            'mean': round(suma / cuenta / 100, 2),
+            'min_price': minimo / 100,
+            'max_price': maximo / 100,
+            'stock_global': stock or 0
+        }
+        for cat, (suma, cuenta, minimo, maximo, stock) in parciales.items()
+    }
+
+# CACHE DE REPORTES
+
+_cache_reportes = CacheLRU(CACHE_REPORTES_MAX_ENTRADAS, CACHE_REPORTES_MAX_BYTES)
+_version_cache = None
+
+# Conexión que solo lee PRAGMA data_version: el valor cambia cuando otra conexión confirma cambios
+_conexion_version = None
+_lock_version = threading.Lock()
+
+def version_datos():
+    """Versión actual de los datos (de la base principal y de cada almacén)"""
+    global _conexion_version
+    with _lock_version:
+        if _conexion_version is None:
+            _conexion_version = adjuntar_almacenes(sqlite3.connect(DB_NAME, check_same_thread=False))
+        esquemas = ['main'] + [alias for alias, _ in _ALMACENES.values()]
+        return tuple(_conexion_version.execute(f"PRAGMA {esquema}.data_version").fetchone()[0]
+                     for esquema in esquemas)
+
+def _sincronizar_cache(version):
+    """Vacía el cache si los datos cambiaron desde la última versión vista"""
+    global _version_cache
+    if version != _version_cache:
+        _cache_reportes.limpiar()
+        _version_cache = version
+
+def vaciar_cache_reportes():
+    """Vacía el cache de reportes (por ejemplo, para medir las consultas sin cache)"""
+    _cache_reportes.limpiar()
+
+def _cache_reporte(mensaje_error, por_defecto):
+    """
+    Guarda en memoria el resultado de una consulta de reportes, según sus parámetros.
+    Cualquier escritura confirmada cambia la versión de los datos y vacía el cache.
+    Dentro de un snapshot se usa la versión en la que quedó fijado; si no se pudo
+    determinar o ya no es la actual, se consulta la base sin cache.
+    
+    La función decorada deja pasar los sqlite3.Error: el error se informa acá con
+    mensaje_error y se devuelve una copia de por_defecto, que nunca se guarda en el
+    cache (la siguiente llamada vuelve a consultar la base).
+    """
+    def decorador(funcion):
+        @wraps(funcion)
+        def envoltura(*args, **kwargs):
+            try:
+                if getattr(_estado_hilo, 'snapshot', None) is not None:
+                    version = getattr(_estado_hilo, 'version_snapshot', None)
+                    if version is None or version != _version_cache:
+                        return funcion(*args, **kwargs)
+                else:
+                    flush()
+                    version = version_datos()
+                    _sincronizar_cache(version)
+                
+                clave = (funcion.__name__, args, tuple(sorted(kwargs.items())), version)
+                encontrado, resultado = _cache_reportes.obtener(clave)
+                if not encontrado:
+                    resultado = funcion(*args, **kwargs)
+                    _cache_reportes.guardar(clave, resultado)
+            except sqlite3.Error as e:
+                imprimir_error(f"{mensaje_error}: {e}")
+                return deepcopy(por_defecto)
+            return _copiar_resultado(resultado)
+        return envoltura
+    return decorador
+
+def _copiar_resultado(resultado):
+    """
+    Copia de un resultado del cache para que quien llama no modifique el guardado.
+    Se copian las listas, también las que están dentro de una tupla (como la de
+    reporte_valorizacion); las filas son tuplas de valores y se comparten.
+    """
+    if isinstance(resultado, list):
+        return list(resultado)
+    if isinstance(resultado, tuple) and any(isinstance(valor, (list, dict, set)) for valor in resultado):
+        return tuple(_copiar_resultado(valor) for valor in resultado)
+    if isinstance(resultado, (dict, set)):
+        return deepcopy(resultado)
+    return resultado
+
+# Los precios se guardan en centavos enteros: las sumas son exactas
+_SQL_TABLA_PRODUCTOS = '''
+    CREATE TABLE IF NOT EXISTS {tabla} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre TEXT NOT NULL,
+        descripcion TEXT,
+        cantidad INTEGER NOT NULL,
+        precio_centavos INTEGER NOT NULL,
+        categoria TEXT,
+        actualizado_en REAL
+    )
+    '''
+
+# Productos archivados: mismas columnas (conservan el ID) y la fecha en que se archivaron
+_SQL_TABLA_ARCHIVO = f'''
+    CREATE TABLE IF NOT EXISTS {TABLE_ARCHIVO} (
+        id INTEGER PRIMARY KEY,
+        nombre TEXT NOT NULL,
+        descripcion TEXT,
+        cantidad INTEGER NOT NULL,
+        precio_centavos INTEGER NOT NULL,
+        categoria TEXT,
+        actualizado_en REAL,
+        archivado_en REAL NOT NULL
+    )
+    '''
+
+# Columnas de un producto tal como las devuelven las consultas (precio en pesos)
+_COLUMNAS_PRODUCTO = "id, nombre, descripcion, cantidad, precio_centavos / 100.0 AS precio, categoria"
+
+# Columnas comunes de la tabla de productos y la de archivados
+_COLUMNAS_TABLA = "id, nombre, descripcion, cantidad, precio_centavos, categoria, actualizado_en"
+
+def a_centavos(precio):
+    """Convierte un precio en pesos a centavos enteros (redondeo comercial)"""
+    return int((Decimal(str(precio)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+def _crear_tablas_productos(cursor):
+    """Crea la tabla de productos y sus índices (en la base principal o en la de un almacén)"""
+    _migrar_precio_a_centavos(cursor)
+    cursor.execute(_SQL_TABLA_PRODUCTOS.format(tabla=TABLE_NAME))
+    _migrar_actualizado_en(cursor)
+    
+    # Índice para leer los precios ya ordenados por categoría
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE_NAME}_categoria_precio ON {TABLE_NAME} (categoria, precio_centavos)")
+    
+    # Archivo de productos inactivos; el índice parcial solo cubre los candidatos (sin stock)
+    cursor.execute(_SQL_TABLA_ARCHIVO)
+    cursor.execute(f"""CREATE INDEX IF NOT EXISTS idx_{TABLE_NAME}_inactivos ON {TABLE_NAME} (actualizado_en)
+                       WHERE cantidad = 0""")
+    
+    # Registro de cambios de los productos
+    _crear_tabla_eventos(cursor)
+    _crear_triggers_eventos(cursor, TABLE_NAME, 'producto', 'id',
+                            ['nombre', 'descripcion', 'cantidad', 'precio_centavos', 'categoria'])
+
+def _migrar_precio_a_centavos(cursor):
+    """
+    Convierte una tabla de productos con precio REAL (versiones anteriores) a centavos enteros.
+    SQLite no permite cambiar el tipo de una columna: se crea la tabla nueva, se copian los
+    datos y se reemplaza la anterior. El índice y los triggers se vuelven a crear después,
+    y se conserva el contador de IDs (cada almacén tiene su propio rango).
+    """
+    columnas = [fila[1] for fila in cursor.execute(f"PRAGMA table_info({TABLE_NAME})")]
+    if 'precio' not in columnas:
+        return
+    
+    secuencia = cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (TABLE_NAME,)).fetchone()
+    cursor.execute(_SQL_TABLA_PRODUCTOS.format(tabla=f"{TABLE_NAME}_centavos"))
+    cursor.execute(f"""INSERT INTO {TABLE_NAME}_centavos (id, nombre, descripcion, cantidad, precio_centavos, categoria, actualizado_en)
+                       SELECT id, nombre, descripcion, cantidad, CAST(ROUND(precio * 100) AS INTEGER), categoria, {_SQL_AHORA}
+                       FROM {TABLE_NAME}""")
+    cursor.execute(f"DROP TABLE {TABLE_NAME}")
+    cursor.execute(f"ALTER TABLE {TABLE_NAME}_centavos RENAME TO {TABLE_NAME}")
+    if secuencia:
+        cursor.execute("DELETE FROM sqlite_sequence WHERE name = ?", (TABLE_NAME,))
+        cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (TABLE_NAME, secuencia[0]))
+    print(f"✓ Precios de {TABLE_NAME} migrados a centavos")
+
+def _migrar_actualizado_en(cursor):
+    """
+    Agrega la fecha de la última modificación a una tabla de productos de versiones anteriores.
+    Los productos existentes cuentan como modificados al migrar (no se archivan enseguida).
+    """
+    columnas = [fila[1] for fila in cursor.execute(f"PRAGMA table_info({TABLE_NAME})")]
+    if 'actualizado_en' in columnas:
+        return
+    cursor.execute(f"ALTER TABLE {TABLE_NAME} ADD COLUMN actualizado_en REAL")
+    cursor.execute(f"UPDATE {TABLE_NAME} SET actualizado_en = {_SQL_AHORA}")
 
 def inicializar_db():
     """Inicializa la base de datos con las tablas necesarias"""
@@ -11,18 +636,12 @@ def inicializar_db():
         with conectar_db() as conn:
             cursor = conn.cursor()
             
+            # El snapshot WAL de los reportes necesita la base en modo WAL
+            if REPORTES_SNAPSHOT == 'wal':
+                cursor.execute("PRAGMA journal_mode=WAL")
+            
             # Tabla de productos
-            sql_productos = f'''
-            CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nombre TEXT NOT NULL,
-                descripcion TEXT,
-                cantidad INTEGER NOT NULL,
-                precio REAL NOT NULL,
-                categoria TEXT
-            )
-            '''
-            cursor.execute(sql_productos)
+            _crear_tablas_productos(cursor)
             
             # Tabla de categorías
             sql_categorias = f'''
@@ -39,101 +658,366 @@ def inicializar_db():
             '''
             cursor.execute(sql_categorias)
             
+            # Índice de expresión para el ranking de días de cobertura
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE_CATEGORIAS}_cobertura ON {TABLE_CATEGORIAS} (({_SQL_COBERTURA}))")
+            
+            # Tabla complementaria con las estadísticas detalladas de precios
+            sql_estadisticas = f'''
+            CREATE TABLE IF NOT EXISTS {TABLE_ESTADISTICAS} (
+                categoria TEXT PRIMARY KEY,
+                cantidad_productos INTEGER NOT NULL,
+                mediana REAL NOT NULL,
+                p10 REAL NOT NULL,
+                p90 REAL NOT NULL,
+                desviacion REAL NOT NULL,
+                valor_inventario REAL NOT NULL
+            )
+            '''
+            cursor.execute(sql_estadisticas)
+            
+            # Historial de status y stock de las categorías
+            _crear_tablas_historial(cursor)
+            
+            # Jerarquía de categorías (tabla de clausura)
+            _crear_tablas_jerarquia(cursor)
+            
+            # Registro de cambios de categorías y estadísticas
+            _crear_tabla_eventos(cursor)
+            _crear_triggers_eventos(cursor, TABLE_CATEGORIAS, 'categoria', 'categoria',
+                                    ['mean', 'min_price', 'max_price', 'stock_global',
+                                     'demanda_semanal', 'stock_de_proteccion', 'status_stock'],
+                                    operacion_insert='UPSERT')
+            _crear_triggers_eventos(cursor, TABLE_ESTADISTICAS, 'estadistica', 'categoria',
+                                    ['cantidad_productos', 'mediana', 'p10', 'p90', 'desviacion', 'valor_inventario'])
+            
             conn.commit()
-            print("✓ Tablas inicializadas correctamente")
+        
+        # Tablas de productos de cada almacén, con su propio rango de IDs
+        for i, (nombre, (_, archivo)) in enumerate(_ALMACENES.items(), start=1):
+            with conectar_almacen(nombre) as conn:
+                cursor = conn.cursor()
+                _crear_tablas_productos(cursor)
+                cursor.execute("""INSERT INTO sqlite_sequence (name, seq) SELECT ?, ?
+                                  WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)""",
+                               (TABLE_NAME, i * _RANGO_IDS_ALMACEN, TABLE_NAME))
+                conn.commit()
+        
+        if _ALMACENES:
+            _migrar_productos_sin_almacen()
+        
+        print("✓ Tablas inicializadas correctamente")
     except sqlite3.Error as e:
         imprimir_error(f"Error al inicializar la BD: {e}")
 
+def _migrar_productos_sin_almacen():
+    """
+    Con almacenes configurados, las lecturas solo miran los archivos de los almacenes:
+    los productos (y archivados) que quedaron en la base principal, de cuando había un
+    solo almacén, se mueven al primer almacén conservando su ID.
+    Los archivos no se confirman juntos: primero se copian (INSERT OR IGNORE) y después
+    se borran de la base principal solo los que ya están en el almacén, así una
+    interrupción nunca pierde productos y la próxima inicialización termina la migración.
+    """
+    nombre, (alias, _) = next(iter(_ALMACENES.items()))
+    conn = conectar_db_almacenes()
+    try:
+        migrados = 0
+        for tabla, columnas in ((TABLE_NAME, _COLUMNAS_TABLA), (TABLE_ARCHIVO, f"{_COLUMNAS_TABLA}, archivado_en")):
+            if not conn.execute(f"SELECT 1 FROM main.{tabla} LIMIT 1").fetchone():
+                continue
+            conn.execute(f"""INSERT OR IGNORE INTO {alias}.{tabla} ({columnas})
+                             SELECT {columnas} FROM main.{tabla}""")
+            conn.commit()
+            cursor = conn.execute(f"""DELETE FROM main.{tabla}
+                                      WHERE id IN (SELECT id FROM {alias}.{tabla})""")
+            migrados += cursor.rowcount
+            conn.commit()
+            
+            restantes = conn.execute(f"SELECT COUNT(*) FROM main.{tabla}").fetchone()[0]
+            if restantes:
+                # IDs que ya usa otro producto del almacén: no se pisan ni se borran
+                imprimir_error(f"{restantes} filas de {tabla} en la base principal no se pudieron mover al "
+                               f"almacén {nombre} porque su ID ya existe allí. Siguen en '{DB_NAME}'.")
+        if migrados:
+            print(f"✓ {migrados} productos de la base principal migrados al almacén {nombre}")
+    finally:
+        conn.close()
+
 # FUNCIONES PARA PRODUCTOS
 
-def registrar_producto(nombre, descripcion, cantidad, precio, categoria):
+def registrar_producto(nombre, descripcion, cantidad, precio, categoria, almacen=None):
+    """
+    Registra un producto en el almacén indicado (o en el primero configurado).
+    Con el buffer de escritura activo, la inserción queda en cola.
+    """
+    # Normaliza el string de la categoría
+    categoria_upper = categoria.strip().upper() if categoria else None
+    sql = f"""INSERT INTO {TABLE_NAME} (nombre, descripcion, cantidad, precio_centavos, categoria, actualizado_en)
+              VALUES (?, ?, ?, ?, ?, {_SQL_AHORA})"""
+    parametros = (nombre, descripcion, cantidad, a_centavos(precio), categoria_upper)
+    
     try:
-        with conectar_db() as conn:
+        ruta = _ruta_almacen(almacen)
+        if _buffer is not None:
+            _buffer.agregar(ruta, sql, parametros)
+            return True
+        
+        with conectar_almacen(almacen) as conn:
             cursor = conn.cursor()
-            # Normaliza el string de la categoría
-            categoria_upper = categoria.strip().upper() if categoria else None
-            cursor.execute(f"INSERT INTO {TABLE_NAME} (nombre, descripcion, cantidad, precio, categoria) VALUES (?, ?, ?, ?, ?)",
-                           (nombre, descripcion, cantidad, precio, categoria_upper))
+            cursor.execute(sql, parametros)
             conn.commit()
             return True
-    except sqlite3.Error as e:
+    except (sqlite3.Error, ValueError) as e:
         imprimir_error(f"Error al registrar: {e}")
         return False
 
-def obtener_productos():
-    try:
-        with conectar_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute(f"SELECT * FROM {TABLE_NAME}")
-            return cursor.fetchall()
-    except sqlite3.Error as e:
-        imprimir_error(f"Error al leer datos: {e}")
-        return []
+@_cache_reporte("Error al leer datos", [])
+def obtener_productos(incluir_archivados=False):
+    return _consultar_almacenes(f"SELECT {_COLUMNAS_PRODUCTO} FROM {{productos}}", archivados=incluir_archivados)
 
-def buscar_producto_id(id_prod):
+def buscar_producto_id(id_prod, incluir_archivados=False):
     try:
-        with conectar_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute(f"SELECT * FROM {TABLE_NAME} WHERE id = ?", (id_prod,))
-            return cursor.fetchone()
+        resultados = _consultar_almacenes(f"SELECT {_COLUMNAS_PRODUCTO} FROM {{productos}} WHERE id = ?", (id_prod,),
+                                          archivados=incluir_archivados)
+        return resultados[0] if resultados else None
     except sqlite3.Error as e:
         imprimir_error(f"Error al buscar: {e}")
         return None
 
-def buscar_producto_texto(termino):
-    try:
-        with conectar_db() as conn:
-            cursor = conn.cursor()
-            # Normaliza los terminos de la query
-            termino_upper = termino.strip().upper()
-            query = f"SELECT * FROM {TABLE_NAME} WHERE UPPER(nombre) LIKE ? OR UPPER(categoria) LIKE ?"
-            cursor.execute(query, (f'%{termino_upper}%', f'%{termino_upper}%'))
-            return cursor.fetchall()
-    except sqlite3.Error as e:
-        imprimir_error(f"Error al buscar: {e}")
-        return []
+@_cache_reporte("Error al buscar", [])
+def buscar_producto_texto(termino, incluir_archivados=False):
+    # Normaliza los terminos de la query
+    termino_upper = termino.strip().upper()
+    query = f"SELECT {_COLUMNAS_PRODUCTO} FROM {{productos}} WHERE UPPER(nombre) LIKE ? OR UPPER(categoria) LIKE ?"
+    return _consultar_almacenes(query, (f'%{termino_upper}%', f'%{termino_upper}%'), archivados=incluir_archivados)
+
+@_cache_reporte("Error al leer productos por categoría", [])
+def obtener_productos_por_categoria(nombre_categoria=None, incluir_archivados=False):
+    """
+    Productos cuya categoría es exactamente la indicada o, sin categoría, los de todas
+    las categorías ordenados por categoría y precio (para agruparlos en una sola pasada).
+    Las dos consultas usan el índice (categoria, precio_centavos).
+    incluir_archivados solo se aplica a la consulta de una categoría.
+    """
+    if nombre_categoria:
+        query = f"SELECT {_COLUMNAS_PRODUCTO} FROM {{productos}} WHERE categoria = ?"
+        return sorted(_consultar_almacenes(query, (nombre_categoria.strip().upper(),), archivados=incluir_archivados),
+                      key=itemgetter(4, 0))
+    query = f"SELECT {_COLUMNAS_PRODUCTO} FROM {{productos}} WHERE categoria IS NOT NULL ORDER BY categoria, precio_centavos"
+    return list(_leer_ordenado(query, (), itemgetter(5, 4)))
 
-def actualizar_producto(id_prod, nombre, descripcion, cantidad, precio, categoria):
+def actualizar_producto(id_prod, nombre, descripcion, cantidad, precio, categoria, almacen=None):
+    """
+    Actualiza un producto. Si no se indica el almacén, se busca el que contiene el ID.
+    Con el buffer de escritura activo, se verifica que el ID exista y la actualización
+    queda en cola.
+    """
+    # Normaliza el texto de la categoria
+    categoria_upper = categoria.strip().upper() if categoria else None
+    sql = f'''UPDATE {TABLE_NAME} SET 
+              nombre=?, descripcion=?, cantidad=?, precio_centavos=?, categoria=?, actualizado_en={_SQL_AHORA} 
+              WHERE id=?'''
+    parametros = (nombre, descripcion, cantidad, a_centavos(precio), categoria_upper, id_prod)
+    
     try:
-        with conectar_db() as conn:
+        ruta = _ruta_almacen(almacen) if almacen else _ruta_de_producto(id_prod)
+        if ruta is None:
+            return False
+        if _buffer is not None:
+            # Sin almacén, _ruta_de_producto ya verificó que el ID exista
+            if almacen and not _existe_producto(ruta, id_prod):
+                return False
+            _buffer.agregar(ruta, sql, parametros)
+            return True
+        
+        with aplicar_perfil(sqlite3.connect(ruta)) as conn:
             cursor = conn.cursor()
-            # Normaliza el texto de la categoria
-            categoria_upper = categoria.strip().upper() if categoria else None
-            sql = f'''UPDATE {TABLE_NAME} SET 
-                      nombre=?, descripcion=?, cantidad=?, precio=?, categoria=? 
-                      WHERE id=?'''
-            cursor.execute(sql, (nombre, descripcion, cantidad, precio, categoria_upper, id_prod))
+            cursor.execute(sql, parametros)
             if cursor.rowcount > 0:
                 conn.commit()
                 return True
             return False
-    except sqlite3.Error as e:
+    except (sqlite3.Error, ValueError) as e:
         imprimir_error(f"Error al actualizar: {e}")
         return False
 
-def eliminar_producto(id_prod):
+def eliminar_producto(id_prod, almacen=None):
+    """Elimina un producto. Si no se indica el almacén, se busca el que contiene el ID."""
     try:
-        with conectar_db() as conn:
+        ruta = _ruta_almacen(almacen) if almacen else _ruta_de_producto(id_prod)
+        if ruta is None:
+            return False
+        
+        with aplicar_perfil(sqlite3.connect(ruta)) as conn:
             cursor = conn.cursor()
             cursor.execute(f"DELETE FROM {TABLE_NAME} WHERE id = ?", (id_prod,))
             if cursor.rowcount > 0:
                 conn.commit()
                 return True
             return False
-    except sqlite3.Error as e:
+    except (sqlite3.Error, ValueError) as e:
         imprimir_error(f"Error al eliminar: {e}")
         return False
 
-def reporte_bajo_stock(limite):
+def reporte_bajo_stock(limite, incluir_archivados=False):
     try:
-        with conectar_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute(f"SELECT * FROM {TABLE_NAME} WHERE cantidad <= ?", (limite,))
-            return cursor.fetchall()
+        return _consultar_almacenes(f"SELECT {_COLUMNAS_PRODUCTO} FROM {{productos}} WHERE cantidad <= ?", (limite,),
+                                    archivados=incluir_archivados)
     except sqlite3.Error as e:
         imprimir_error(f"Error en reporte: {e}")
         return []
 
+@_cache_reporte("Error en reporte de valorización", ([], 0.0))
+def reporte_valorizacion():
+    """
+    Valor del inventario (cantidad × precio) por categoría y total, calculado en una sola
+    consulta agregada sobre los productos de todos los almacenes. Se suma en centavos.
+    
+    Returns:
+        tuple: ([(categoria, unidades, valor)] ordenada por valor descendente, valor total)
+    """
+    union = " UNION ALL ".join(f"SELECT categoria, cantidad, precio_centavos FROM {tabla}"
+                               for tabla in _tablas_productos().values())
+    sql = f"""SELECT categoria, SUM(cantidad), SUM(cantidad * precio_centavos) AS valor,
+                     SUM(SUM(cantidad * precio_centavos)) OVER () AS total
+              FROM ({union})
+              GROUP BY categoria
+              ORDER BY valor DESC"""
+    with conectar_db_almacenes() as conn:
+        filas = conn.execute(sql).fetchall()
+    total = filas[0][3] if filas else 0
+    return [(cat, unidades, valor / 100) for cat, unidades, valor, _ in filas], total / 100
+
+# REPRECIO MASIVO
+
+# Centavos redondeados hacia arriba (el ROUND a 6 decimales descarta el error de punto flotante)
+_SQL_CENTAVOS_ARRIBA = ("(CAST(ROUND({precio}, 6) AS INTEGER)"
+                        " + (ROUND({precio}, 6) > CAST(ROUND({precio}, 6) AS INTEGER)))")
+
+# Reglas de redondeo del nuevo precio en centavos ({precio} es la expresión sin redondear).
+# '99' es el menor precio terminado en .99 que no queda por debajo del calculado (mínimo 0.99)
+_REGLAS_REDONDEO = {
+    'centavos': "CAST(ROUND({precio}) AS INTEGER)",
+    'entero': "CAST(ROUND({precio} / 100.0) AS INTEGER) * 100",
+    '99': f"({_SQL_CENTAVOS_ARRIBA} + 100) / 100 * 100 - 1"
+}
+
+def reprecio_masivo(porcentaje=None, monto=None, redondeo='centavos', categoria=None, termino=None, simular=False):
+    """
+    Cambia el precio de todos los productos de una categoría o de una búsqueda
+    (mismo filtro que buscar_producto_texto).
+    El cambio es un porcentaje (10 = +10%, -5 = -5%) o un monto fijo, y el resultado
+    se redondea con la regla indicada ('centavos', 'entero' o '99'; None equivale a 'centavos'
+    porque los precios se guardan en centavos enteros).
+    Se ejecuta un solo UPDATE por almacén y se recalculan mean/min_price/max_price de
+    las categorías afectadas una sola vez, todo en la misma transacción.
+    Las estadísticas detalladas se recalculan con actualizar_estadisticas_detalladas().
+    
+    Args:
+        simular (bool): Si es True, solo calcula el impacto sin escribir
+    
+    Returns:
+        dict: {categoria: {'productos', 'antes': (mean, min, max), 'despues': (mean, min, max)}}
+              o None si hubo un error
+    """
+    if (porcentaje is None) == (monto is None):
+        imprimir_error("Indique un porcentaje o un monto (solo uno de los dos).")
+        return None
+    if bool(categoria) == bool(termino):
+        imprimir_error("Indique una categoría o un término de búsqueda (solo uno de los dos).")
+        return None
+    redondeo = redondeo or 'centavos'
+    if redondeo not in _REGLAS_REDONDEO:
+        imprimir_error(f"Regla de redondeo desconocida: {redondeo}")
+        return None
+    
+    # Expresión del nuevo precio en centavos (nunca negativo)
+    nuevo = ("MAX(precio_centavos * (1 + :porcentaje / 100.0), 0)" if porcentaje is not None
+             else "MAX(precio_centavos + :monto_centavos, 0)")
+    nuevo = _REGLAS_REDONDEO[redondeo].format(precio=nuevo)
+    
+    tablas = _tablas_productos().values()
+    if categoria:
+        filtro = "categoria = :categoria"
+        alcance = filtro
+    else:
+        filtro = "(UPPER(nombre) LIKE :termino OR UPPER(categoria) LIKE :termino)"
+        # Las estadísticas incluyen los productos que no cambian de las categorías afectadas
+        # (en cualquier almacén); sin categoría solo cuentan los que cambian
+        afectadas = " UNION ".join(f"SELECT categoria FROM {tabla} WHERE {filtro}" for tabla in tablas)
+        alcance = f"(categoria IN ({afectadas}) OR (categoria IS NULL AND {filtro}))"
+    
+    parametros = {
+        'porcentaje': porcentaje,
+        'monto_centavos': a_centavos(monto) if monto is not None else None,
+        'categoria': categoria.strip().upper() if categoria else None,
+        'termino': f"%{termino.strip().upper()}%" if termino else None
+    }
+    
+    # Precios antes y después por categoría, en una sola pasada por almacén
+    sql_impacto = f"""SELECT categoria, SUM(cambia), SUM(precio_centavos), COUNT(*),
+                             MIN(precio_centavos), MAX(precio_centavos), SUM(nuevo), MIN(nuevo), MAX(nuevo)
+                      FROM (SELECT categoria, precio_centavos, ({filtro}) AS cambia,
+                                   CASE WHEN {filtro} THEN {nuevo} ELSE precio_centavos END AS nuevo
+                            FROM {{tabla}} WHERE {alcance})
+                      GROUP BY categoria"""
+    
+    try:
+        with conectar_db_almacenes() as conn:
+            cursor = conn.cursor()
+            if not simular:
+                # Bloquea la escritura desde el cálculo hasta el commit
+                cursor.execute("BEGIN IMMEDIATE")
+            
+            parciales = {}
+            for tabla in tablas:
+                for cat, *valores in cursor.execute(sql_impacto.format(tabla=tabla), parametros):
+                    if cat in parciales:
+                        previo = parciales[cat]
+                        parciales[cat] = [
+                            previo[0] + (valores[0] or 0), previo[1] + (valores[1] or 0), previo[2] + valores[2],
+                            _min_nulo(previo[3], valores[3]), _max_nulo(previo[4], valores[4]),
+                            previo[5] + (valores[5] or 0), _min_nulo(previo[6], valores[6]), _max_nulo(previo[7], valores[7])
+                        ]
+                    else:
+                        parciales[cat] = [valores[0] or 0, valores[1] or 0, valores[2], valores[3], valores[4],
+                                          valores[5] or 0, valores[6], valores[7]]
+            
+            impacto = {
+                cat: {
+                    'productos': cambian,
+                    'antes': (round(suma / cuenta / 100, 2), minimo / 100, maximo / 100),
+                    'despues': (round(suma_nueva / cuenta / 100, 2), minimo_nuevo / 100, maximo_nuevo / 100)
+                }
+                for cat, (cambian, suma, cuenta, minimo, maximo, suma_nueva, minimo_nuevo, maximo_nuevo) in parciales.items()
+                if cambian
+            }
+            if simular:
+                return impacto
+            
+            # Un UPDATE por almacén; se saltean los productos cuyo precio no cambia
+            for tabla in tablas:
+                cursor.execute(f"""UPDATE {tabla} SET precio_centavos = {nuevo}, actualizado_en = {_SQL_AHORA}
+                                   WHERE {filtro} AND precio_centavos != {nuevo}""", parametros)
+            
+            cursor.executemany(
+                f"UPDATE {TABLE_CATEGORIAS} SET mean=?, min_price=?, max_price=? WHERE categoria=?",
+                [(*datos['despues'], cat) for cat, datos in impacto.items() if cat is not None]
+            )
+            conn.commit()
+            return impacto
+    except sqlite3.Error as e:
+        imprimir_error(f"Error en el reprecio masivo: {e}")
+        return None
+
+def _min_nulo(a, b):
+    """Mínimo ignorando None"""
+    return b if a is None else a if b is None else min(a, b)
+
+def _max_nulo(a, b):
+    """Máximo ignorando None"""
+    return b if a is None else a if b is None else max(a, b)
+
 # FUNCIONES PARA CATEGORÍAS
 
 def registrar_categoria(categoria, mean, min_price, max_price, stock_global, demanda_semanal, status_stock):
@@ -152,34 +1036,30 @@ def registrar_categoria(categoria, mean, min_price, max_price, stock_global, dem
                      VALUES (?, ?, ?, ?, ?, ?, ?, ?)'''
             cursor.execute(sql, (categoria_upper, mean, min_price, max_price, stock_global, demanda_semanal, stock_proteccion, status_stock))
             conn.commit()
+            if _indice_categorias is not None:
+                _indice_categorias.agregar(categoria_upper)
             return True
     except sqlite3.Error as e:
         imprimir_error(f"Error al registrar categoría: {e}")
         return False
 
+@_cache_reporte("Error al leer categorías", [])
 def obtener_categorias():
     """Lee todas las categorías"""
-    try:
-        with conectar_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute(f"SELECT * FROM {TABLE_CATEGORIAS}")
-            return cursor.fetchall()
-    except sqlite3.Error as e:
-        imprimir_error(f"Error al leer categorías: {e}")
-        return []
+    with conectar_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT * FROM {TABLE_CATEGORIAS}")
+        return cursor.fetchall()
 
+@_cache_reporte("Error al buscar categoría", None)
 def buscar_categoria(nombre_categoria):
     """Busca una categoría específica. Búsqueda case-insensitive."""
-    try:
-        with conectar_db() as conn:
-            cursor = conn.cursor()
-            # Normaliza los textos ara la query
-            categoria_upper = nombre_categoria.strip().upper()
-            cursor.execute(f"SELECT * FROM {TABLE_CATEGORIAS} WHERE categoria = ?", (categoria_upper,))
-            return cursor.fetchone()
-    except sqlite3.Error as e:
-        imprimir_error(f"Error al buscar categoría: {e}")
-        return None
+    with conectar_db() as conn:
+        cursor = conn.cursor()
+        # Normaliza los textos ara la query
+        categoria_upper = nombre_categoria.strip().upper()
+        cursor.execute(f"SELECT * FROM {TABLE_CATEGORIAS} WHERE categoria = ?", (categoria_upper,))
+        return cursor.fetchone()
 
 def actualizar_categoria(categoria, mean, min_price, max_price, stock_global, demanda_semanal, status_stock):
     """Actualiza los datos de una categoría. Normaliza a mayúsculas."""
@@ -232,42 +1112,42 @@ def eliminar_categoria(nombre_categoria):
             cursor.execute(f"DELETE FROM {TABLE_CATEGORIAS} WHERE categoria = ?", (categoria_upper,))
             if cursor.rowcount > 0:
                 conn.commit()
+                if _indice_categorias is not None:
+                    _indice_categorias.eliminar(categoria_upper)
                 return True
             return False
     except sqlite3.Error as e:
         imprimir_error(f"Error al eliminar categoría: {e}")
         return False
 
+# Índice de trigramas de los nombres de categorías (se arma en la primera búsqueda)
+_indice_categorias = None
+
+def sugerir_categorias(texto, k=5):
+    """
+    Devuelve hasta k nombres de categorías parecidos al texto, del más al menos parecido.
+    El índice se mantiene en memoria y se actualiza con registrar_categoria y eliminar_categoria.
+    """
+    global _indice_categorias
+    try:
+        if _indice_categorias is None:
+            with conectar_db() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"SELECT categoria FROM {TABLE_CATEGORIAS}")
+                _indice_categorias = IndiceTrigramas(fila[0] for fila in cursor)
+        return [nombre for nombre, _ in _indice_categorias.sugerir(texto, k)]
+    except sqlite3.Error as e:
+        imprimir_error(f"Error al buscar categorías parecidas: {e}")
+        return []
+
 def calcular_estadisticas_categoria(nombre_categoria):
-    """Calcula estadísticas automáticas para una categoría basándose en sus productos. Búsqueda case-insensitive."""
+    """Calcula estadísticas automáticas para una categoría basándose en sus productos (de todos los almacenes). Búsqueda case-insensitive."""
     try:
         # Normaliza la categoria
         categoria_upper = nombre_categoria.strip().upper()
         
-        with conectar_db() as conn:
-            cursor = conn.cursor()
-            
-            # Lee las estadísticas de productos de esta categoría
-            sql = f'''SELECT 
-                     AVG(precio) as mean,
-                     MIN(precio) as min_price,
-                     MAX(precio) as max_price,
-                     SUM(cantidad) as stock_global
-                     FROM {TABLE_NAME}
-                     WHERE categoria = ?'''
-            
-            cursor.execute(sql, (categoria_upper,))
-            resultado = cursor.fetchone()
-            
-            if resultado and resultado[0] is not None:
-                mean, min_price, max_price, stock_global = resultado
-                return {
-                    'mean': round(mean, 2),
-                    'min_price': min_price,
-                    'max_price': max_price,
-                    'stock_global': stock_global or 0
-                }
-            return None
+        # Lee las estadísticas de productos de esta categoría
+        return _agregar_por_categoria(categoria_upper).get(categoria_upper)
     except sqlite3.Error as e:
         imprimir_error(f"Error al calcular estadísticas: {e}")
         return None
@@ -330,8 +1210,12 @@ def actualizar_estadisticas_todas_categorias(demanda_semanal_default=1):
     """
     Actualiza automáticamente las estadísticas de todas las categorías.
     Calcula el status según la lógica definida.
+    Los agregados se calculan con una consulta por almacén, en paralelo, y se
+    guardan todas las categorías en una sola transacción.
     """
     try:
+        agregados = _agregar_por_categoria()
+        
         with conectar_db() as conn:
             cursor = conn.cursor()
             
@@ -339,43 +1223,1034 @@ def actualizar_estadisticas_todas_categorias(demanda_semanal_default=1):
             cursor.execute(f"SELECT categoria, demanda_semanal FROM {TABLE_CATEGORIAS}")
             todas_categorias = cursor.fetchall()
             
-            for cat_info in todas_categorias:
-                cat = cat_info[0]
-                demanda_semanal = cat_info[1]
+            # La demanda registrada se conserva (antes se pisaba con el valor por defecto
+            # en las categorías sin productos); sin productos el status queda en BAJO STOCK
+            filas = [(*valores_esperados(agregados.get(cat), demanda_semanal, demanda_semanal_default), cat)
+                     for cat, demanda_semanal in todas_categorias]
+            
+            sql = f'''UPDATE {TABLE_CATEGORIAS} SET 
+                     mean=?, min_price=?, max_price=?, stock_global=?, 
+                     demanda_semanal=?, stock_de_proteccion=?, status_stock=? 
+                     WHERE categoria=?'''
+            cursor.executemany(sql, filas)
+            conn.commit()
+        
+        actualizar_estadisticas_detalladas()
+        
+        print(f"✓ Estadísticas actualizadas para {len(todas_categorias)} categorías")
+        return True
+    except sqlite3.Error as e:
+        imprimir_error(f"Error al actualizar estadísticas: {e}")
+        return False
+
+# Estadísticas de una categoría sin productos
+_SIN_PRODUCTOS = {'mean': 0.0, 'min_price': 0.0, 'max_price': 0.0, 'stock_global': 0}
+
+def valores_esperados(stats, demanda_semanal, demanda_semanal_default=1):
+    """
+    Valores que deberían tener las columnas calculadas de una categoría:
+    (mean, min_price, max_price, stock_global, demanda_semanal, stock_de_proteccion, status_stock)
+    """
+    stats = stats or _SIN_PRODUCTOS
+    if demanda_semanal is None:
+        demanda_semanal = demanda_semanal_default
+    stock_proteccion = int(demanda_semanal * 0.2)
+    status = determinar_status_stock(stats['stock_global'], stock_proteccion, demanda_semanal)
+    return (stats['mean'], stats['min_price'], stats['max_price'], stats['stock_global'],
+            demanda_semanal, stock_proteccion, status)
+
+# VERIFICACIÓN DE CONSISTENCIA
+
+# Columnas calculadas de categorías que se verifican, en el orden de valores_esperados
+_COLUMNAS_VERIFICADAS = ('mean', 'min_price', 'max_price', 'stock_global', 'demanda_semanal',
+                         'stock_de_proteccion', 'status_stock')
+
+def _agregados_en_conexion(conn, categorias):
+    """Estadísticas de productos de las categorías indicadas, leídas de todos los almacenes con la conexión dada"""
+    marcas = ", ".join("?" * len(categorias))
+    filas = []
+    for tabla in _tablas_productos().values():
+        filas.extend(conn.execute(
+            f"""SELECT categoria, SUM(precio_centavos), COUNT(*), MIN(precio_centavos), MAX(precio_centavos), SUM(cantidad)
+                FROM {tabla} WHERE categoria IN ({marcas}) GROUP BY categoria""", categorias))
+    return _combinar_agregados(filas)
+
+def _difiere(guardado, esperado):
+    """Compara un valor guardado con el esperado (los precios con tolerancia de medio centavo)"""
+    if isinstance(esperado, float) and isinstance(guardado, (int, float)):
+        return abs(guardado - esperado) > 0.005
+    return guardado != esperado
+
+def verificar_consistencia(reparar=False, tamano_lote=1000, demanda_semanal_default=1, muestra=20):
+    """
+    Verifica que las columnas calculadas de categorías coincidan con sus productos
+    y busca productos (también archivados) cuya categoría no existe (huérfanos).
+    Recorre las tablas por bloques ordenados por clave, así la memoria no depende del
+    tamaño de la base y cada lectura es corta (no bloquea a los que escriben): de los
+    huérfanos y las diferencias se devuelve la cantidad y solo los primeros `muestra`.
+    Con reparar=True, cada bloque se corrige en su propia transacción:
+    - las categorías de los huérfanos se vuelven a registrar (con la demanda por defecto)
+    - las columnas calculadas se recalculan dentro de la transacción
+    
+    Returns:
+        dict: {'huerfanos': cantidad, 'muestra_huerfanos': [(almacen, id, nombre, categoria, archivado)],
+               'diferencias': cantidad, 'muestra_diferencias': [(categoria, columna, guardado, esperado)],
+               'reparadas': cantidad de categorías corregidas o registradas}
+              o None si hubo un error
+    """
+    resultado = {'huerfanos': 0, 'muestra_huerfanos': [], 'diferencias': 0, 'muestra_diferencias': [], 'reparadas': 0}
+    
+    try:
+        conn = conectar_db_almacenes()
+        
+        # 1. Productos huérfanos, almacén por almacén (activos y archivados)
+        archivos = _tablas_productos(TABLE_ARCHIVO)
+        tablas = [(almacen, tabla, False) for almacen, tabla in _tablas_productos().items()]
+        tablas += [(almacen, tabla, True) for almacen, tabla in archivos.items()]
+        for almacen, tabla, archivado in tablas:
+            ultimo_id = 0
+            while True:
+                filas = conn.execute(
+                    f"""SELECT p.id, p.nombre, p.categoria,
+                               EXISTS (SELECT 1 FROM main.{TABLE_CATEGORIAS} c WHERE c.categoria = p.categoria)
+                        FROM {tabla} p WHERE p.id > ? ORDER BY p.id LIMIT ?""",
+                    (ultimo_id, tamano_lote)).fetchall()
+                if not filas:
+                    break
+                ultimo_id = filas[-1][0]
                 
-                stats = calcular_estadisticas_categoria(cat)
+                huerfanos = [(almacen, id_prod, nombre, cat, archivado) for id_prod, nombre, cat, existe in filas
+                             if cat is not None and not existe]
+                resultado['huerfanos'] += len(huerfanos)
+                _agregar_muestra(resultado['muestra_huerfanos'], huerfanos, muestra)
                 
-                if stats and stats['stock_global'] > 0:
-                    # Categoría con productos
-                    stock_proteccion = int(demanda_semanal * 0.2)
-                    status = determinar_status_stock(stats['stock_global'], stock_proteccion, demanda_semanal)
-                    
-                    registrar_categoria(
-                        categoria=cat,
-                        mean=stats['mean'],
-                        min_price=stats['min_price'],
-                        max_price=stats['max_price'],
-                        stock_global=stats['stock_global'],
-                        demanda_semanal=demanda_semanal,
-                        status_stock=status
-                    )
-                else:
-                    # Categoría sin productos o con stock = 0
-                    stock_proteccion = int(demanda_semanal_default * 0.2)
-                    status = "BAJO STOCK"  # Sin productos = crítico
-                    
-                    registrar_categoria(
-                        categoria=cat,
-                        mean=0.0,
-                        min_price=0.0,
-                        max_price=0.0,
-                        stock_global=0,
-                        demanda_semanal=demanda_semanal_default,
-                        status_stock=status
-                    )
-            
-            print(f"✓ Estadísticas actualizadas para {len(todas_categorias)} categorías")
+                if reparar and huerfanos:
+                    resultado['reparadas'] += _registrar_categorias_faltantes(
+                        conn, sorted({h[3] for h in huerfanos}), demanda_semanal_default)
+        
+        # 2. Columnas calculadas de categorías
+        ultima_categoria = ''
+        while True:
+            filas = conn.execute(
+                f"""SELECT categoria, {', '.join(_COLUMNAS_VERIFICADAS)} FROM main.{TABLE_CATEGORIAS}
+                    WHERE categoria > ? ORDER BY categoria LIMIT ?""",
+                (ultima_categoria, tamano_lote)).fetchall()
+            if not filas:
+                break
+            ultima_categoria = filas[-1][0]
+            
+            agregados = _agregados_en_conexion(conn, [fila[0] for fila in filas])
+            con_diferencias = []
+            for cat, *guardados in filas:
+                esperados = valores_esperados(agregados.get(cat), guardados[4], demanda_semanal_default)
+                diferencias = [(cat, columna, guardado, esperado)
+                               for columna, guardado, esperado in zip(_COLUMNAS_VERIFICADAS, guardados, esperados)
+                               if _difiere(guardado, esperado)]
+                if diferencias:
+                    resultado['diferencias'] += len(diferencias)
+                    _agregar_muestra(resultado['muestra_diferencias'], diferencias, muestra)
+                    con_diferencias.append(cat)
+            
+            if reparar and con_diferencias:
+                resultado['reparadas'] += _reparar_categorias(conn, con_diferencias, demanda_semanal_default)
+        
+        return resultado
+    except sqlite3.Error as e:
+        imprimir_error(f"Error al verificar la consistencia: {e}")
+        return None
+
+def _agregar_muestra(muestra, filas, maximo):
+    """Agrega filas a la muestra hasta completar el máximo"""
+    muestra.extend(filas[:max(maximo - len(muestra), 0)])
+
+def _registrar_categorias_faltantes(conn, categorias, demanda_semanal_default):
+    """Registra, en una transacción, las categorías que tienen productos pero no existen"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        agregados = _agregados_en_conexion(conn, categorias)
+        conn.executemany(
+            f"""INSERT OR IGNORE INTO main.{TABLE_CATEGORIAS}
+                (mean, min_price, max_price, stock_global, demanda_semanal, stock_de_proteccion, status_stock, categoria)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            [(*valores_esperados(agregados.get(cat), demanda_semanal_default), cat) for cat in categorias])
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    
+    if _indice_categorias is not None:
+        for cat in categorias:
+            _indice_categorias.agregar(cat)
+    return len(categorias)
+
+def _reparar_categorias(conn, categorias, demanda_semanal_default):
+    """Recalcula y guarda, en una transacción, las columnas calculadas de las categorías"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Se vuelve a leer dentro de la transacción por si hubo cambios desde la verificación
+        agregados = _agregados_en_conexion(conn, categorias)
+        marcas = ", ".join("?" * len(categorias))
+        demandas = conn.execute(
+            f"SELECT categoria, demanda_semanal FROM main.{TABLE_CATEGORIAS} WHERE categoria IN ({marcas})",
+            categorias).fetchall()
+        conn.executemany(
+            f"""UPDATE main.{TABLE_CATEGORIAS} SET 
+                mean=?, min_price=?, max_price=?, stock_global=?, 
+                demanda_semanal=?, stock_de_proteccion=?, status_stock=? 
+                WHERE categoria=?""",
+            [(*valores_esperados(agregados.get(cat), demanda, demanda_semanal_default), cat)
+             for cat, demanda in demandas])
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return len(demandas)
+
+def percentil(valores, p):
+    """Percentil con interpolación lineal sobre una lista ya ordenada."""
+    posicion = (len(valores) - 1) * p
+    inferior = int(posicion)
+    superior = min(inferior + 1, len(valores) - 1)
+    return valores[inferior] + (valores[superior] - valores[inferior]) * (posicion - inferior)
+
+def calcular_estadisticas_detalladas():
+    """
+    Calcula mediana, p10/p90, desviación estándar y valor de inventario de todas
+    las categorías en una sola pasada sobre los productos ordenados por categoría y precio.
+    Solo guarda en memoria los precios de la categoría que se está procesando.
+    """
+    try:
+        filas_ordenadas = _leer_ordenado("""SELECT categoria, precio_centavos, cantidad FROM {productos}
+                                            WHERE categoria IS NOT NULL
+                                            ORDER BY categoria, precio_centavos""", (), itemgetter(0, 1))
+        
+        resultados = {}
+        for categoria, filas in groupby(filas_ordenadas, key=itemgetter(0)):
+            # Se calcula en centavos y se pasa a pesos al final
+            precios = []
+            valor_inventario = 0
+            for _, precio, cantidad in filas:
+                precios.append(precio)
+                valor_inventario += cantidad * precio
+            
+            media = sum(precios) / len(precios)
+            varianza = sum((precio - media) ** 2 for precio in precios) / len(precios)
+            resultados[categoria] = {
+                'cantidad_productos': len(precios),
+                'mediana': round(percentil(precios, 0.5) / 100, 2),
+                'p10': round(percentil(precios, 0.1) / 100, 2),
+                'p90': round(percentil(precios, 0.9) / 100, 2),
+                'desviacion': round(varianza ** 0.5 / 100, 2),
+                'valor_inventario': valor_inventario / 100
+            }
+        return resultados
+    except sqlite3.Error as e:
+        imprimir_error(f"Error al calcular estadísticas detalladas: {e}")
+        return None
+
+def actualizar_estadisticas_detalladas():
+    """Recalcula y guarda las estadísticas detalladas de todas las categorías en una sola transacción."""
+    estadisticas = calcular_estadisticas_detalladas()
+    if estadisticas is None:
+        return False
+    
+    try:
+        with conectar_db() as conn:
+            cursor = conn.cursor()
+            
+            # Borra las categorías que ya no tienen productos
+            cursor.execute(f"SELECT categoria FROM {TABLE_ESTADISTICAS}")
+            sobrantes = [(fila[0],) for fila in cursor.fetchall() if fila[0] not in estadisticas]
+            cursor.executemany(f"DELETE FROM {TABLE_ESTADISTICAS} WHERE categoria = ?", sobrantes)
+            
+            # Solo se reescriben las filas que cambiaron
+            sql = f'''INSERT INTO {TABLE_ESTADISTICAS} 
+                     (categoria, cantidad_productos, mediana, p10, p90, desviacion, valor_inventario) 
+                     VALUES (?, ?, ?, ?, ?, ?, ?)
+                     ON CONFLICT (categoria) DO UPDATE SET
+                         cantidad_productos = excluded.cantidad_productos, mediana = excluded.mediana,
+                         p10 = excluded.p10, p90 = excluded.p90,
+                         desviacion = excluded.desviacion, valor_inventario = excluded.valor_inventario
+                     WHERE (cantidad_productos, mediana, p10, p90, desviacion, valor_inventario)
+                         IS NOT (excluded.cantidad_productos, excluded.mediana, excluded.p10,
+                                 excluded.p90, excluded.desviacion, excluded.valor_inventario)'''
+            cursor.executemany(sql, [
+                (cat, e['cantidad_productos'], e['mediana'], e['p10'], e['p90'], e['desviacion'], e['valor_inventario'])
+                for cat, e in estadisticas.items()
+            ])
+            conn.commit()
             return True
     except sqlite3.Error as e:
-        imprimir_error(f"Error al actualizar estadísticas: {e}")
-        return False
\ No newline at end of file
+        imprimir_error(f"Error al guardar estadísticas detalladas: {e}")
+        return False
+
+@_cache_reporte("Error al leer estadísticas detalladas", [])
+def obtener_estadisticas_detalladas():
+    """Lee las estadísticas detalladas guardadas de todas las categorías"""
+    with conectar_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT * FROM {TABLE_ESTADISTICAS}")
+        return cursor.fetchall()
+
+# JERARQUÍA DE CATEGORÍAS
+
+def _crear_tablas_jerarquia(cursor):
+    """
+    Crea la tabla de clausura de la jerarquía: una fila (ancestro, descendiente, profundidad)
+    por cada camino del árbol, incluido el de cada categoría a sí misma (profundidad 0).
+    Los triggers agregan las categorías nuevas como raíces y, al eliminar una categoría,
+    cuelgan sus subcategorías del padre que tenía.
+    """
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS {TABLE_JERARQUIA} (
+        ancestro TEXT NOT NULL,
+        descendiente TEXT NOT NULL,
+        profundidad INTEGER NOT NULL,
+        PRIMARY KEY (ancestro, descendiente)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE_JERARQUIA}_hijos ON {TABLE_JERARQUIA} (ancestro, profundidad)")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE_JERARQUIA}_ancestros ON {TABLE_JERARQUIA} (descendiente, profundidad)")
+    
+    # INSERT OR REPLACE no dispara el trigger de DELETE: la categoría reemplazada conserva su lugar
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_{TABLE_CATEGORIAS}_jerarquia_insert AFTER INSERT ON {TABLE_CATEGORIAS}
+    BEGIN
+        INSERT OR IGNORE INTO {TABLE_JERARQUIA} (ancestro, descendiente, profundidad)
+        VALUES (NEW.categoria, NEW.categoria, 0);
+    END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_{TABLE_CATEGORIAS}_jerarquia_delete AFTER DELETE ON {TABLE_CATEGORIAS}
+    BEGIN
+        UPDATE {TABLE_JERARQUIA} SET profundidad = profundidad - 1
+        WHERE ancestro IN (SELECT ancestro FROM {TABLE_JERARQUIA} WHERE descendiente = OLD.categoria AND profundidad > 0)
+          AND descendiente IN (SELECT descendiente FROM {TABLE_JERARQUIA} WHERE ancestro = OLD.categoria AND profundidad > 0);
+        DELETE FROM {TABLE_JERARQUIA} WHERE ancestro = OLD.categoria OR descendiente = OLD.categoria;
+    END
+    ''')
+    
+    # Las categorías existentes empiezan como raíces
+    cursor.execute(f"""INSERT OR IGNORE INTO {TABLE_JERARQUIA} (ancestro, descendiente, profundidad)
+                      SELECT categoria, categoria, 0 FROM {TABLE_CATEGORIAS}""")
+
+def mover_categoria(nombre_categoria, nuevo_padre=None):
+    """
+    Cuelga la categoría (con todas sus subcategorías) de otra categoría, o la deja como
+    raíz si nuevo_padre es None. Solo se reescriben los caminos que pasan por la categoría
+    movida, en una sola transacción.
+    
+    Returns:
+        bool: True si se movió, False si alguna categoría no existe o se formaría un ciclo
+    """
+    categoria = nombre_categoria.strip().upper()
+    padre = nuevo_padre.strip().upper() if nuevo_padre else None
+    
+    try:
+        with conectar_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            
+            existentes = {fila[0] for fila in cursor.execute(
+                f"SELECT descendiente FROM {TABLE_JERARQUIA} WHERE profundidad = 0 AND descendiente IN (?, ?)",
+                (categoria, padre))}
+            if categoria not in existentes or (padre and padre not in existentes):
+                conn.rollback()
+                imprimir_error(f"La categoría '{padre if categoria in existentes else categoria}' no existe.")
+                return False
+            
+            # El nuevo padre no puede estar dentro del subárbol que se mueve
+            if padre and cursor.execute(f"SELECT 1 FROM {TABLE_JERARQUIA} WHERE ancestro = ? AND descendiente = ?",
+                                        (categoria, padre)).fetchone():
+                conn.rollback()
+                imprimir_error(f"'{padre}' es subcategoría de '{categoria}': no puede ser su padre.")
+                return False
+            
+            # Quita los caminos de los ancestros actuales al subárbol
+            cursor.execute(f"""DELETE FROM {TABLE_JERARQUIA}
+                               WHERE descendiente IN (SELECT descendiente FROM {TABLE_JERARQUIA} WHERE ancestro = :cat)
+                                 AND ancestro IN (SELECT ancestro FROM {TABLE_JERARQUIA}
+                                                  WHERE descendiente = :cat AND profundidad > 0)""",
+                           {'cat': categoria})
+            
+            # Agrega los caminos de los ancestros del nuevo padre (y él mismo) a todo el subárbol
+            if padre:
+                cursor.execute(f"""INSERT INTO {TABLE_JERARQUIA} (ancestro, descendiente, profundidad)
+                                   SELECT arriba.ancestro, abajo.descendiente, arriba.profundidad + abajo.profundidad + 1
+                                   FROM {TABLE_JERARQUIA} arriba, {TABLE_JERARQUIA} abajo
+                                   WHERE arriba.descendiente = :padre AND abajo.ancestro = :cat""",
+                               {'padre': padre, 'cat': categoria})
+            conn.commit()
+            return True
+    except sqlite3.Error as e:
+        imprimir_error(f"Error al mover la categoría: {e}")
+        return False
+
+@_cache_reporte("Error al leer la jerarquía", [])
+def obtener_ruta_categoria(nombre_categoria):
+    """Ancestros de la categoría, de la raíz a la categoría misma (lista vacía si no existe)"""
+    with conectar_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""SELECT ancestro FROM {TABLE_JERARQUIA} WHERE descendiente = ?
+                           ORDER BY profundidad DESC""", (nombre_categoria.strip().upper(),))
+        return [fila[0] for fila in cursor.fetchall()]
+
+@_cache_reporte("Error en reporte de jerarquía", [])
+def reporte_jerarquia(nombre_categoria=None):
+    """
+    Totales de cada subárbol un nivel por debajo de la categoría (o de las raíces si no se
+    indica ninguna), en una sola consulta sobre la tabla de clausura: stock_global, valor
+    de inventario (de las estadísticas detalladas), categorías con BAJO STOCK y el status
+    del subárbol según su stock, protección y demanda sumados.
+    
+    Returns:
+        list: [(categoria, subcategorias, stock_global, valor, en_bajo_stock, status)]
+              ordenada por categoría (las subcategorías cuentan todo el subárbol)
+    """
+    if nombre_categoria:
+        nivel = f"SELECT descendiente FROM {TABLE_JERARQUIA} WHERE ancestro = :padre AND profundidad = 1"
+    else:
+        nivel = f"""SELECT descendiente FROM {TABLE_JERARQUIA} r WHERE profundidad = 0
+                    AND NOT EXISTS (SELECT 1 FROM {TABLE_JERARQUIA} p WHERE p.descendiente = r.descendiente AND p.profundidad > 0)"""
+    sql = f"""SELECT sub.ancestro, COUNT(*) - 1, SUM(c.stock_global), COALESCE(SUM(e.valor_inventario), 0),
+                     SUM(c.status_stock = 'BAJO STOCK'), SUM(c.stock_de_proteccion), SUM(c.demanda_semanal)
+              FROM ({nivel}) nivel
+              JOIN {TABLE_JERARQUIA} sub ON sub.ancestro = nivel.descendiente
+              JOIN {TABLE_CATEGORIAS} c ON c.categoria = sub.descendiente
+              LEFT JOIN {TABLE_ESTADISTICAS} e ON e.categoria = sub.descendiente
+              GROUP BY sub.ancestro
+              ORDER BY sub.ancestro"""
+    with conectar_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql, {'padre': nombre_categoria.strip().upper() if nombre_categoria else None})
+        return [(cat, subcategorias, stock, valor, bajo_stock, determinar_status_stock(stock, proteccion, demanda))
+                for cat, subcategorias, stock, valor, bajo_stock, proteccion, demanda in cursor.fetchall()]
+
+# ARCHIVO DE PRODUCTOS INACTIVOS
+
+def archivar_productos_inactivos(dias=ARCHIVO_DIAS_INACTIVIDAD, tamano_lote=1000):
+    """
+    Mueve a la tabla de archivados los productos sin stock que no se modificaron en los
+    últimos días indicados. Cada bloque se mueve en su propia transacción (así no se
+    bloquea a los que escriben); al terminar se recalculan una sola vez las estadísticas
+    de las categorías afectadas.
+    Los productos archivados no aparecen en listados, búsquedas, reportes ni estadísticas,
+    salvo que se pida incluirlos.
+    
+    Returns:
+        int: cantidad de productos archivados, o None si hubo un error
+    """
+    archivados = 0
+    afectadas = set()
+    try:
+        conn = conectar_db_almacenes()
+        archivos = _tablas_productos(TABLE_ARCHIVO)
+        eventos = _tablas_productos(TABLE_EVENTOS)
+        for almacen, tabla in _tablas_productos().items():
+            while True:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    ids = [fila[0] for fila in conn.execute(
+                        f"""SELECT id FROM {tabla}
+                            WHERE cantidad = 0 AND actualizado_en < {_SQL_AHORA} - ?
+                            ORDER BY actualizado_en LIMIT ?""",
+                        (dias * 86400, tamano_lote))]
+                    if not ids:
+                        conn.rollback()
+                        break
+                    afectadas.update(_mover_productos(conn, tabla, archivos[almacen], eventos[almacen], ids,
+                                                      archivar=True))
+                    conn.commit()
+                except sqlite3.Error:
+                    conn.rollback()
+                    raise
+                archivados += len(ids)
+        
+        _recalcular_categorias(conn, afectadas, tamano_lote)
+        return archivados
+    except sqlite3.Error as e:
+        imprimir_error(f"Error al archivar productos: {e}")
+        return None
+
+def restaurar_productos_archivados(ids, tamano_lote=1000):
+    """
+    Vuelve a la tabla de productos los archivados indicados, con el mismo ID y en el mismo
+    almacén, por bloques de una transacción cada uno. Cuentan como modificados al restaurarse.
+    
+    Returns:
+        int: cantidad de productos restaurados, o None si hubo un error
+    """
+    ids = list(ids)
+    restaurados = 0
+    afectadas = set()
+    try:
+        conn = conectar_db_almacenes()
+        archivos = _tablas_productos(TABLE_ARCHIVO)
+        eventos = _tablas_productos(TABLE_EVENTOS)
+        for inicio in range(0, len(ids), tamano_lote):
+            lote = ids[inicio:inicio + tamano_lote]
+            marcas = ", ".join("?" * len(lote))
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for almacen, tabla in _tablas_productos().items():
+                    encontrados = [fila[0] for fila in conn.execute(
+                        f"SELECT id FROM {archivos[almacen]} WHERE id IN ({marcas})", lote)]
+                    if encontrados:
+                        afectadas.update(_mover_productos(conn, tabla, archivos[almacen], eventos[almacen],
+                                                          encontrados, archivar=False))
+                        restaurados += len(encontrados)
+                conn.commit()
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+        
+        _recalcular_categorias(conn, afectadas, tamano_lote)
+        return restaurados
+    except sqlite3.Error as e:
+        imprimir_error(f"Error al restaurar productos: {e}")
+        return None
+
+def _mover_productos(conn, tabla, archivo, eventos, ids, archivar):
+    """
+    Mueve los productos entre la tabla de productos y la de archivados (dentro de la
+    transacción en curso). Devuelve las categorías afectadas.
+    En el registro de cambios (tabla eventos del almacén) el movimiento queda como
+    ARCHIVE o RESTORE, no como el DELETE o INSERT que registran los triggers.
+    """
+    marcas = ", ".join("?" * len(ids))
+    origen, destino = (tabla, archivo) if archivar else (archivo, tabla)
+    categorias = [fila[0] for fila in conn.execute(
+        f"SELECT DISTINCT categoria FROM {origen} WHERE id IN ({marcas}) AND categoria IS NOT NULL", ids)]
+    ultimo_evento = conn.execute(f"SELECT COALESCE(MAX(seq), 0) FROM {eventos}").fetchone()[0]
+    if archivar:
+        conn.execute(f"""INSERT INTO {destino} ({_COLUMNAS_TABLA}, archivado_en)
+                         SELECT {_COLUMNAS_TABLA}, {_SQL_AHORA} FROM {origen} WHERE id IN ({marcas})""", ids)
+    else:
+        conn.execute(f"""INSERT INTO {destino} ({_COLUMNAS_TABLA})
+                         SELECT id, nombre, descripcion, cantidad, precio_centavos, categoria, {_SQL_AHORA}
+                         FROM {origen} WHERE id IN ({marcas})""", ids)
+    conn.execute(f"DELETE FROM {origen} WHERE id IN ({marcas})", ids)
+    conn.execute(f"""UPDATE {eventos} SET operacion = ?
+                     WHERE seq > ? AND entidad = 'producto' AND operacion = ?""",
+                 ('ARCHIVE', ultimo_evento, 'DELETE') if archivar else ('RESTORE', ultimo_evento, 'INSERT'))
+    return categorias
+
+def _recalcular_categorias(conn, categorias, tamano_lote):
+    """Recalcula las columnas calculadas de las categorías, por bloques de una transacción"""
+    categorias = sorted(categorias)
+    for inicio in range(0, len(categorias), tamano_lote):
+        _reparar_categorias(conn, categorias[inicio:inicio + tamano_lote], 1)
+
+@_cache_reporte("Error al leer los productos archivados", [])
+def obtener_productos_archivados():
+    """
+    Productos archivados de todos los almacenes, del archivado más reciente al más antiguo.
+    
+    Returns:
+        list: [(id, nombre, descripcion, cantidad, precio, categoria, archivado_en)],
+              con archivado_en en segundos desde epoch
+    """
+    filas = _consultar_almacenes(f"SELECT {_COLUMNAS_PRODUCTO}, archivado_en FROM {{archivo}}")
+    return sorted(filas, key=itemgetter(6), reverse=True)
+
+# FUNCIONES DE REPOSICIÓN
+
+def _repartir_cantidad(total, pesos):
+    """Reparte un total entero en proporción a los pesos (método del mayor resto)."""
+    suma_pesos = sum(pesos)
+    if suma_pesos <= 0:
+        # Sin referencia de participación: reparto en partes iguales
+        pesos = [1] * len(pesos)
+        suma_pesos = len(pesos)
+    
+    exactas = [total * peso / suma_pesos for peso in pesos]
+    cantidades = [int(x) for x in exactas]
+    restantes = total - sum(cantidades)
+    orden = sorted(range(len(exactas)), key=lambda i: exactas[i] - cantidades[i], reverse=True)
+    for i in orden[:restantes]:
+        cantidades[i] += 1
+    return cantidades
+
+def calcular_plan_reposicion(lead_time_dias=REPOSICION_LEAD_TIME_DIAS, periodo_revision_dias=REPOSICION_PERIODO_REVISION_DIAS):
+    """
+    Calcula las cantidades a comprar para todas las categorías en una sola pasada.
+    Nivel objetivo = demanda diaria * (lead time + período de revisión) + stock de protección.
+    Cantidad sugerida = nivel objetivo - stock global (nunca negativa).
+    La cantidad de cada categoría se reparte entre sus productos según su déficit: la parte
+    del nivel objetivo que le toca a cada producto (partes iguales, no hay historial de ventas
+    por producto) menos su stock actual. Así los productos agotados reciben más unidades.
+    
+    Returns:
+        list: Filas del plan de compras con categoria, id_producto, producto y cantidad_sugerida
+    """
+    dias_cobertura = lead_time_dias + periodo_revision_dias
+    try:
+        with conectar_db() as conn:
+            cursor = conn.cursor()
+            
+            # Cantidad sugerida por categoría, calculada en la misma consulta
+            cursor.execute(f"""SELECT categoria, 
+                              demanda_semanal * ? / 7.0 + stock_de_proteccion, stock_global
+                              FROM {TABLE_CATEGORIAS}""", (dias_cobertura,))
+            sugeridas = {}
+            objetivos = {}
+            for categoria, objetivo, stock_global in cursor:
+                cantidad = math.ceil(objetivo - stock_global)
+                if cantidad > 0:
+                    sugeridas[categoria] = cantidad
+                    objetivos[categoria] = objetivo
+            
+            if not sugeridas:
+                return []
+            
+            # Recorre los productos agrupados por categoría (servido por el índice de categoría)
+            plan = []
+            productos = _leer_ordenado("""SELECT categoria, id, nombre, cantidad FROM {productos}
+                                          WHERE categoria IS NOT NULL ORDER BY categoria""", (), itemgetter(0))
+            for categoria, filas in groupby(productos, key=itemgetter(0)):
+                cantidad = sugeridas.pop(categoria, None)
+                if cantidad is None:
+                    continue
+                filas = list(filas)
+                # Déficit de cada producto respecto de su parte del nivel objetivo
+                parte_objetivo = objetivos[categoria] / len(filas)
+                deficits = [max(parte_objetivo - fila[3], 0) for fila in filas]
+                repartos = _repartir_cantidad(cantidad, deficits)
+                for (_, id_prod, nombre, _), cantidad_prod in zip(filas, repartos):
+                    if cantidad_prod > 0:
+                        plan.append({
+                            'categoria': categoria,
+                            'id_producto': id_prod,
+                            'producto': nombre,
+                            'cantidad_sugerida': cantidad_prod
+                        })
+            
+            # Categorías sin productos: se compra a nivel categoría
+            for categoria, cantidad in sugeridas.items():
+                plan.append({
+                    'categoria': categoria,
+                    'id_producto': None,
+                    'producto': None,
+                    'cantidad_sugerida': cantidad
+                })
+            return plan
+    except sqlite3.Error as e:
+        imprimir_error(f"Error al calcular el plan de reposición: {e}")
+        return []
+
+def exportar_plan_reposicion(plan, ruta):
+    """Exporta el plan de compras a un archivo CSV"""
+    try:
+        with open(ruta, 'w', newline='', encoding='utf-8') as archivo:
+            writer = csv.DictWriter(archivo, fieldnames=['categoria', 'id_producto', 'producto', 'cantidad_sugerida'])
+            writer.writeheader()
+            writer.writerows(plan)
+        return True
+    except OSError as e:
+        imprimir_error(f"Error al exportar el plan de compras: {e}")
+        return False
+
+# RANKING DE COBERTURA DE STOCK
+
+# Días de cobertura de una categoría: stock / demanda semanal * 7 (NULL si no tiene demanda).
+# El índice de expresión en categorías usa exactamente esta expresión: así ORDER BY ... LIMIT
+# recorre el índice y se detiene a los N primeros, sin ordenar la tabla.
+_SQL_COBERTURA = "stock_global * 7.0 / demanda_semanal"
+
+def ranking_cobertura(n=50, granularidad='categoria', exceso=False):
+    """
+    Las N categorías o productos con menos días de cobertura (stock / demanda semanal * 7),
+    o con más si exceso=True. Las categorías se ordenan en SQL con el índice de expresión.
+    Los productos se recorren una sola vez seleccionando con un heap de tamaño N; la demanda
+    de cada producto es la de su categoría repartida en partes iguales entre sus productos.
+    Se omiten las categorías sin demanda semanal y sus productos.
+    El ranking de categorías usa el stock_global guardado (el de la última actualización
+    de estadísticas); el de productos, la cantidad actual de cada producto.
+    
+    Args:
+        n (int): Cantidad de filas del ranking
+        granularidad (str): 'categoria' o 'producto'
+        exceso (bool): Si es True, devuelve los de mayor cobertura
+    
+    Returns:
+        list: categorías: [(categoria, stock_global, demanda_semanal, dias_cobertura, status_stock)]
+              productos: [(id, nombre, categoria, cantidad, demanda_semanal, dias_cobertura)]
+    """
+    try:
+        if granularidad == 'categoria':
+            with conectar_db() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"""SELECT categoria, stock_global, demanda_semanal, {_SQL_COBERTURA}, status_stock
+                                  FROM {TABLE_CATEGORIAS} WHERE {_SQL_COBERTURA} IS NOT NULL
+                                  ORDER BY {_SQL_COBERTURA} {'DESC' if exceso else 'ASC'} LIMIT ?""", (n,))
+                return cursor.fetchall()
+        
+        # Conteos, demandas y productos se leen del mismo snapshot
+        with snapshot_lectura():
+            with conectar_db() as conn:
+                demandas = dict(conn.execute(
+                    f"SELECT categoria, demanda_semanal FROM {TABLE_CATEGORIAS} WHERE demanda_semanal > 0").fetchall())
+            productos_por_categoria = {}
+            for cat, cuenta in _consultar_almacenes(
+                    "SELECT categoria, COUNT(*) FROM {productos} WHERE categoria IS NOT NULL GROUP BY categoria"):
+                productos_por_categoria[cat] = productos_por_categoria.get(cat, 0) + cuenta
+            
+            def coberturas():
+                for id_prod, nombre, cat, cantidad in _leer_ordenado(
+                        "SELECT id, nombre, categoria, cantidad FROM {productos} ORDER BY id", (), itemgetter(0)):
+                    if cat in demandas and cat in productos_por_categoria:
+                        demanda = demandas[cat] / productos_por_categoria[cat]
+                        yield (id_prod, nombre, cat, cantidad, round(demanda, 2), cantidad * 7 / demanda)
+            
+            seleccionar = heapq.nlargest if exceso else heapq.nsmallest
+            return seleccionar(n, coberturas(), key=itemgetter(5))
+    except sqlite3.Error as e:
+        imprimir_error(f"Error en el ranking de cobertura: {e}")
+        return []
+
+# HISTORIAL DE STATUS DE CATEGORÍAS
+
+# Momento actual en segundos desde epoch, calculado por SQLite
+_SQL_AHORA = "((julianday('now') - 2440587.5) * 86400.0)"
+
+def _crear_tablas_historial(cursor):
+    """
+    Crea la serie temporal de status/stock de las categorías y sus rollups.
+    Los triggers registran un evento cada vez que cambia el status o el stock_global
+    de una categoría, sin importar qué función hizo el cambio.
+    """
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS {TABLE_HISTORIAL} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        categoria TEXT NOT NULL,
+        ts REAL NOT NULL,
+        status_stock TEXT,
+        stock_global INTEGER
+    )
+    ''')
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE_HISTORIAL}_categoria ON {TABLE_HISTORIAL} (categoria, id)")
+    
+    # Rollups: segundos que cada categoría pasó en cada status, por día y por semana
+    for tabla, periodo in ((TABLE_HISTORIAL_DIARIO, 'dia'), (TABLE_HISTORIAL_SEMANAL, 'semana')):
+        cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {tabla} (
+            categoria TEXT NOT NULL,
+            {periodo} TEXT NOT NULL,
+            status_stock TEXT NOT NULL,
+            segundos REAL NOT NULL,
+            cambios INTEGER NOT NULL,
+            stock_min INTEGER NOT NULL,
+            stock_max INTEGER NOT NULL,
+            PRIMARY KEY (categoria, {periodo}, status_stock)
+        )
+        ''')
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabla}_{periodo} ON {tabla} ({periodo})")
+    
+    # Último estado procesado de cada categoría (intervalo abierto) y marca de avance
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS {TABLE_HISTORIAL_ESTADO} (
+        categoria TEXT PRIMARY KEY,
+        desde REAL NOT NULL,
+        status_stock TEXT,
+        stock_global INTEGER,
+        ultimo_evento INTEGER NOT NULL
+    )
+    ''')
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE_HISTORIAL_ESTADO}_evento ON {TABLE_HISTORIAL_ESTADO} (ultimo_evento)")
+    
+    sql_evento = f"""INSERT INTO {TABLE_HISTORIAL} (categoria, ts, status_stock, stock_global)
+                    VALUES (NEW.categoria, {_SQL_AHORA}, NEW.status_stock, NEW.stock_global);"""
+    # INSERT OR REPLACE no dispara el trigger de DELETE, por eso el de INSERT compara con el último evento
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_{TABLE_CATEGORIAS}_historial_insert AFTER INSERT ON {TABLE_CATEGORIAS}
+    WHEN (SELECT status_stock || '|' || stock_global FROM {TABLE_HISTORIAL}
+          WHERE categoria = NEW.categoria ORDER BY id DESC LIMIT 1)
+         IS NOT NEW.status_stock || '|' || NEW.stock_global
+    BEGIN {sql_evento} END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_{TABLE_CATEGORIAS}_historial_update AFTER UPDATE OF status_stock, stock_global ON {TABLE_CATEGORIAS}
+    WHEN OLD.status_stock IS NOT NEW.status_stock OR OLD.stock_global IS NOT NEW.stock_global
+    BEGIN {sql_evento} END
+    ''')
+    # Al eliminar la categoría se cierra su intervalo (evento sin status)
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_{TABLE_CATEGORIAS}_historial_delete AFTER DELETE ON {TABLE_CATEGORIAS}
+    BEGIN
+        INSERT INTO {TABLE_HISTORIAL} (categoria, ts, status_stock, stock_global)
+        VALUES (OLD.categoria, {_SQL_AHORA}, NULL, NULL);
+    END
+    ''')
+    
+    # Estado inicial de las categorías que todavía no tienen historial
+    cursor.execute(f"""INSERT INTO {TABLE_HISTORIAL} (categoria, ts, status_stock, stock_global)
+                      SELECT categoria, {_SQL_AHORA}, status_stock, stock_global FROM {TABLE_CATEGORIAS} c
+                      WHERE NOT EXISTS (SELECT 1 FROM {TABLE_HISTORIAL} h WHERE h.categoria = c.categoria)""")
+
+def _semana(dia):
+    """Clave ISO de la semana de un día (ej: 2024-W07)"""
+    anio, semana, _ = dia.isocalendar()
+    return f"{anio}-W{semana:02d}"
+
+def _repartir_por_dia(desde, hasta):
+    """Parte el intervalo [desde, hasta) en tramos por día calendario (hora local)."""
+    inicio = desde
+    while inicio < hasta:
+        dia = datetime.fromtimestamp(inicio).date()
+        medianoche = datetime.combine(dia + timedelta(days=1), datetime.min.time()).timestamp()
+        fin = min(hasta, medianoche)
+        yield dia, fin - inicio
+        inicio = fin
+
+def _acumular(acumulado, clave, segundos, cambios, stock):
+    """Suma un tramo al acumulador de un rollup: [segundos, cambios, stock_min, stock_max]"""
+    if clave in acumulado:
+        valores = acumulado[clave]
+        valores[0] += segundos
+        valores[1] += cambios
+        valores[2] = min(valores[2], stock)
+        valores[3] = max(valores[3], stock)
+    else:
+        acumulado[clave] = [segundos, cambios, stock, stock]
+
+def actualizar_rollups_historial():
+    """
+    Procesa los eventos nuevos del historial (desde la última marca) y suma a los
+    rollups diarios y semanales el tiempo que cada categoría pasó en su status anterior.
+    Es incremental: cada evento se procesa una sola vez, aunque varias sesiones
+    actualicen a la vez (la marca se lee con el bloqueo de escritura tomado).
+    """
+    try:
+        with conectar_db() as conn:
+            cursor = conn.cursor()
+            # Bloquea la escritura desde la lectura de la marca hasta el commit
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(f"SELECT COALESCE(MAX(ultimo_evento), 0) FROM {TABLE_HISTORIAL_ESTADO}")
+            marca = cursor.fetchone()[0]
+            
+            cursor.execute(f"""SELECT id, categoria, ts, status_stock, stock_global FROM {TABLE_HISTORIAL}
+                              WHERE id > ? ORDER BY id""", (marca,))
+            eventos = cursor.fetchall()
+            if not eventos:
+                return True
+            
+            # Estados previos de las categorías con eventos nuevos
+            estados = {}
+            categorias = list({evento[1] for evento in eventos})
+            for i in range(0, len(categorias), 500):
+                lote = categorias[i:i + 500]
+                cursor.execute(f"""SELECT categoria, desde, status_stock, stock_global FROM {TABLE_HISTORIAL_ESTADO}
+                                  WHERE categoria IN ({','.join('?' * len(lote))})""", lote)
+                for cat, desde, status, stock in cursor:
+                    estados[cat] = (desde, status, stock)
+            
+            diario = {}
+            semanal = {}
+            ultimos = {}
+            for id_evento, cat, ts, status, stock in eventos:
+                # Cierra el intervalo del status anterior
+                previo = estados.get(cat)
+                if previo and previo[1] is not None:
+                    desde, status_previo, stock_previo = previo
+                    for dia, segundos in _repartir_por_dia(desde, ts):
+                        _acumular(diario, (cat, dia.isoformat(), status_previo), segundos, 0, stock_previo)
+                        _acumular(semanal, (cat, _semana(dia), status_previo), segundos, 0, stock_previo)
+                
+                # Abre el intervalo del nuevo status
+                if status is not None:
+                    dia = datetime.fromtimestamp(ts).date()
+                    _acumular(diario, (cat, dia.isoformat(), status), 0.0, 1, stock)
+                    _acumular(semanal, (cat, _semana(dia), status), 0.0, 1, stock)
+                estados[cat] = (ts, status, stock)
+                ultimos[cat] = id_evento
+            
+            for tabla, periodo, acumulado in ((TABLE_HISTORIAL_DIARIO, 'dia', diario),
+                                              (TABLE_HISTORIAL_SEMANAL, 'semana', semanal)):
+                sql = f'''INSERT INTO {tabla} (categoria, {periodo}, status_stock, segundos, cambios, stock_min, stock_max)
+                         VALUES (?, ?, ?, ?, ?, ?, ?)
+                         ON CONFLICT (categoria, {periodo}, status_stock) DO UPDATE SET
+                             segundos = segundos + excluded.segundos,
+                             cambios = cambios + excluded.cambios,
+                             stock_min = MIN(stock_min, excluded.stock_min),
+                             stock_max = MAX(stock_max, excluded.stock_max)'''
+                cursor.executemany(sql, [clave + tuple(valores) for clave, valores in acumulado.items()])
+            
+            cursor.executemany(f"""INSERT OR REPLACE INTO {TABLE_HISTORIAL_ESTADO}
+                                  (categoria, desde, status_stock, stock_global, ultimo_evento)
+                                  VALUES (?, ?, ?, ?, ?)""",
+                               [(cat,) + estados[cat] + (id_evento,) for cat, id_evento in ultimos.items()])
+            conn.commit()
+            return True
+    except sqlite3.Error as e:
+        imprimir_error(f"Error al actualizar el historial: {e}")
+        return False
+
+def reporte_tendencia_status(categoria=None, periodos=7, granularidad='dia'):
+    """
+    Tiempo (en segundos) que cada categoría pasó en cada status en los últimos períodos.
+    Lee solo los rollups, más el intervalo abierto de cada categoría hasta ahora.
+    
+    Args:
+        categoria (str): Categoría a consultar, o None para todas
+        periodos (int): Cantidad de días o semanas hacia atrás
+        granularidad (str): 'dia' o 'semana'
+    
+    Returns:
+        dict: {(categoria, periodo): {status: segundos}}
+    """
+    if granularidad == 'dia':
+        tabla = TABLE_HISTORIAL_DIARIO
+        desde_dia = date.today() - timedelta(days=periodos - 1)
+        desde_clave = desde_dia.isoformat()
+        clave_periodo = date.isoformat
+    else:
+        tabla = TABLE_HISTORIAL_SEMANAL
+        desde_dia = date.today() - timedelta(weeks=periodos - 1)
+        desde_dia -= timedelta(days=desde_dia.weekday())
+        desde_clave = _semana(desde_dia)
+        clave_periodo = _semana
+    
+    actualizar_rollups_historial()
+    
+    try:
+        with conectar_db() as conn:
+            cursor = conn.cursor()
+            filtro = "AND categoria = ?" if categoria else ""
+            parametros = [desde_clave] + ([categoria.strip().upper()] if categoria else [])
+            
+            tendencia = {}
+            cursor.execute(f"""SELECT categoria, {granularidad}, status_stock, segundos FROM {tabla}
+                              WHERE {granularidad} >= ? {filtro}
+                              ORDER BY categoria, {granularidad}""", parametros)
+            for cat, periodo, status, segundos in cursor:
+                tendencia.setdefault((cat, periodo), {})[status] = segundos
+            
+            # Suma el intervalo abierto (desde el último cambio hasta ahora)
+            ahora = datetime.now().timestamp()
+            desde_ts = datetime.combine(desde_dia, datetime.min.time()).timestamp()
+            cursor.execute(f"""SELECT categoria, desde, status_stock FROM {TABLE_HISTORIAL_ESTADO}
+                              WHERE status_stock IS NOT NULL {filtro}""",
+                           parametros[1:])
+            for cat, desde, status in cursor:
+                for dia, segundos in _repartir_por_dia(max(desde, desde_ts), ahora):
+                    por_status = tendencia.setdefault((cat, clave_periodo(dia)), {})
+                    por_status[status] = por_status.get(status, 0.0) + segundos
+            
+            return dict(sorted(tendencia.items()))
+    except sqlite3.Error as e:
+        imprimir_error(f"Error al leer la tendencia de status: {e}")
+        return {}
+
+# REGISTRO DE CAMBIOS (CDC)
+
+def _crear_tabla_eventos(cursor):
+    """Crea la tabla de eventos de cambios, numerados en orden de escritura"""
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS {TABLE_EVENTOS} (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        ts REAL NOT NULL,
+        entidad TEXT NOT NULL,
+        clave TEXT NOT NULL,
+        operacion TEXT NOT NULL,
+        datos TEXT
+    )
+    ''')
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE_EVENTOS}_ts ON {TABLE_EVENTOS} (ts)")
+
+def _crear_triggers_eventos(cursor, tabla, entidad, clave, columnas, operacion_insert='INSERT'):
+    """
+    Crea los triggers que agregan un evento por cada fila insertada, modificada o eliminada.
+    Las modificaciones solo generan evento si cambió alguna de las columnas.
+    Los datos del evento son la fila nueva en JSON (vacío en las eliminaciones).
+    """
+    datos = "json_object(" + ", ".join(f"'{col}', NEW.{col}" for col in columnas) + ")"
+    hay_cambios = " OR ".join(f"OLD.{col} IS NOT NEW.{col}" for col in columnas)
+    columnas_evento = f"{TABLE_EVENTOS} (ts, entidad, clave, operacion, datos)"
+    
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_{tabla}_eventos_insert AFTER INSERT ON {tabla}
+    BEGIN
+        INSERT INTO {columnas_evento} VALUES ({_SQL_AHORA}, '{entidad}', NEW.{clave}, '{operacion_insert}', {datos});
+    END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_{tabla}_eventos_update AFTER UPDATE ON {tabla}
+    WHEN {hay_cambios}
+    BEGIN
+        INSERT INTO {columnas_evento} VALUES ({_SQL_AHORA}, '{entidad}', NEW.{clave}, 'UPDATE', {datos});
+    END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_{tabla}_eventos_delete AFTER DELETE ON {tabla}
+    BEGIN
+        INSERT INTO {columnas_evento} VALUES ({_SQL_AHORA}, '{entidad}', OLD.{clave}, 'DELETE', NULL);
+    END
+    ''')
+
+def _conectar_origen_eventos(almacen=None):
+    """Conexión a la base con el registro de cambios: la principal, o la del almacén indicado"""
+    return conectar_almacen(almacen) if almacen else conectar_db()
+
+def leer_eventos(desde_seq=0, limite=1000, almacen=None):
+    """
+    Lee hasta `limite` eventos con número de secuencia mayor a `desde_seq`.
+    Los productos de cada almacén tienen su propio registro (y su propia secuencia):
+    sin almacén se lee el de la base principal (categorías, estadísticas y, si hay
+    un solo almacén, productos).
+    
+    Operaciones: INSERT, UPDATE y DELETE (UPSERT en las estadísticas). Los productos
+    que se archivan quedan como ARCHIVE (sin datos) y los restaurados como RESTORE
+    (con la fila, igual que INSERT).
+    
+    Returns:
+        list: Eventos (seq, ts, entidad, clave, operacion, datos) con datos como dict o None
+    """
+    try:
+        with _conectar_origen_eventos(almacen) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""SELECT seq, ts, entidad, clave, operacion, datos FROM {TABLE_EVENTOS}
+                              WHERE seq > ? ORDER BY seq LIMIT ?""", (desde_seq, limite))
+            return [fila[:5] + (json.loads(fila[5]) if fila[5] else None,) for fila in cursor]
+    except (sqlite3.Error, ValueError) as e:
+        imprimir_error(f"Error al leer eventos: {e}")
+        return []
+
+def seguir_eventos(desde_seq=0, tamano_lote=1000, almacen=None):
+    """
+    Recorre el registro de cambios desde la posición `desde_seq`, en lotes.
+    Cada lote es una lista de eventos; la posición para continuar es el seq del último.
+    Termina cuando alcanza el final del registro.
+    """
+    while True:
+        lote = leer_eventos(desde_seq, tamano_lote, almacen)
+        if not lote:
+            return
+        yield lote
+        desde_seq = lote[-1][0]
+
+def truncar_eventos(hasta_seq, almacen=None, tamano_lote=10000):
+    """Elimina los eventos con seq menor o igual a `hasta_seq`, en lotes. Devuelve cuántos eliminó."""
+    return _eliminar_eventos("seq <= ?", hasta_seq, almacen, tamano_lote)
+
+def aplicar_retencion_eventos(dias, almacen=None, tamano_lote=10000):
+    """Elimina los eventos con más de `dias` de antigüedad, en lotes. Devuelve cuántos eliminó."""
+    limite_ts = datetime.now().timestamp() - dias * 86400
+    return _eliminar_eventos("ts < ?", limite_ts, almacen, tamano_lote)
+
+def _eliminar_eventos(condicion, valor, almacen, tamano_lote):
+    """Borra eventos en transacciones cortas para no bloquear a los escritores"""
+    eliminados = 0
+    try:
+        with _conectar_origen_eventos(almacen) as conn:
+            cursor = conn.cursor()
+            while True:
+                cursor.execute(f"""DELETE FROM {TABLE_EVENTOS} WHERE seq IN
+                                  (SELECT seq FROM {TABLE_EVENTOS} WHERE {condicion} ORDER BY seq LIMIT ?)""",
+                               (valor, tamano_lote))
+                conn.commit()
+                eliminados += cursor.rowcount
+                if cursor.rowcount < tamano_lote:
+                    return eliminados
+    except (sqlite3.Error, ValueError) as e:
+        imprimir_error(f"Error al eliminar eventos: {e}")
+        return eliminados
@@ -0,0 +1,72 @@
+"""
+Entorno común de las herramientas de verificación (utils.verificaciones,
+utils.comparar_motores y utils.simulador_carga): una carpeta temporal con su
+propia base, para no tocar nunca la base real, y el acumulador de diferencias.
+"""
+import contextlib
+import io
+import os
+import sqlite3
+import tempfile
+
+class Fallas:
+    """Acumula las diferencias entre lo obtenido y lo esperado"""
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.fallas = []
+    
+    def igual(self, descripcion, obtenido, esperado):
+        if obtenido != esperado:
+            self.fallas.append(f"[{self.nombre}] {descripcion}: se obtuvo {obtenido!r}, se esperaba {esperado!r}")
+
+def _almacenes_configurados():
+    """Almacenes de INVENTARIO_ALMACENES como [(nombre, archivo)], igual que config.ALMACENES"""
+    pares = (par.split('=', 1) for par in os.environ.get('INVENTARIO_ALMACENES', '').split(',') if '=' in par)
+    return [(nombre.strip().upper(), archivo.strip()) for nombre, archivo in pares]
+
+def _copiar_archivo(origen, destino):
+    """Copia una base con la API de backup (incluye lo que todavía está en el WAL)"""
+    if not os.path.exists(origen):
+        return
+    conn_origen = sqlite3.connect(origen)
+    conn_destino = sqlite3.connect(destino)
+    try:
+        conn_origen.backup(conn_destino)
+    finally:
+        conn_destino.close()
+        conn_origen.close()
+
+def usar_carpeta_temporal(prefijo, inicializar=False, copiar_base=False):
+    """
+    Pasa a trabajar en una carpeta temporal nueva, con la base 'inventario.db'.
+    Debe llamarse antes de importar config o utils.db_manager: la configuración se
+    lee al importar (los procesos hijos heredan la carpeta y las variables).
+    
+    Args:
+        prefijo (str): Prefijo del nombre de la carpeta
+        inicializar (bool): Si es True, crea las tablas de la base temporal
+        copiar_base (bool): Si es True, la base temporal empieza como una copia de la
+            configurada, con los mismos almacenes (también copiados). Si no, queda un
+            solo almacén.
+    
+    Returns:
+        str: Ruta de la carpeta temporal
+    """
+    carpeta = tempfile.mkdtemp(prefix=prefijo)
+    almacenes = []
+    if copiar_base:
+        _copiar_archivo(os.environ.get('INVENTARIO_DB', 'inventario.db'), os.path.join(carpeta, 'inventario.db'))
+        for i, (nombre, archivo) in enumerate(_almacenes_configurados(), start=1):
+            copia = f"almacen_{i}.db"
+            _copiar_archivo(archivo, os.path.join(carpeta, copia))
+            almacenes.append(f"{nombre}={copia}")
+    
+    os.chdir(carpeta)
+    os.environ['INVENTARIO_DB'] = 'inventario.db'
+    os.environ['INVENTARIO_ALMACENES'] = ','.join(almacenes)
+    
+    if inicializar:
+        from utils import db_manager
+        with contextlib.redirect_stdout(io.StringIO()):
+            db_manager.inicializar_db()
+    return carpeta
@@ -1,7 +1,52 @@
+import io
+import re
+import sys
+import threading
+from contextlib import contextmanager
 from colorama import init, Fore, Style, Back
 
 init(autoreset=True)
 
+# Salida capturada por hilo (para generar reportes en paralelo)
+_salida_hilo = threading.local()
+_lock_salida = threading.Lock()
+_CODIGOS_COLOR = re.compile(r'\x1b\[[0-9;]*m')
+
+class _SalidaPorHilo:
+    """Reemplazo de sys.stdout que envía lo impreso al buffer del hilo, si tiene uno."""
+    def __init__(self, original):
+        self._original = original
+    
+    def write(self, texto):
+        buffer = getattr(_salida_hilo, 'buffer', None)
+        if buffer is not None:
+            return buffer.write(texto)
+        return self._original.write(texto)
+    
+    def __getattr__(self, nombre):
+        return getattr(self._original, nombre)
+
+@contextmanager
+def capturar_salida():
+    """
+    Captura todo lo que imprime el hilo actual dentro del bloque.
+    Los demás hilos siguen imprimiendo en pantalla.
+    """
+    with _lock_salida:
+        if not isinstance(sys.stdout, _SalidaPorHilo):
+            sys.stdout = _SalidaPorHilo(sys.stdout)
+    
+    buffer = io.StringIO()
+    _salida_hilo.buffer = buffer
+    try:
+        yield buffer
+    finally:
+        _salida_hilo.buffer = None
+
+def quitar_colores(texto):
+    """Quita los códigos de color ANSI (para guardar la salida en archivos)"""
+    return _CODIGOS_COLOR.sub('', texto)
+
 def imprimir_titulo(texto):
     print(f"\n{Back.LIGHTBLACK_EX+Fore.CYAN}{Style.DIM}=== {texto.upper()} ==={Style.RESET_ALL}")
 
@@ -55,11 +100,11 @@ def validar_categoria(categoria_nombre, mostrar_error=True):
     Returns:
         bool: True si la categoría existe, False si no existe
     """
-    from utils.db_manager import buscar_categoria
+    from utils.repositorio import obtener_repositorio
     
     # Normalizar a mayúsculas
     categoria_normalizada = categoria_nombre.strip().upper()
-    categoria = buscar_categoria(categoria_normalizada)
+    categoria = obtener_repositorio().buscar_categoria(categoria_normalizada)
     
     if categoria is None:
         if mostrar_error:
@@ -72,6 +117,8 @@ def validar_categoria_con_reintento(prompt, permitir_vacio=False):
     """
     Solicita una categoría al usuario y valida que exista, con reintentos.
     Normaliza la entrada a mayúsculas automáticamente.
+    Si la categoría no existe, sugiere las más parecidas y permite elegirlas con #número
+    (un número sin # se toma como nombre, para no confundirlo con una categoría "1" o "2024").
     Útil para cuando el usuario está ingresando datos.
     
     Args:
@@ -81,8 +128,9 @@ def validar_categoria_con_reintento(prompt, permitir_vacio=False):
     Returns:
         str: Nombre de la categoría válida EN MAYÚSCULAS o cadena vacía si se permitió
     """
-    from utils.db_manager import obtener_categorias
+    from utils.repositorio import obtener_repositorio
     
+    sugerencias = []
     while True:
         categoria = input(f"{Fore.MAGENTA}{prompt}: {Style.RESET_ALL}").strip()
         
@@ -101,28 +149,33 @@ def validar_categoria_con_reintento(prompt, permitir_vacio=False):
         # Validar que la categoría exista
         if validar_categoria(categoria_normalizada, mostrar_error=False):
             return categoria_normalizada  # Retorna en mayúsculas
+        
+        # Elige una de las sugerencias anteriores con #número
+        numero = categoria[1:].strip()
+        if categoria.startswith('#') and numero.isdigit() and 1 <= int(numero) <= len(sugerencias):
+            return sugerencias[int(numero) - 1]
         else:
-            # Mostrar categorías disponibles
+            # Mostrar las categorías más parecidas
             imprimir_error(f"La categoría '{categoria}' no existe.")
-            categorias_disponibles = obtener_categorias()
+            sugerencias = obtener_repositorio().sugerir_categorias(categoria_normalizada)
             
-            if categorias_disponibles:
-                print(f"{Fore.YELLOW}Categorías disponibles:{Style.RESET_ALL}")
-                for cat in categorias_disponibles:
-                    print(f"  • {cat[0]}")  # cat[0] es el nombre de la categoría
+            if sugerencias:
+                print(f"{Fore.YELLOW}¿Quiso decir?{Style.RESET_ALL}")
+                for i, sugerencia in enumerate(sugerencias, start=1):
+                    print(f"  {i}. {sugerencia}")
+                print(f"{Fore.CYAN}Ingrese #número para elegir una sugerencia (ej: #1) o intente nuevamente.{Style.RESET_ALL}")
             else:
-                print(f"{Fore.YELLOW}No hay categorías registradas aún.{Style.RESET_ALL}")
-            
-            print(f"{Fore.CYAN}Intente nuevamente o escriba el nombre exacto.{Style.RESET_ALL}")
+                print(f"{Fore.YELLOW}No se encontraron categorías parecidas.{Style.RESET_ALL}")
+                print(f"{Fore.CYAN}Intente nuevamente o escriba el nombre exacto.{Style.RESET_ALL}")
 
 def listar_categorias_disponibles():
     """
     Muestra una lista formateada de todas las categorías disponibles.
     Útil para mostrar antes de solicitar una categoría.
     """
-    from utils.db_manager import obtener_categorias
+    from utils.repositorio import obtener_repositorio
     
-    categorias = obtener_categorias()
+    categorias = obtener_repositorio().obtener_categorias()
     
     if categorias:
         print(f"\n{Fore.CYAN}Categorías disponibles:{Style.RESET_ALL}")
@@ -0,0 +1,389 @@
+"""
+Motores de almacenamiento intercambiables.
+
+main.py y helpers.py usan el repositorio activo (config MOTOR_ALMACENAMIENTO o
+variable INVENTARIO_MOTOR) en lugar de llamar directamente a utils.db_manager.
+Todo motor implementa las OPERACIONES, con las mismas firmas y resultados que
+las funciones de db_manager. Las operaciones propias de SQLite (reprecio masivo,
+verificación, archivo de productos, jerarquía de categorías, ranking de cobertura,
+plan de compras, historial, eventos) solo existen en ese motor.
+
+Para verificar un motor y comparar el rendimiento: python -m utils.comparar_motores
+"""
+import threading
+from bisect import bisect_left, bisect_right, insort
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from config import MOTOR_ALMACENAMIENTO
+from utils import db_manager
+from utils.db_manager import a_centavos, percentil, valores_esperados, determinar_status_stock
+from utils.helpers import imprimir_error
+from utils.trigramas import IndiceTrigramas
+
+# Operaciones que debe implementar todo motor
+OPERACIONES = (
+    'inicializar_db', 'snapshot_lectura', 'obtener_almacenes',
+    # Productos
+    'registrar_producto', 'obtener_productos', 'buscar_producto_id', 'buscar_producto_texto',
+    'obtener_productos_por_categoria', 'actualizar_producto', 'eliminar_producto', 'reporte_bajo_stock', 'reporte_valorizacion',
+    # Categorías
+    'registrar_categoria', 'obtener_categorias', 'buscar_categoria', 'actualizar_categoria',
+    'eliminar_categoria', 'sugerir_categorias',
+    # Estadísticas y status
+    'calcular_estadisticas_categoria', 'actualizar_estadisticas_todas_categorias',
+    'obtener_estadisticas_detalladas', 'actualizar_stock_categoria', 'actualizar_status_categoria'
+)
+
+# Operaciones que solo tiene el motor SQLite (los menús consultan si están disponibles)
+OPERACIONES_SQLITE = (
+    'reprecio_masivo', 'verificar_consistencia',
+    # Archivo de productos
+    'archivar_productos_inactivos', 'restaurar_productos_archivados', 'obtener_productos_archivados',
+    # Jerarquía de categorías
+    'mover_categoria', 'obtener_ruta_categoria', 'reporte_jerarquia',
+    # Cobertura y plan de compras
+    'ranking_cobertura', 'calcular_plan_reposicion', 'exportar_plan_reposicion',
+    # Historial y eventos
+    'actualizar_rollups_historial', 'reporte_tendencia_status',
+    'leer_eventos', 'seguir_eventos', 'truncar_eventos', 'aplicar_retencion_eventos'
+)
+
+class RepositorioSQLite:
+    """
+    Motor SQLite: delega en utils.db_manager las OPERACIONES y las OPERACIONES_SQLITE.
+    Las demás funciones del módulo (conexiones, funciones internas) no se exponen.
+    """
+    nombre = 'sqlite'
+    _delegadas = frozenset(OPERACIONES + OPERACIONES_SQLITE)
+    
+    def __getattr__(self, nombre):
+        if nombre in self._delegadas:
+            return getattr(db_manager, nombre)
+        raise AttributeError(f"El motor '{self.nombre}' no tiene la operación '{nombre}'")
+
+def _dato(nombre):
+    """
+    Datos del motor en memoria: dentro de snapshot_lectura() el hilo lee la copia
+    tomada al abrirlo; fuera, los datos compartidos.
+    """
+    def leer(self):
+        copia = getattr(self._hilo, 'copia', None)
+        return (self._datos if copia is None else copia)[nombre]
+    
+    def escribir(self, valor):
+        self._datos[nombre] = valor
+    return property(leer, escribir)
+
+def _escritura(metodo):
+    """
+    Operación que modifica los datos: toma el lock y cambia la versión de los datos.
+    Dentro de snapshot_lectura() falla sin escribir, como la conexión de solo lectura del
+    snapshot de SQLite.
+    """
+    @wraps(metodo)
+    def envoltura(self, *args, **kwargs):
+        if getattr(self._hilo, 'copia', None) is not None:
+            imprimir_error("No se puede escribir dentro de un snapshot de lectura.")
+            return False
+        with self._lock:
+            self._version += 1
+            return metodo(self, *args, **kwargs)
+    return envoltura
+
+class RepositorioMemoria:
+    """
+    Motor en memoria, sin persistencia: diccionarios por clave e índices ordenados
+    (bisect) de productos por categoría y precio y por cantidad.
+    Las escrituras y las lecturas sueltas toman el mismo lock. snapshot_lectura() copia
+    los datos (la copia se reutiliza mientras nadie escriba) y el bloque lee de la copia
+    sin lock, así varios reportes en paralelo no se esperan entre sí ni a los escritores.
+    """
+    nombre = 'memoria'
+    
+    _productos = _dato('productos')           # id -> [id, nombre, descripcion, cantidad, precio_centavos, categoria]
+    _por_categoria = _dato('por_categoria')   # categoria -> lista ordenada de (precio_centavos, id)
+    _por_cantidad = _dato('por_cantidad')     # lista ordenada de (cantidad, id)
+    _categorias = _dato('categorias')         # categoria -> [categoria, mean, min, max, stock, demanda, protección, status]
+    _estadisticas = _dato('estadisticas')     # categoria -> (categoria, cantidad, mediana, p10, p90, desviación, valor)
+    
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._hilo = threading.local()
+        self._datos = {'productos': {}, 'por_categoria': {}, 'por_cantidad': [], 'categorias': {}, 'estadisticas': {}}
+        self._version = 0
+        self._copia = (None, None)  # (versión, datos) del último snapshot
+        self._indice_nombres = IndiceTrigramas()
+        self._ultimo_id = 0
+    
+    def _lectura(self):
+        """Lock para una lectura suelta (dentro de un snapshot se lee la copia, sin lock)"""
+        return nullcontext() if getattr(self._hilo, 'copia', None) is not None else self._lock
+    
+    def _copiar_datos(self):
+        """Copia de los datos para un snapshot (las filas se copian porque se modifican en el lugar)"""
+        version, copia = self._copia
+        if version != self._version:
+            datos = self._datos
+            copia = {
+                'productos': {id_prod: list(fila) for id_prod, fila in datos['productos'].items()},
+                'por_categoria': {categoria: list(indice) for categoria, indice in datos['por_categoria'].items()},
+                'por_cantidad': list(datos['por_cantidad']),
+                'categorias': {categoria: list(fila) for categoria, fila in datos['categorias'].items()},
+                'estadisticas': dict(datos['estadisticas'])
+            }
+            self._copia = (self._version, copia)
+        return copia
+    
+    # Índices
+    
+    def _indexar(self, fila):
+        if fila[5] is not None:
+            insort(self._por_categoria.setdefault(fila[5], []), (fila[4], fila[0]))
+        insort(self._por_cantidad, (fila[3], fila[0]))
+    
+    def _desindexar(self, fila):
+        if fila[5] is not None:
+            precios = self._por_categoria[fila[5]]
+            del precios[bisect_left(precios, (fila[4], fila[0]))]
+            if not precios:
+                del self._por_categoria[fila[5]]
+        del self._por_cantidad[bisect_left(self._por_cantidad, (fila[3], fila[0]))]
+    
+    @staticmethod
+    def _publica(fila):
+        """Fila de producto como la devuelve db_manager (precio en pesos)"""
+        return (fila[0], fila[1], fila[2], fila[3], fila[4] / 100.0, fila[5])
+    
+    def _agregar(self, categoria):
+        """Estadísticas de los productos de una categoría (como db_manager._agregar_por_categoria)"""
+        precios = self._por_categoria.get(categoria)
+        if not precios:
+            return None
+        productos = self._productos
+        return {
+            'mean': round(sum(precio for precio, _ in precios) / len(precios) / 100, 2),
+            'min_price': precios[0][0] / 100,
+            'max_price': precios[-1][0] / 100,
+            'stock_global': sum(productos[id_prod][3] for _, id_prod in precios)
+        }
+    
+    # Generales
+    
+    def inicializar_db(self):
+        print("✓ Tablas inicializadas correctamente")
+    
+    @contextmanager
+    def snapshot_lectura(self, modo=None):
+        # Con uno ya activo en este hilo, no hace nada
+        if getattr(self._hilo, 'copia', None) is not None:
+            yield
+            return
+        
+        with self._lock:
+            self._hilo.copia = self._copiar_datos()
+        try:
+            yield
+        finally:
+            self._hilo.copia = None
+    
+    def obtener_almacenes(self):
+        return []
+    
+    # Productos
+    
+    @_escritura
+    def registrar_producto(self, nombre, descripcion, cantidad, precio, categoria, almacen=None):
+        categoria_upper = categoria.strip().upper() if categoria else None
+        with self._lock:
+            self._ultimo_id += 1
+            fila = [self._ultimo_id, nombre, descripcion, cantidad, a_centavos(precio), categoria_upper]
+            self._productos[fila[0]] = fila
+            self._indexar(fila)
+            return True
+    
+    # Este motor no archiva productos: incluir_archivados se acepta por compatibilidad
+    
+    def obtener_productos(self, incluir_archivados=False):
+        with self._lectura():
+            return [self._publica(fila) for fila in self._productos.values()]
+    
+    def buscar_producto_id(self, id_prod, incluir_archivados=False):
+        with self._lectura():
+            fila = self._productos.get(id_prod)
+            return self._publica(fila) if fila else None
+    
+    def buscar_producto_texto(self, termino, incluir_archivados=False):
+        termino_upper = termino.strip().upper()
+        with self._lectura():
+            return [self._publica(fila) for fila in self._productos.values()
+                    if termino_upper in fila[1].upper() or termino_upper in (fila[5] or '')]
+    
+    def obtener_productos_por_categoria(self, nombre_categoria=None, incluir_archivados=False):
+        with self._lectura():
+            productos, por_categoria = self._productos, self._por_categoria
+            categorias = [nombre_categoria.strip().upper()] if nombre_categoria else sorted(por_categoria)
+            return [self._publica(productos[id_prod])
+                    for categoria in categorias for _, id_prod in por_categoria.get(categoria, [])]
+    
+    @_escritura
+    def actualizar_producto(self, id_prod, nombre, descripcion, cantidad, precio, categoria, almacen=None):
+        categoria_upper = categoria.strip().upper() if categoria else None
+        with self._lock:
+            fila = self._productos.get(id_prod)
+            if fila is None:
+                return False
+            self._desindexar(fila)
+            fila[1:] = [nombre, descripcion, cantidad, a_centavos(precio), categoria_upper]
+            self._indexar(fila)
+            return True
+    
+    @_escritura
+    def eliminar_producto(self, id_prod, almacen=None):
+        with self._lock:
+            fila = self._productos.pop(id_prod, None)
+            if fila is None:
+                return False
+            self._desindexar(fila)
+            return True
+    
+    def reporte_bajo_stock(self, limite, incluir_archivados=False):
+        with self._lectura():
+            productos, por_cantidad = self._productos, self._por_cantidad
+            hasta = bisect_right(por_cantidad, (limite, float('inf')))
+            return [self._publica(productos[id_prod]) for _, id_prod in por_cantidad[:hasta]]
+    
+    def reporte_valorizacion(self):
+        with self._lectura():
+            valores = {}
+            for fila in self._productos.values():
+                unidades, valor = valores.get(fila[5], (0, 0))
+                valores[fila[5]] = (unidades + fila[3], valor + fila[3] * fila[4])
+        filas = sorted(valores.items(), key=lambda item: item[1][1], reverse=True)
+        total = sum(valor for _, (_, valor) in filas)
+        return [(cat, unidades, valor / 100) for cat, (unidades, valor) in filas], total / 100
+    
+    # Categorías
+    
+    @_escritura
+    def registrar_categoria(self, categoria, mean, min_price, max_price, stock_global, demanda_semanal, status_stock):
+        categoria_upper = categoria.strip().upper()
+        with self._lock:
+            # Igual que INSERT OR REPLACE: la categoría reemplazada pasa al final
+            self._categorias.pop(categoria_upper, None)
+            self._categorias[categoria_upper] = [categoria_upper, mean, min_price, max_price, stock_global,
+                                                 demanda_semanal, int(demanda_semanal * 0.2), status_stock]
+            self._indice_nombres.agregar(categoria_upper)
+            return True
+    
+    def obtener_categorias(self):
+        with self._lectura():
+            return [tuple(cat) for cat in self._categorias.values()]
+    
+    def buscar_categoria(self, nombre_categoria):
+        with self._lectura():
+            cat = self._categorias.get(nombre_categoria.strip().upper())
+            return tuple(cat) if cat else None
+    
+    @_escritura
+    def actualizar_categoria(self, categoria, mean, min_price, max_price, stock_global, demanda_semanal, status_stock):
+        with self._lock:
+            cat = self._categorias.get(categoria.strip().upper())
+            if cat is None:
+                return False
+            cat[1:] = [mean, min_price, max_price, stock_global, demanda_semanal,
+                       int(demanda_semanal * 0.2), status_stock]
+            return True
+    
+    @_escritura
+    def eliminar_categoria(self, nombre_categoria):
+        categoria_upper = nombre_categoria.strip().upper()
+        with self._lock:
+            if self._categorias.pop(categoria_upper, None) is None:
+                return False
+            self._indice_nombres.eliminar(categoria_upper)
+            return True
+    
+    def sugerir_categorias(self, texto, k=5):
+        with self._lock:
+            return [nombre for nombre, _ in self._indice_nombres.sugerir(texto, k)]
+    
+    # Estadísticas y status
+    
+    def calcular_estadisticas_categoria(self, nombre_categoria):
+        with self._lectura():
+            return self._agregar(nombre_categoria.strip().upper())
+    
+    @_escritura
+    def actualizar_estadisticas_todas_categorias(self, demanda_semanal_default=1):
+        with self._lock:
+            for cat in self._categorias.values():
+                cat[1:] = valores_esperados(self._agregar(cat[0]), cat[5], demanda_semanal_default)
+            self._actualizar_estadisticas_detalladas()
+            cantidad = len(self._categorias)
+        print(f"✓ Estadísticas actualizadas para {cantidad} categorías")
+        return True
+    
+    def _actualizar_estadisticas_detalladas(self):
+        """Mediana, p10/p90, desviación y valor de inventario (como db_manager.calcular_estadisticas_detalladas)"""
+        self._estadisticas = estadisticas = {}
+        productos = self._productos
+        for categoria, indice in self._por_categoria.items():
+            precios = [precio for precio, _ in indice]
+            valor_inventario = sum(productos[id_prod][3] * precio for precio, id_prod in indice)
+            media = sum(precios) / len(precios)
+            varianza = sum((precio - media) ** 2 for precio in precios) / len(precios)
+            estadisticas[categoria] = (
+                categoria, len(precios),
+                round(percentil(precios, 0.5) / 100, 2),
+                round(percentil(precios, 0.1) / 100, 2),
+                round(percentil(precios, 0.9) / 100, 2),
+                round(varianza ** 0.5 / 100, 2),
+                valor_inventario / 100
+            )
+    
+    def obtener_estadisticas_detalladas(self):
+        with self._lectura():
+            return list(self._estadisticas.values())
+    
+    @_escritura
+    def actualizar_stock_categoria(self, nombre_categoria, nuevo_stock_global):
+        with self._lock:
+            cat = self._categorias.get(nombre_categoria.strip().upper())
+            if cat is None:
+                return False
+            stock_proteccion = int(cat[5] * 0.2)
+            cat[4] = nuevo_stock_global
+            cat[6] = stock_proteccion
+            cat[7] = determinar_status_stock(nuevo_stock_global, stock_proteccion, cat[5])
+            return True
+    
+    @_escritura
+    def actualizar_status_categoria(self, nombre_categoria, nuevo_status):
+        with self._lock:
+            cat = self._categorias.get(nombre_categoria.strip().upper())
+            if cat is None:
+                return False
+            cat[7] = nuevo_status
+            return True
+
+MOTORES = {
+    RepositorioSQLite.nombre: RepositorioSQLite,
+    RepositorioMemoria.nombre: RepositorioMemoria
+}
+
+if MOTOR_ALMACENAMIENTO not in MOTORES:
+    raise ValueError(f"Motor de almacenamiento desconocido: {MOTOR_ALMACENAMIENTO}")
+
+_repositorio = None
+
+def obtener_repositorio():
+    """Repositorio del motor configurado (se crea en el primer uso)"""
+    global _repositorio
+    if _repositorio is None:
+        _repositorio = MOTORES[MOTOR_ALMACENAMIENTO]()
+    return _repositorio
+
+def usar_repositorio(repositorio):
+    """Reemplaza el repositorio activo (por ejemplo, para correr los menús sobre otro motor)"""
+    global _repositorio
+    _repositorio = repositorio
@@ -0,0 +1,323 @@
+"""
+Simulador de carga de los menús interactivos.
+
+Ejecuta main() con guiones de entradas grabadas (reemplazando input()), mide el
+tiempo de cada acción de menú y corre muchas sesiones en paralelo, en procesos
+separados, contra la misma base de datos. Al final muestra los percentiles de
+latencia de cada acción.
+
+Uso:
+    python -m utils.simulador_carga --grabar guion.json
+    python -m utils.simulador_carga --guion guion.json --sesiones 40 --procesos 8
+
+Las opciones de menú se guardan por su texto ("@Mostrar Todos los Productos") y al
+reproducir se busca el número en el menú que se acaba de mostrar, así los guiones
+siguen funcionando aunque se agreguen o reordenen opciones. Si la opción ya no
+existe, la simulación se detiene con un error. Una entrada de texto que empieza
+con @ se escribe @@.
+
+La grabación y la simulación trabajan sobre una copia de la base configurada
+(INVENTARIO_DB y los almacenes) en una carpeta temporal: nunca tocan la base real.
+Las demás entradas se reproducen tal cual: los guiones deben grabarse con la misma
+configuración de almacenes (con varios almacenes, registrar un producto pide uno más).
+"""
+import argparse
+import builtins
+import contextlib
+import json
+import math
+import multiprocessing
+import os
+import re
+import sys
+import time
+from utils.entorno_pruebas import usar_carpeta_temporal
+from utils.helpers import imprimir_titulo, imprimir_exito, imprimir_error
+
+# Funciones de main.py que muestran un menú y piden una opción
+_MENUS = {
+    'main': 'Principal',
+    'menu_productos': 'Productos',
+    'menu_categorias': 'Categorías',
+    'menu_reportes': 'Reportes'
+}
+
+# Prefijo de las entradas que eligen una opción de menú por su texto
+PREFIJO_OPCION = '@'
+
+# Línea de opción de un menú: "3. Reportes y Análisis"
+_LINEA_OPCION = re.compile(r'^\s*(\d+)\.\s+(.+?)\s*$', re.MULTILINE)
+
+# Categoría que usan los guiones incluidos
+CATEGORIA_SIMULADA = 'SIMULADA'
+
+# Guiones incluidos (se usan si no se indica ninguno)
+GUIONES = {
+    'consulta': [
+        '@Gestión de Productos', '@Mostrar Todos los Productos',
+        '@Buscar Producto', '@Buscar por Nombre o Categoría', 'SIM', 'n',
+        '@Volver al Menú Principal',
+        '@Gestión de Categorías', '@Mostrar Todas las Categorías',
+        '@Volver al Menú Principal',
+        '@Salir'
+    ],
+    'alta': [
+        '@Gestión de Productos',
+        '@Registrar Producto', 'Producto simulado', '', CATEGORIA_SIMULADA, '5', '9.99',
+        '@Volver al Menú Principal',
+        '@Salir'
+    ],
+    'reportes': [
+        '@Reportes y Análisis',
+        '@Panel General', '@Productos con Bajo Stock', '@Categorías Críticas',
+        '@Productos por Categoría', CATEGORIA_SIMULADA,
+        '@Valorización del Inventario',
+        '@Volver al Menú Principal',
+        '@Salir'
+    ]
+}
+
+class _FinDelGuion(BaseException):
+    """Se lanza cuando el guion se queda sin entradas (no la atrapan los except Exception de los menús)"""
+
+class _OpcionInexistente(BaseException):
+    """Se lanza cuando el menú mostrado no tiene la opción del guion (tampoco la atrapan los menús)"""
+
+class GuionInvalido(Exception):
+    """Un guion pide una opción de menú que no existe"""
+
+class _Pantalla:
+    """
+    Salida estándar que guarda lo mostrado desde la última entrada (para encontrar las
+    opciones de menú por su texto) y, opcionalmente, lo reenvía a otra salida.
+    """
+    def __init__(self, salida=None):
+        self.salida = salida
+        self._texto = []
+    
+    def write(self, texto):
+        self._texto.append(texto)
+        return self.salida.write(texto) if self.salida is not None else len(texto)
+    
+    def flush(self):
+        if self.salida is not None:
+            self.salida.flush()
+    
+    def opciones(self):
+        """{número: texto} de las opciones de menú mostradas desde la última entrada"""
+        return dict(_LINEA_OPCION.findall(''.join(self._texto)))
+    
+    def limpiar(self):
+        self._texto = []
+
+class Reproductor:
+    """
+    Reemplazo de input() que responde con las entradas de un guion y mide cada acción.
+    Una acción empieza cuando se elige una opción de un menú y termina cuando algún
+    menú vuelve a pedir una opción; incluye todo lo que pasa en el medio (consultas,
+    listados y las demás entradas de la acción).
+    """
+    def __init__(self, entradas, pausa=0.0):
+        self.entradas = list(entradas)
+        self.pausa = pausa
+        self.tiempos = []
+        self.pantalla = _Pantalla()
+        self._posicion = 0
+        self._accion = None
+        self._inicio = None
+    
+    def cerrar_accion(self):
+        """Registra el tiempo de la acción en curso"""
+        if self._accion is not None:
+            self.tiempos.append((self._accion, time.perf_counter() - self._inicio))
+            self._accion = None
+    
+    def input(self, prompt=''):
+        menu = sys._getframe(1).f_code.co_name
+        if menu in _MENUS:
+            self.cerrar_accion()
+        
+        if self._posicion >= len(self.entradas):
+            self.cerrar_accion()
+            raise _FinDelGuion
+        entrada = self.entradas[self._posicion]
+        self._posicion += 1
+        opciones = self.pantalla.opciones()
+        self.pantalla.limpiar()
+        
+        if entrada.startswith(PREFIJO_OPCION * 2):
+            entrada = entrada[1:]
+        elif entrada.startswith(PREFIJO_OPCION):
+            entrada = self._numero_de_opcion(entrada[1:], opciones)
+        
+        if menu in _MENUS:
+            # El tiempo de "pensar" del usuario no cuenta para la acción
+            if self.pausa:
+                time.sleep(self.pausa)
+            self._accion = f"{_MENUS[menu]} › {opciones.get(entrada, entrada)}"
+            self._inicio = time.perf_counter()
+        return entrada
+    
+    def _numero_de_opcion(self, texto, opciones):
+        """Número de la opción mostrada con ese texto (sin distinguir mayúsculas)"""
+        for numero, opcion in opciones.items():
+            if opcion.casefold() == texto.strip().casefold():
+                return numero
+        self.cerrar_accion()
+        disponibles = ', '.join(f"{numero}. {opcion}" for numero, opcion in opciones.items()) or 'ninguna'
+        raise _OpcionInexistente(f"entrada {self._posicion}: no hay una opción '{texto}' (opciones: {disponibles})")
+
+class Grabador:
+    """
+    Envuelve input() y guarda todo lo que ingresa el usuario. Las opciones elegidas de
+    un menú mostrado se guardan por su texto.
+    """
+    def __init__(self, input_original):
+        self.entradas = []
+        self.pantalla = _Pantalla(sys.stdout)
+        self._input_original = input_original
+    
+    def input(self, prompt=''):
+        entrada = self._input_original(prompt)
+        opcion = self.pantalla.opciones().get(entrada.strip())
+        self.pantalla.limpiar()
+        if opcion is not None:
+            self.entradas.append(PREFIJO_OPCION + opcion)
+        elif entrada.startswith(PREFIJO_OPCION):
+            self.entradas.append(PREFIJO_OPCION + entrada)
+        else:
+            self.entradas.append(entrada)
+        return entrada
+
+def grabar_guion(ruta):
+    """Ejecuta el sistema normalmente y guarda las entradas del usuario como guion JSON"""
+    import main as aplicacion
+    
+    grabador = Grabador(builtins.input)
+    builtins.input = grabador.input
+    try:
+        with contextlib.redirect_stdout(grabador.pantalla):
+            aplicacion.main()
+    except (SystemExit, KeyboardInterrupt, EOFError):
+        pass
+    finally:
+        builtins.input = grabador._input_original
+    
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        json.dump(grabador.entradas, archivo, ensure_ascii=False, indent=2)
+    imprimir_exito(f"Guion con {len(grabador.entradas)} entradas guardado en '{ruta}'")
+
+def _ejecutar_sesion(tarea):
+    """Ejecuta una sesión completa de main() con un guion (en un proceso del pool)"""
+    nombre, entradas, pausa = tarea
+    import main as aplicacion
+    
+    reproductor = Reproductor(entradas, pausa)
+    builtins.input = reproductor.input
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(reproductor.pantalla):
+        try:
+            aplicacion.main()
+        except (SystemExit, _FinDelGuion):
+            reproductor.cerrar_accion()
+        except _OpcionInexistente as e:
+            # Como excepción común, para que el pool la devuelva y se detenga la simulación
+            raise GuionInvalido(f"Guion '{nombre}', {e}") from None
+    return nombre, time.perf_counter() - inicio, reproductor.tiempos
+
+def _percentil(ordenados, p):
+    """Percentil por rango más cercano sobre una lista ya ordenada"""
+    return ordenados[max(0, math.ceil(p * len(ordenados)) - 1)]
+
+def _preparar_base():
+    """
+    Pasa a una copia de la base en una carpeta temporal (los procesos de las sesiones
+    la heredan) y crea las tablas y la categoría que usan los guiones incluidos.
+    """
+    usar_carpeta_temporal('inventario_simulacion_', inicializar=True, copiar_base=True)
+    from utils import db_manager
+    
+    if not db_manager.buscar_categoria(CATEGORIA_SIMULADA):
+        db_manager.registrar_categoria(CATEGORIA_SIMULADA, 0.0, 0.0, 0.0, 0, 10, "BAJO STOCK")
+
+def simular(guiones, sesiones=20, procesos=None, pausa=0.0):
+    """
+    Ejecuta las sesiones repartiendo los guiones en orden y devuelve las latencias.
+    Cada proceso arranca limpio (spawn), con sus propias conexiones y caches.
+    
+    Returns:
+        tuple: ({accion: [segundos, ...]}, segundos totales, [(guion, segundos de la sesión)])
+    """
+    _preparar_base()
+    
+    nombres = list(guiones)
+    tareas = [(nombres[i % len(nombres)], guiones[nombres[i % len(nombres)]], pausa) for i in range(sesiones)]
+    
+    inicio = time.perf_counter()
+    with multiprocessing.get_context('spawn').Pool(procesos or os.cpu_count()) as pool:
+        resultados = pool.map(_ejecutar_sesion, tareas)
+    total = time.perf_counter() - inicio
+    
+    latencias = {}
+    for _, _, tiempos in resultados:
+        for accion, segundos in tiempos:
+            latencias.setdefault(accion, []).append(segundos)
+    return latencias, total, [(nombre, segundos) for nombre, segundos, _ in resultados]
+
+def mostrar_resultados(latencias, total, sesiones):
+    """Muestra los percentiles de latencia por acción (en milisegundos)"""
+    imprimir_titulo("Latencia por Acción (ms)")
+    ancho = max([20] + [len(accion) for accion in latencias])
+    print(f"{'ACCIÓN':<{ancho}} {'N':>6} {'P50':>9} {'P90':>9} {'P99':>9} {'MÁX':>9}")
+    print("-" * (ancho + 47))
+    for accion, tiempos in sorted(latencias.items()):
+        ordenados = sorted(tiempos)
+        print(f"{accion:<{ancho}} {len(ordenados):>6} "
+              f"{_percentil(ordenados, 0.5) * 1000:>9.1f} {_percentil(ordenados, 0.9) * 1000:>9.1f} "
+              f"{_percentil(ordenados, 0.99) * 1000:>9.1f} {ordenados[-1] * 1000:>9.1f}")
+    print("-" * (ancho + 47))
+    
+    duraciones = sorted(segundos for _, segundos in sesiones)
+    print(f"Sesiones: {len(sesiones)} | Duración P50: {_percentil(duraciones, 0.5):.2f} s | "
+          f"Tiempo total: {total:.2f} s | {len(sesiones) / total:.1f} sesiones/s")
+
+def _leer_guiones(rutas):
+    """Lee los guiones grabados (listas JSON de entradas)"""
+    guiones = {}
+    for ruta in rutas:
+        with open(ruta, encoding='utf-8') as archivo:
+            guiones[os.path.basename(ruta)] = [str(entrada) for entrada in json.load(archivo)]
+    return guiones
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulador de carga de los menús del inventario")
+    parser.add_argument('--grabar', metavar='ARCHIVO', help="ejecuta el sistema y graba las entradas como guion")
+    parser.add_argument('--guion', metavar='ARCHIVO', action='append', default=[],
+                        help="guion JSON a reproducir (se puede repetir; por defecto, los guiones incluidos)")
+    parser.add_argument('--sesiones', type=int, default=20, help="cantidad de sesiones simuladas")
+    parser.add_argument('--procesos', type=int, default=None, help="procesos en paralelo (por defecto, uno por CPU)")
+    parser.add_argument('--pausa', type=float, default=0.0, help="segundos de espera del usuario entre acciones")
+    args = parser.parse_args()
+    
+    if args.grabar:
+        # El guion se guarda donde lo indicó el usuario, no en la carpeta temporal
+        ruta = os.path.abspath(args.grabar)
+        usar_carpeta_temporal('inventario_grabacion_', copiar_base=True)
+        grabar_guion(ruta)
+        return
+    
+    try:
+        guiones = _leer_guiones(args.guion) if args.guion else GUIONES
+    except (OSError, ValueError) as e:
+        imprimir_error(f"No se pudo leer el guion: {e}")
+        return
+    
+    try:
+        latencias, total, sesiones = simular(guiones, args.sesiones, args.procesos, args.pausa)
+    except GuionInvalido as e:
+        imprimir_error(str(e))
+        sys.exit(1)
+    mostrar_resultados(latencias, total, sesiones)
+
+if __name__ == "__main__":
+    main()
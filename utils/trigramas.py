@@ -0,0 +1,57 @@
+import heapq
+from collections import Counter
+
+def trigramas(texto):
+    """Trigramas de un texto normalizado a mayúsculas, con relleno para marcar inicio y fin de palabra"""
+    trigramas_texto = set()
+    for palabra in texto.strip().upper().split():
+        relleno = f"  {palabra} "
+        trigramas_texto.update(relleno[i:i + 3] for i in range(len(relleno) - 2))
+    return trigramas_texto
+
+class IndiceTrigramas:
+    """
+    Índice invertido trigrama -> nombres, para sugerir los nombres más parecidos a un texto.
+    La similitud es la de Jaccard entre los conjuntos de trigramas.
+    """
+    def __init__(self, nombres=()):
+        self._indice = {}     # trigrama -> set de nombres
+        self._trigramas = {}  # nombre -> set de trigramas
+        for nombre in nombres:
+            self.agregar(nombre)
+    
+    def __len__(self):
+        return len(self._trigramas)
+    
+    def agregar(self, nombre):
+        if nombre in self._trigramas:
+            return
+        trigramas_nombre = trigramas(nombre)
+        self._trigramas[nombre] = trigramas_nombre
+        for trigrama in trigramas_nombre:
+            self._indice.setdefault(trigrama, set()).add(nombre)
+    
+    def eliminar(self, nombre):
+        for trigrama in self._trigramas.pop(nombre, ()):
+            nombres = self._indice[trigrama]
+            nombres.discard(nombre)
+            if not nombres:
+                del self._indice[trigrama]
+    
+    def sugerir(self, texto, k=5, similitud_minima=0.2):
+        """Devuelve hasta k (nombre, similitud) ordenados de mayor a menor similitud"""
+        trigramas_texto = trigramas(texto)
+        if not trigramas_texto:
+            return []
+        
+        # Solo se evalúan los nombres que comparten al menos un trigrama
+        comunes = Counter()
+        for trigrama in trigramas_texto:
+            comunes.update(self._indice.get(trigrama, ()))
+        
+        candidatos = (
+            (cantidad / (len(trigramas_texto) + len(self._trigramas[nombre]) - cantidad), nombre)
+            for nombre, cantidad in comunes.items()
+        )
+        mejores = heapq.nlargest(k, candidatos)
+        return [(nombre, round(similitud, 3)) for similitud, nombre in mejores if similitud >= similitud_minima]
@@ -0,0 +1,378 @@
+"""
+Verificaciones reproducibles del comportamiento de utils.db_manager.
+
+Cada verificación arma su propia base en una carpeta temporal (nunca toca la base
+real), ejecuta el caso y compara con el resultado esperado. Termina con estado
+distinto de cero si alguna falla, así se puede usar para validar cambios.
+
+Uso:
+    python -m utils.verificaciones
+"""
+import contextlib
+import io
+import sqlite3
+import sys
+import threading
+import time
+from utils.entorno_pruebas import Fallas, usar_carpeta_temporal
+
+def _contar_categorias(conn):
+    return conn.execute("SELECT COUNT(*) FROM categorias").fetchone()[0]
+
+def verificar_snapshot(modo):
+    """
+    Con un snapshot abierto, otra conexión confirma escrituras sin esperar y el
+    snapshot no las ve. Una escritura dentro del snapshot falla en lugar de perderse.
+    """
+    from utils import db_manager
+    
+    f = Fallas(f"snapshot {modo}")
+    db_manager.registrar_categoria('BASE', 0.0, 0.0, 0.0, 0, 10, 'BAJO STOCK')
+    antes = _contar_categorias(db_manager.conectar_db())
+    
+    with db_manager.snapshot_lectura(modo):
+        f.igual("lectura inicial", _contar_categorias(db_manager.conectar_db()), antes)
+        
+        # Otro escritor confirma mientras el reporte sigue abierto (timeout corto: no debe bloquearse)
+        escritor = sqlite3.connect(db_manager.DB_NAME, timeout=1)
+        inicio = time.perf_counter()
+        try:
+            escritor.execute("INSERT INTO categorias VALUES ('NUEVA', 0, 0, 0, 0, 10, 2, 'BAJO STOCK')")
+            escritor.commit()
+            f.igual("el escritor confirma durante el snapshot", True, True)
+        except sqlite3.Error as e:
+            f.igual("el escritor confirma durante el snapshot", str(e), None)
+        finally:
+            escritor.close()
+        f.igual("el escritor no espera al snapshot", time.perf_counter() - inicio < 0.5, True)
+        f.igual("el snapshot no ve la escritura", _contar_categorias(db_manager.conectar_db()), antes)
+        
+        # Las escrituras dentro del bloque fallan de forma visible
+        try:
+            db_manager.conectar_db().execute("DELETE FROM categorias")
+            f.igual("escritura dentro del snapshot", "sin error", "sqlite3.OperationalError")
+        except sqlite3.OperationalError:
+            pass
+        with contextlib.redirect_stdout(io.StringIO()):
+            f.igual("registrar_categoria dentro del snapshot",
+                    db_manager.registrar_categoria('PERDIDA', 0.0, 0.0, 0.0, 0, 10, 'BAJO STOCK'), False)
+    
+    f.igual("después del snapshot se ve la escritura", _contar_categorias(db_manager.conectar_db()), antes + 1)
+    db_manager.conectar_db().execute("DELETE FROM categorias WHERE categoria = 'NUEVA'").connection.commit()
+    return f.fallas
+
+def verificar_buffer_escritura():
+    """
+    Una escritura en cola que falla se descarta y las demás del lote se confirman;
+    la cola no queda trabada reintentando el mismo lote. Con el buffer activo,
+    actualizar un ID inexistente devuelve False.
+    """
+    from utils import db_manager
+    
+    f = Fallas("buffer de escritura")
+    db_manager.activar_buffer_escritura(max_operaciones=100, max_segundos=60)
+    with contextlib.redirect_stdout(io.StringIO()) as salida:
+        db_manager.registrar_producto('Buffer A', '', 1, 1.0, None)
+        db_manager.registrar_producto(None, '', 1, 1.0, None)  # nombre NOT NULL: falla al confirmar
+        db_manager.registrar_producto('Buffer B', '', 1, 1.0, None)
+        f.igual("actualizar_producto inexistente en cola", db_manager.actualizar_producto(-1, 'X', '', 1, 1.0, None), False)
+        
+        f.igual("flush con una escritura inválida", db_manager.flush(), False)
+        f.igual("la cola queda vacía", len(db_manager._buffer), 0)
+        f.igual("flush siguiente sin errores", db_manager.flush(), True)
+        f.igual("escrituras descartadas", len(db_manager._buffer.descartadas), 1)
+        db_manager.desactivar_buffer_escritura()
+    f.igual("se informa la escritura descartada", "Se descarta" in salida.getvalue(), True)
+    
+    conn = db_manager.conectar_db()
+    f.igual("las escrituras válidas se confirman",
+            conn.execute("SELECT COUNT(*) FROM productos WHERE nombre LIKE 'Buffer %'").fetchone()[0], 2)
+    conn.execute("DELETE FROM productos WHERE nombre LIKE 'Buffer %'")
+    conn.commit()
+    return f.fallas
+
+def verificar_cache_errores():
+    """
+    Un error de la base durante un reporte cacheado devuelve el valor por defecto,
+    pero no queda guardado: con los mismos datos, la siguiente llamada ve la base.
+    """
+    from utils import db_manager
+    
+    f = Fallas("cache con errores")
+    db_manager.registrar_categoria('CACHE', 0.0, 0.0, 0.0, 0, 10, 'BAJO STOCK')
+    version = db_manager.version_datos()
+    
+    def conexion_fallida():
+        raise sqlite3.OperationalError("database is locked")
+    
+    conectar_db = db_manager.conectar_db
+    db_manager.conectar_db = conexion_fallida
+    try:
+        with contextlib.redirect_stdout(io.StringIO()) as salida:
+            f.igual("categorías con la base fallando", db_manager.obtener_categorias(), [])
+            f.igual("categoría con la base fallando", db_manager.buscar_categoria('CACHE'), None)
+    finally:
+        db_manager.conectar_db = conectar_db
+    f.igual("se informa el error", "database is locked" in salida.getvalue(), True)
+    
+    f.igual("los datos no cambiaron", db_manager.version_datos(), version)
+    f.igual("la categoría se ve al volver la base",
+            'CACHE' in [fila[0] for fila in db_manager.obtener_categorias()], True)
+    f.igual("buscar_categoria no quedó en None", db_manager.buscar_categoria('CACHE') is not None, True)
+    db_manager.eliminar_categoria('CACHE')
+    return f.fallas
+
+def verificar_cache_copias():
+    """
+    Quien llama puede modificar lo que devuelve un reporte cacheado (también las listas
+    dentro de una tupla) sin cambiar lo que devuelven las siguientes llamadas. En un
+    snapshot 'memoria', las lecturas que salen del cache no copian la base.
+    """
+    from utils import db_manager
+    
+    f = Fallas("cache de reportes")
+    db_manager.registrar_categoria('COPIA', 0.0, 0.0, 0.0, 0, 10, 'BAJO STOCK')
+    db_manager.registrar_producto('Copia', '', 2, 1.5, 'COPIA')
+    
+    esperado = db_manager.reporte_valorizacion()
+    filas, _ = db_manager.reporte_valorizacion()
+    filas.clear()
+    f.igual("reporte_valorizacion después de modificar el resultado", db_manager.reporte_valorizacion(), esperado)
+    
+    copias = []
+    copiar_snapshot = db_manager._copiar_snapshot
+    def contar_copia(fijada):
+        copias.append(fijada)
+        return copiar_snapshot(fijada)
+    db_manager._copiar_snapshot = contar_copia
+    try:
+        categorias = db_manager.obtener_categorias()
+        with db_manager.snapshot_lectura('memoria'):
+            f.igual("categorías desde el cache", db_manager.obtener_categorias(), categorias)
+            f.igual("sin copia mientras todo sale del cache", len(copias), 0)
+            
+            # La copia se hace después, pero con la versión fijada al abrir el snapshot
+            escritor = sqlite3.connect(db_manager.DB_NAME)
+            id_nuevo = escritor.execute("""INSERT INTO productos (nombre, descripcion, cantidad, precio_centavos, categoria)
+                                           VALUES ('Posterior', '', 1, 100, 'COPIA')""").lastrowid
+            escritor.commit()
+            escritor.close()
+            f.igual("la copia no ve la escritura posterior", db_manager.buscar_producto_id(id_nuevo), None)
+            f.igual("copia en la primera lectura sin cache", len(copias), 1)
+            db_manager.obtener_productos()
+            f.igual("una sola copia por snapshot", len(copias), 1)
+    finally:
+        db_manager._copiar_snapshot = copiar_snapshot
+    
+    conn = db_manager.conectar_db()
+    conn.execute("DELETE FROM productos WHERE categoria = 'COPIA'")
+    conn.commit()
+    db_manager.eliminar_categoria('COPIA')
+    return f.fallas
+
+def verificar_reprecio():
+    """
+    El redondeo '99' da el menor precio terminado en .99 que no queda por debajo del
+    calculado (mínimo 0.99). Con un término de búsqueda, el impacto solo incluye las
+    categorías afectadas, pero con todos sus productos.
+    """
+    from utils import db_manager
+    
+    f = Fallas("reprecio masivo")
+    db_manager.registrar_categoria('REPRECIO', 0.0, 0.0, 0.0, 0, 10, 'BAJO STOCK')
+    db_manager.registrar_categoria('OTRA', 0.0, 0.0, 0.0, 0, 10, 'BAJO STOCK')
+    precios = [0.01, 0.3, 0.99, 1.0, 9.99, 10.0, 10.3, 10.5, 123.45]
+    for i, precio in enumerate(precios):
+        db_manager.registrar_producto(f"Reprecio {i}", '', 1, precio, 'REPRECIO')
+    db_manager.registrar_producto('Sin cambio', '', 1, 50.0, 'REPRECIO')
+    db_manager.registrar_producto('Ajeno', '', 1, 7.0, 'OTRA')
+    
+    for porcentaje in (0, 3, 10, -40):
+        with contextlib.redirect_stdout(io.StringIO()):
+            db_manager.reprecio_masivo(porcentaje=porcentaje, redondeo='99', categoria='REPRECIO')
+        nuevos = {fila[1]: round(fila[4] * 100) for fila in db_manager.buscar_producto_texto('reprecio')}
+        for i, precio in enumerate(precios):
+            calculado = max(round(precio * 100) * (1 + porcentaje / 100), 0)
+            nuevo = nuevos[f"Reprecio {i}"]
+            f.igual(f"{precio} {porcentaje:+}%: termina en .99", nuevo % 100, 99)
+            f.igual(f"{precio} {porcentaje:+}%: no queda por debajo de {calculado / 100:.4f}",
+                    nuevo >= calculado - 1e-6, True)
+            f.igual(f"{precio} {porcentaje:+}%: es el menor .99 posible", nuevo - 100 < max(calculado, 99), True)
+        # Vuelve a los precios originales para el siguiente porcentaje
+        conn = db_manager.conectar_db()
+        originales = [(round(precio * 100), f"Reprecio {i}") for i, precio in enumerate(precios)]
+        conn.executemany("UPDATE productos SET precio_centavos = ? WHERE nombre = ?", originales + [(5000, 'Sin cambio')])
+        conn.commit()
+    
+    with contextlib.redirect_stdout(io.StringIO()):
+        impacto = db_manager.reprecio_masivo(porcentaje=10, termino='reprecio 8', simular=True)
+    f.igual("categorías en el impacto", sorted(impacto), ['REPRECIO'])
+    f.igual("productos que cambian", impacto['REPRECIO']['productos'], 1)
+    f.igual("las estadísticas incluyen los que no cambian", impacto['REPRECIO']['antes'][2], 123.45)
+    f.igual("mínimo de la categoría", impacto['REPRECIO']['antes'][1], 0.01)
+    
+    conn = db_manager.conectar_db()
+    conn.execute("DELETE FROM productos WHERE categoria IN ('REPRECIO', 'OTRA')")
+    conn.commit()
+    db_manager.eliminar_categoria('REPRECIO')
+    db_manager.eliminar_categoria('OTRA')
+    return f.fallas
+
+def verificar_consistencia():
+    """
+    verificar_consistencia cuenta todos los huérfanos y diferencias, pero solo guarda
+    una muestra acotada (la memoria no crece con la cantidad de problemas).
+    """
+    from utils import db_manager
+    
+    f = Fallas("verificar consistencia")
+    conn = db_manager.conectar_db()
+    conn.executemany("INSERT INTO productos (nombre, descripcion, cantidad, precio_centavos, categoria) VALUES (?, '', 1, 100, ?)",
+                     [(f"Huerfano {i}", f"FALTANTE{i % 7}") for i in range(50)])
+    conn.commit()
+    
+    resultado = db_manager.verificar_consistencia(tamano_lote=8, muestra=5)
+    f.igual("huérfanos contados", resultado['huerfanos'], 50)
+    f.igual("muestra de huérfanos", [fila[2] for fila in resultado['muestra_huerfanos']],
+            [f"Huerfano {i}" for i in range(5)])
+    
+    with contextlib.redirect_stdout(io.StringIO()):
+        resultado = db_manager.verificar_consistencia(reparar=True, tamano_lote=3, muestra=2)
+    f.igual("categorías registradas", resultado['reparadas'], 7)
+    resultado = db_manager.verificar_consistencia()
+    f.igual("sin huérfanos después de reparar", (resultado['huerfanos'], resultado['muestra_huerfanos']), (0, []))
+    
+    conn.execute("DELETE FROM productos WHERE nombre LIKE 'Huerfano %'")
+    conn.commit()
+    for i in range(7):
+        db_manager.eliminar_categoria(f"FALTANTE{i}")
+    return f.fallas
+
+def verificar_archivo():
+    """
+    Archivar y restaurar quedan en el registro de cambios como ARCHIVE y RESTORE (no
+    como una baja y un alta), y los archivados cuentan como huérfanos si su categoría
+    ya no existe.
+    """
+    from utils import db_manager
+    
+    f = Fallas("archivo de productos")
+    db_manager.registrar_categoria('ARCHIVO', 0.0, 0.0, 0.0, 0, 10, 'BAJO STOCK')
+    db_manager.registrar_producto('Inactivo', '', 0, 1.0, 'ARCHIVO')
+    conn = db_manager.conectar_db()
+    id_prod = conn.execute("SELECT id FROM productos WHERE nombre = 'Inactivo'").fetchone()[0]
+    conn.execute("UPDATE productos SET actualizado_en = 0 WHERE id = ?", (id_prod,))
+    conn.commit()
+    desde = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM eventos_cambios").fetchone()[0]
+    
+    with contextlib.redirect_stdout(io.StringIO()):
+        f.igual("archivados", db_manager.archivar_productos_inactivos(dias=1), 1)
+        f.igual("restaurados", db_manager.restaurar_productos_archivados([id_prod]), 1)
+        db_manager.archivar_productos_inactivos(dias=-1)
+    operaciones = [evento[4] for evento in db_manager.leer_eventos(desde)
+                   if evento[2] == 'producto' and evento[3] == str(id_prod)]
+    f.igual("eventos del producto", operaciones, ['ARCHIVE', 'RESTORE', 'ARCHIVE'])
+    
+    conn.execute("DELETE FROM categorias WHERE categoria = 'ARCHIVO'")
+    conn.commit()
+    resultado = db_manager.verificar_consistencia()
+    f.igual("archivado huérfano", (resultado['huerfanos'], resultado['muestra_huerfanos']),
+            (1, [(None, id_prod, 'Inactivo', 'ARCHIVO', True)]))
+    
+    conn.execute("DELETE FROM productos_archivados WHERE id = ?", (id_prod,))
+    conn.commit()
+    return f.fallas
+
+def verificar_plan_reposicion():
+    """
+    La cantidad de la categoría se reparte según el déficit de cada producto:
+    un producto agotado recibe unidades antes que uno con stock de sobra.
+    """
+    from utils import db_manager
+    
+    f = Fallas("plan de reposición")
+    # Nivel objetivo = 70 * 14 / 7 + 14 = 154; stock 100 -> se compran 54
+    db_manager.registrar_categoria('REPONER', 0.0, 0.0, 0.0, 100, 70, 'BAJO STOCK')
+    db_manager.registrar_producto('agotado', '', 0, 1.0, 'REPONER')
+    db_manager.registrar_producto('lleno', '', 100, 1.0, 'REPONER')
+    
+    plan = {fila['producto']: fila['cantidad_sugerida'] for fila in db_manager.calcular_plan_reposicion(7, 7)
+            if fila['categoria'] == 'REPONER'}
+    f.igual("total de la categoría", sum(plan.values()), 54)
+    f.igual("el producto agotado recibe las unidades", plan.get('agotado'), 54)
+    f.igual("el producto lleno no recibe unidades", plan.get('lleno'), None)
+    
+    conn = db_manager.conectar_db()
+    conn.execute("DELETE FROM productos WHERE categoria = 'REPONER'")
+    conn.commit()
+    db_manager.eliminar_categoria('REPONER')
+    return f.fallas
+
+def verificar_rollups_concurrentes():
+    """
+    Dos sesiones que actualizan los rollups del historial al mismo tiempo procesan
+    cada evento una sola vez: un cambio de status suma un solo cambio.
+    """
+    from utils import db_manager
+    
+    f = Fallas("rollups concurrentes")
+    db_manager.registrar_categoria('ROLLUP', 0.0, 0.0, 0.0, 0, 10, 'BAJO STOCK')
+    for ronda in range(20):
+        db_manager.actualizar_rollups_historial()
+        status = 'EXCESO DE STOCK' if ronda % 2 == 0 else 'BAJO STOCK'
+        conn = db_manager.conectar_db()
+        conn.execute("UPDATE categorias SET status_stock = ? WHERE categoria = 'ROLLUP'", (status,))
+        conn.commit()
+        
+        # Las dos sesiones arrancan juntas
+        barrera = threading.Barrier(2)
+        def sesion():
+            barrera.wait()
+            db_manager.actualizar_rollups_historial()
+        hilos = [threading.Thread(target=sesion) for _ in range(2)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        
+        # Un evento por el alta más uno por cada cambio de status
+        cambios = conn.execute("SELECT SUM(cambios) FROM historial_diario WHERE categoria = 'ROLLUP'").fetchone()[0]
+        f.igual(f"ronda {ronda}: cambios registrados", cambios, ronda + 2)
+    
+    db_manager.eliminar_categoria('ROLLUP')
+    return f.fallas
+
+# Verificaciones a ejecutar: nombre -> función sin argumentos que devuelve las fallas
+VERIFICACIONES = {
+    'snapshot wal': lambda: verificar_snapshot('wal'),
+    'snapshot memoria': lambda: verificar_snapshot('memoria'),
+    'buffer de escritura': verificar_buffer_escritura,
+    'cache con errores': verificar_cache_errores,
+    'cache de reportes': verificar_cache_copias,
+    'reprecio masivo': verificar_reprecio,
+    'verificar consistencia': verificar_consistencia,
+    'archivo de productos': verificar_archivo,
+    'plan de reposición': verificar_plan_reposicion,
+    'rollups concurrentes': verificar_rollups_concurrentes
+}
+
+def main():
+    # Todo se hace en una carpeta temporal (la configuración se lee recién al importar)
+    usar_carpeta_temporal('inventario_verificaciones_', inicializar=True)
+    from utils.helpers import imprimir_titulo, imprimir_exito, imprimir_error
+    
+    imprimir_titulo("Verificaciones")
+    fallas = []
+    for nombre, verificacion in VERIFICACIONES.items():
+        resultado = verificacion()
+        if resultado:
+            for falla in resultado:
+                imprimir_error(falla)
+        else:
+            imprimir_exito(nombre)
+        fallas.extend(resultado)
+    
+    sys.exit(1 if fallas else 0)
+
+if __name__ == "__main__":
+    main()